@@ -44,7 +44,7 @@ a = Analysis(
     runtime_hooks=[],
     # Indispensables: xml, inspect, logging, setuptools, distutils, email, http
     excludes=['test', 'unittest', 'doctest', 'pydoc', 'pdb', 'cProfile', 'cgi', 'venv', 'asyncio', 'pip',
-              'html', 'turtle', 'idlelib', 'lib2to3', 'cgitb', 'concurrent', 'sqlite3', 'Cython'],
+              'html', 'turtle', 'idlelib', 'lib2to3', 'cgitb', 'sqlite3', 'Cython'],
     noarchive=False,
     optimize=0,
 )
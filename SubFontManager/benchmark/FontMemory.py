@@ -0,0 +1,88 @@
+"""
+比较字体库载入为Font对象和FontInfo紧凑记录时的内存占用和GC耗时.
+缺省生成合成的字体元数据（每个家族4个样式，家族名和全名各含中英文两种），也可以指定真实字体目录.
+用法：python -m benchmark.FontMemory [--faces 10000] [--fonts-dir 目录]
+"""
+
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+from typing import Callable
+from font import Font, FontInfo, FontManager
+
+STYLES = (('Regular', 400, 0), ('Italic', 400, 2), ('Bold', 700, 0), ('Bold Italic', 700, 2))
+
+
+def syntheticFonts(faces: int) -> list[Font]:
+    """生成合成字体对象，不对应真实文件. 每个名字都是新建的字符串，与从名表解码的效果相同"""
+    fonts = []
+    for i in range(faces):
+        family = i // len(STYLES)
+        style_name, weight, style = STYLES[i % len(STYLES)]
+        font = Font(f'/fonts/family{family}/Family{family}-{style_name.replace(" ", "")}.ttf', openNow=False)
+        font.postscriptName = f'family{family}-{style_name.replace(" ", "").lower()}'
+        font.familyNames = {f'bench family {family}', f'测试字体{family}'}
+        font.fullNames = {f'bench family {family} {style_name.lower()}', f'测试字体{family} {style_name.lower()}'}
+        font.weight, font.style = weight, style
+        fonts.append(font)
+    return fonts
+
+
+def syntheticInfos(faces: int) -> list[FontInfo]:
+    """生成与syntheticFonts内容相同的字体记录，中间的Font对象随即释放"""
+    return [FontInfo.fromFont(font) for font in syntheticFonts(faces)]
+
+
+def directoryFonts(directory: str) -> list[Font]:
+    """读取目录下（递归）所有字体"""
+    fonts = []
+    for dir_path, _, file_names in os.walk(directory):
+        for name in sorted(file_names):
+            if os.path.splitext(name)[1].lower() in FontManager.FONT_EXTS:
+                fonts.extend(Font.createFontsFromFile(os.path.join(dir_path, name)))
+    return fonts
+
+
+def measure(build: Callable[[], list]) -> dict:
+    """
+    测量build返回的对象在构建完成后仍然占用的内存，以及对它们做一次完整GC的耗时
+    :return: {'count', 'bytes', 'gcMs'}
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    objects = build()
+    gc.collect()    # 回收构建过程中的临时对象
+    retained = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    gc_start = time.perf_counter()
+    gc.collect()
+    gc_time = time.perf_counter() - gc_start
+    return {'count': len(objects), 'bytes': retained, 'gcMs': gc_time * 1000}
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark.FontMemory')
+    parser.add_argument('--faces', type=int, default=10000, help='number of synthetic font faces')
+    parser.add_argument('--fonts-dir', help='measure the fonts in this directory instead of synthetic ones')
+    args = parser.parse_args(argv)
+
+    if args.fonts_dir:
+        directoryFonts(args.fonts_dir)  # 先读一遍，fontTools的导入和文件缓存不计入结果
+        builders = {'Font': lambda: directoryFonts(args.fonts_dir),
+                    'FontInfo': lambda: [FontInfo.fromFont(font) for font in directoryFonts(args.fonts_dir)]}
+    else:
+        builders = {'Font': lambda: syntheticFonts(args.faces), 'FontInfo': lambda: syntheticInfos(args.faces)}
+
+    print(f"{'record':<10} {'faces':>8} {'total KB':>10} {'per 10k KB':>11} {'bytes/face':>11} {'gc ms':>8}")
+    for name, build in builders.items():
+        result = measure(build)
+        per_face = result['bytes'] / result['count'] if result['count'] else 0
+        print(f"{name:<10} {result['count']:>8} {result['bytes'] / 1024:>10.0f} {per_face * 10000 / 1024:>11.0f} "
+              f"{per_face:>11.0f} {result['gcMs']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
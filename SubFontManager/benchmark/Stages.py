@@ -0,0 +1,78 @@
+"""
+分阶段计时，每个阶段单独测量，互不包含：
+load(_load解析文件)、font_manager(FontManager.__init__)、gather(gatherFonts)、
+subset(Font.subset)、uu_encode、uu_decode、save.
+"""
+
+import os
+import statistics
+import tempfile
+import time
+from typing import Callable
+from sub import SubStationAlpha, UU
+from font import Font, FontManager
+
+
+def timeit(func: Callable, repeat: int, setup: Callable = None) -> dict:
+    """
+    重复运行并计时
+    :param func: 被计时的函数，参数为setup的返回值（如果有setup）
+    :param repeat: 运行次数
+    :param setup: 每次运行前的准备函数，不计入时间
+    :return: {'min', 'median', 'mean', 'runs'}，单位秒
+    """
+    runs = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        func(arg) if setup else func()
+        runs.append(time.perf_counter() - start)
+    return {'min': min(runs), 'median': statistics.median(runs), 'mean': statistics.fmean(runs), 'runs': runs}
+
+
+def parseOnly(path: str) -> SubStationAlpha:
+    """只解析字幕文件，不建立字体索引"""
+    sub_obj = SubStationAlpha.__new__(SubStationAlpha)
+    sub_obj.filePath = path
+    sub_obj._initSections()
+    sub_obj._load(path)
+    return sub_obj
+
+
+def runStages(corpus: dict, repeat: int = 5) -> dict[str, dict]:
+    """
+    对一套测试数据逐阶段计时
+    :param corpus: Synthetic.makeCorpus的返回值
+    :param repeat: 每个阶段的运行次数
+    :return: {阶段名: 计时结果}
+    """
+    path = corpus['subtitle']
+    directory = os.path.dirname(path)
+    results: dict[str, dict] = {}
+
+    results['load'] = timeit(lambda: parseOnly(path), repeat)
+    parsed = parseOnly(path)
+    results['font_manager'] = timeit(lambda: FontManager(embedFonts=parsed.fontDict, path=directory), repeat)
+
+    sub_obj = SubStationAlpha.load(path)
+    results['gather'] = timeit(sub_obj.gatherFonts, repeat)
+
+    font_descs = sub_obj.gatherFonts()
+    text = ''.join(set().union(*(d.text for d in font_descs)))
+    font_path = corpus['fonts'][0]
+    results['subset'] = timeit(lambda font: font.subset(text), repeat, setup=lambda: Font(font_path))
+
+    with open(font_path, 'rb') as file:
+        font_bytes = file.read()
+    font_code = UU.Encode(font_bytes)
+    results['uu_encode'] = timeit(lambda: UU.Encode(font_bytes), repeat)
+    results['uu_decode'] = timeit(lambda: UU.Decode(font_code), repeat)
+
+    subset_font = Font(font_path)
+    subset_font.subset(text)
+    sub_obj.fontDict.add(subset_font.read(), 'subset.ttf')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        out_path = os.path.join(temp_dir, 'out.ass')
+        results['save'] = timeit(lambda: sub_obj.save(out_path), repeat)
+
+    return results
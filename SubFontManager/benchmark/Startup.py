@@ -0,0 +1,59 @@
+"""
+冷启动导入耗时报告，在子进程中以 -X importtime 导入程序模块，按累计耗时列出最慢的模块.
+用法：python -m benchmark.Startup [模块名 ...]，缺省导入main.py在窗口出现前导入的模块
+"""
+
+import os
+import subprocess
+import sys
+
+DEFAULT_MODULES = ['utils', 'ui', 'sub', 'font', 'window']  # main.py启动时导入的顶层包
+
+
+def importTimes(modules: list[str]) -> list[dict]:
+    """
+    在新的解释器进程中导入模块，解析 -X importtime 的输出
+    :param modules: 要导入的模块名
+    :return: 每个被导入模块的 {'module', 'self_us', 'cumulative_us', 'depth'}，按导入完成顺序排列
+    """
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # 程序通过sys.argv[0]判断是否处于开发状态，这里伪装成直接运行main.py
+    code = "import sys; sys.argv[0] = 'main.py'; " + '; '.join(f'import {m}' for m in modules)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          cwd=app_dir, capture_output=True, text=True)
+    results = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        results.append({
+            'module': name.strip(),
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us),
+            'depth': (len(name) - len(name.lstrip()) - 1) // 2,  # 缩进表示导入的嵌套层级
+        })
+    if proc.returncode != 0:
+        print(proc.stderr.splitlines()[-1] if proc.stderr else 'Import failed.', file=sys.stderr)
+    return results
+
+
+def report(modules: list[str], top: int = 20) -> dict:
+    """
+    导入耗时报告
+    :param modules: 要导入的模块名
+    :param top: 列出的最慢模块数
+    :return: {'total_us': 顶层模块累计耗时之和, 'top': 累计耗时最多的模块列表}
+    """
+    times = importTimes(modules)
+    return {
+        'total_us': sum(t['cumulative_us'] for t in times if t['depth'] == 0 and t['module'] in modules),
+        'top': sorted(times, key=lambda t: t['cumulative_us'], reverse=True)[:top],
+    }
+
+
+if __name__ == '__main__':
+    result = report(sys.argv[1:] or DEFAULT_MODULES)
+    print(f"total import time: {result['total_us'] / 1000:.1f} ms")
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for t in result['top']:
+        print(f"{t['cumulative_us'] / 1000:>14.1f} {t['self_us'] / 1000:>8.1f}  {'  ' * t['depth']}{t['module']}")
@@ -0,0 +1,80 @@
+"""
+SubStationAlpha.strip部分删除的往返检查：分别删除[Fonts]段中的第一个、中间和最后一个字体，再用_load读回，
+检查剩下的字体和对白行数都不变. 字体条目之间有空行和没有空行（Aegisub的写法）两种格式都检查.
+用法：python -m benchmark.StripRoundTrip
+"""
+
+import os
+import sys
+import tempfile
+from io import BytesIO
+from sub import SubStationAlpha, UU
+from .Stages import parseOnly
+from .Synthetic import makeFont
+
+FONT_NAMES = ['first.ttf', 'middle.ttf', 'last.ttf']
+DIALOGUE_LINES = 3
+
+
+def writeSubtitle(path: str, fonts: list[tuple[str, bytes]], blankBetween: bool):
+    """
+    生成带[Fonts]段的字幕
+    :param fonts: 内嵌字体表，每项为(fontname:行的名字, 字体数据)
+    :param blankBetween: 字体条目之间是否有空行，Aegisub只在段末有一个空行
+    """
+    out = ['[Script Info]', 'ScriptType: v4.00+', '',
+           '[V4+ Styles]',
+           'Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, '
+           'Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, '
+           'MarginR, MarginV, Encoding',
+           'Style: Default,Arial,48,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,'
+           '100,100,0,0,1,2,0,2,10,10,10,1', '',
+           '[Fonts]']
+    for font_name, font_bytes in fonts:
+        out.append(f'fontname: {font_name}')
+        code = UU.Encode(font_bytes)
+        out.extend(code[i:i + 80] for i in range(0, len(code), 80))
+        if blankBetween:
+            out.append('')
+    if not blankBetween:
+        out.append('')
+    out += ['[Events]', 'Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text']
+    out += [f'Dialogue: 0,0:00:0{i}.00,0:00:0{i}.50,Default,,0,0,0,,line {i}' for i in range(DIALOGUE_LINES)]
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('\n'.join(out) + '\n')
+
+
+def run() -> list[str]:
+    """
+    运行所有检查
+    :return: 失败的检查说明，全部通过则为空列表
+    """
+    fonts = []
+    for i, name in enumerate(FONT_NAMES):
+        buffer = BytesIO()
+        makeFont(10 + i, f'Strip{i}').save(buffer)
+        fonts.append((name, buffer.getvalue()))
+
+    failures = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for blank_between in (False, True):
+            path = os.path.join(temp_dir, 'in.ass')
+            writeSubtitle(path, fonts, blank_between)
+            for name in FONT_NAMES:
+                out_path = os.path.join(temp_dir, 'out.ass')
+                SubStationAlpha.strip(path, out_path, [name])
+                parsed = parseOnly(out_path)
+                expected = [n for n in FONT_NAMES if n != name]
+                kept = list(parsed.fontDict.keys())
+                if kept != expected or len(parsed.dialogueList) != DIALOGUE_LINES:
+                    failures.append(f'strip {name} (blank between fonts: {blank_between}): '
+                                    f'fonts {kept}, {len(parsed.dialogueList)} dialogue lines')
+    return failures
+
+
+if __name__ == '__main__':
+    failed = run()
+    for failure in failed:
+        print(failure)
+    print('FAILED' if failed else 'OK')
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,174 @@
+"""
+生成确定性的合成测试数据，包括指定字形数量的TTF/TTC字体，以及指定行数、标签密度、重复率和内嵌字体数量的ASS字幕.
+相同的参数和种子总是生成完全相同的文件，因此可以在两次运行之间比较结果.
+"""
+
+import os
+import random
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+from fontTools.ttLib import TTFont, TTCollection
+from sub import UU
+
+ASCII_CHARS = [chr(c) for c in range(0x21, 0x7F)]   # 可打印ASCII字符，不含空格
+CJK_START = 0x4E00  # 合成字体中ASCII之后的字符从CJK统一汉字区开始编排
+
+
+def fontChars(glyphCount: int) -> list[str]:
+    """合成字体覆盖的字符表，先ASCII后CJK，共glyphCount个"""
+    chars = ASCII_CHARS[:glyphCount]
+    chars += [chr(CJK_START + i) for i in range(max(glyphCount - len(ASCII_CHARS), 0))]
+    return chars
+
+
+def _drawGlyph(seed: int):
+    """绘制一个简单的字形，不同种子的轮廓略有不同，避免字形数据完全重复"""
+    pen = TTGlyphPen(None)
+    offset = seed % 97
+    pen.moveTo((50 + offset, 0))
+    pen.lineTo((50 + offset, 700))
+    pen.lineTo((550, 700 - offset))
+    pen.lineTo((550, 0))
+    pen.closePath()
+    return pen.glyph()
+
+
+def makeFont(glyphCount: int, familyName: str, styleName: str = 'Regular',
+             weight: int = 400, italic: bool = False) -> TTFont:
+    """
+    用FontBuilder生成合成TTF字体
+    :param glyphCount: 覆盖的字符数量，实际字形数还要加上.notdef
+    :param familyName: 家族名
+    :param styleName: 子族名，如Regular、Bold
+    :param weight: 字重
+    :param italic: 是否斜体
+    :return: TTFont
+    """
+    chars = fontChars(glyphCount)
+    glyph_names = ['.notdef'] + [f'uni{ord(c):04X}' for c in chars]
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(glyph_names)
+    builder.setupCharacterMap({ord(c): name for c, name in zip(chars, glyph_names[1:])})
+    builder.setupGlyf({name: _drawGlyph(i) for i, name in enumerate(glyph_names)})
+    builder.setupHorizontalMetrics({name: (600, 50) for name in glyph_names})
+    builder.setupHorizontalHeader(ascent=800, descent=-200)
+    builder.setupNameTable({
+        'familyName': familyName,
+        'styleName': styleName,
+        'uniqueFontIdentifier': f'{familyName}-{styleName}',
+        'fullName': f'{familyName} {styleName}',
+        'psName': f'{familyName}-{styleName}'.replace(' ', ''),
+    })
+    builder.setupOS2(usWeightClass=weight, fsSelection=(0x01 if italic else 0) | (0x20 if weight >= 700 else 0)
+                     | (0x40 if weight < 700 and not italic else 0),
+                     sTypoAscender=800, sTypoDescender=-200, usWinAscent=800, usWinDescent=200)
+    builder.setupPost()
+    builder.font['head'].macStyle = (0x01 if weight >= 700 else 0) | (0x02 if italic else 0)  # 与fsSelection保持一致
+    return builder.font
+
+
+def saveFont(path: str, glyphCount: int, familyName: str, **kwargs) -> str:
+    """生成合成TTF字体并保存到path"""
+    makeFont(glyphCount, familyName, **kwargs).save(path)
+    return path
+
+
+def saveCollection(path: str, glyphCount: int, familyName: str,
+                   styles: tuple[tuple[str, int, bool], ...] = (('Regular', 400, False), ('Bold', 700, False))) -> str:
+    """
+    生成包含同一家族多个样式的合成TTC字体并保存到path
+    :param styles: 样式表，每项为(子族名, 字重, 是否斜体)
+    """
+    collection = TTCollection()
+    collection.fonts = [makeFont(glyphCount, familyName, name, weight, italic) for name, weight, italic in styles]
+    collection.save(path)
+    return path
+
+
+def makeSubtitle(path: str, lines: int, fontNames: list[str], chars: list[str],
+                 tagDensity: float = 0.2, repeatRatio: float = 0.1,
+                 embedFonts: list[tuple[str, bytes]] = (), seed: int = 0) -> str:
+    """
+    生成合成ASS字幕并保存到path
+    :param lines: 对白行数
+    :param fontNames: 样式和\\fn标签中引用的字体名，每个字体名生成一个样式
+    :param chars: 对白文字取自这个字符表
+    :param tagDensity: 每个词之前插入覆盖标签{}的概率
+    :param repeatRatio: 与之前某一行完全相同的行所占比例
+    :param embedFonts: 内嵌字体表，每项为(fontname:行的名字, 字体数据)
+    :param seed: 随机种子
+    """
+    rnd = random.Random(seed)
+    style_names = [f'Style{i}' for i in range(len(fontNames))]
+    out = ['[Script Info]', 'ScriptType: v4.00+', 'WrapStyle: 0', '',
+           '[V4+ Styles]',
+           'Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, '
+           'Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, '
+           'MarginR, MarginV, Encoding']
+    for style_name, font_name in zip(style_names, fontNames):
+        out.append(f'Style: {style_name},{font_name},48,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,'
+                   f'100,100,0,0,1,2,0,2,10,10,10,1')
+    out.append('')
+
+    if embedFonts:
+        out.append('[Fonts]')
+        for font_name, font_bytes in embedFonts:
+            out.append(f'fontname: {font_name}')
+            code = UU.Encode(font_bytes)
+            out.extend(code[i:i + 80] for i in range(0, len(code), 80))
+            out.append('')
+
+    out += ['[Events]', 'Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text']
+    tags = ['\\b1', '\\b0', '\\i1', '\\i0', '\\bord2', '\\blur1', '\\pos(100,200)', '\\c&H00FF00&']
+    dialogue_texts: list[str] = []
+    for i in range(lines):
+        if dialogue_texts and rnd.random() < repeatRatio:   # 重复之前的一行
+            text = rnd.choice(dialogue_texts)
+        else:
+            words = []
+            for _ in range(rnd.randint(2, 8)):
+                if rnd.random() < tagDensity:   # 插入覆盖标签
+                    tag = rnd.choice(tags + [f'\\fn{rnd.choice(fontNames)}'])
+                    words.append(f'{{{tag}}}')
+                words.append(''.join(rnd.choice(chars) for _ in range(rnd.randint(1, 6))))
+            text = ' '.join(words)
+            dialogue_texts.append(text)
+        start = i * 2
+        out.append(f'Dialogue: 0,{start // 3600}:{start // 60 % 60:02d}:{start % 60:02d}.00,'
+                   f'{(start + 1) // 3600}:{(start + 1) // 60 % 60:02d}:{(start + 1) % 60:02d}.50,'
+                   f'{rnd.choice(style_names)},,0,0,0,,{text}')
+
+    with open(path, 'w', encoding='utf-8-sig') as file:
+        file.write('\n'.join(out) + '\n')
+    return path
+
+
+def makeCorpus(directory: str, lines: int = 5000, fonts: int = 3, embedFonts: int = 1, glyphCount: int = 3000,
+               tagDensity: float = 0.2, repeatRatio: float = 0.1, seed: int = 0) -> dict:
+    """
+    在目录中生成一整套测试数据：若干本地字体（最后一个为TTC）和一个引用这些字体的字幕
+    :param directory: 输出目录
+    :param lines: 对白行数
+    :param fonts: 本地字体数量
+    :param embedFonts: 内嵌字体数量，内嵌的是前几个本地字体
+    :param glyphCount: 每个字体覆盖的字符数
+    :return: 生成的文件信息，{'subtitle': 路径, 'fonts': [路径], 'fontNames': [家族名]}
+    """
+    os.makedirs(directory, exist_ok=True)
+    font_names = [f'Bench Font {i}' for i in range(fonts)]
+    font_paths = []
+    for i, font_name in enumerate(font_names):
+        if i == fonts - 1 and fonts > 1:    # 最后一个字体做成TTC，用来测试TTC相关的路径
+            font_paths.append(saveCollection(os.path.join(directory, f'bench{i}.ttc'), glyphCount, font_name))
+        else:
+            font_paths.append(saveFont(os.path.join(directory, f'bench{i}.ttf'), glyphCount, font_name))
+
+    embed_list = []
+    for i in range(min(embedFonts, fonts)):
+        if font_paths[i].endswith('.ttf'):
+            with open(font_paths[i], 'rb') as file:
+                embed_list.append((f'embed{i}.ttf', file.read()))
+
+    subtitle = makeSubtitle(os.path.join(directory, 'bench.ass'), lines, font_names, fontChars(glyphCount),
+                            tagDensity, repeatRatio, embed_list, seed)
+    return {'subtitle': subtitle, 'fonts': font_paths, 'fontNames': font_names}
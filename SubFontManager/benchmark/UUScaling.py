@@ -0,0 +1,57 @@
+"""
+UU编解码的多线程扩展性测试，输出不同线程数下的编码和解码吞吐量.
+用法：python -m benchmark.UUScaling [数据大小MB] [最大线程数]
+"""
+
+import os
+import sys
+import time
+from sub import UU
+
+
+def measure(func, *args, repeat: int = 3) -> float:
+    """多次运行函数，返回最短耗时（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizeMB: int = 64, maxThreads: int = None) -> list[dict]:
+    """
+    测试不同线程数下的UU编解码吞吐量
+    :param sizeMB: 测试数据大小，单位MB
+    :param maxThreads: 最大线程数，缺省为CPU核数
+    :return: 每个线程数的测试结果列表
+    """
+    if maxThreads is None:
+        maxThreads = os.cpu_count() or 1
+    data = os.urandom(sizeMB << 20)
+    code = UU.Encode(data)
+    encoded = bytearray(len(code))
+    decoded = bytearray(len(data))
+
+    results = []
+    # 线程数按1, 2, 4...递增，最后一个为maxThreads
+    for threads in sorted({min(1 << i, maxThreads) for i in range(maxThreads.bit_length() + 1)}):
+        encode_time = measure(UU.EncodeInto, data, encoded, threads)
+        decode_time = measure(UU.DecodeInto, code.encode('ascii'), decoded, threads)
+        results.append({
+            'threads': threads,
+            'encode_MBps': sizeMB / encode_time,
+            'decode_MBps': sizeMB / decode_time,
+        })
+    return results
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    max_threads = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    print(f"{'threads':>8} {'encode MB/s':>12} {'decode MB/s':>12} {'speedup':>8}")
+    base = None
+    for result in run(size, max_threads):
+        base = base or result['encode_MBps']
+        print(f"{result['threads']:>8} {result['encode_MBps']:>12.0f} {result['decode_MBps']:>12.0f} "
+              f"{result['encode_MBps'] / base:>8.2f}x")
@@ -0,0 +1,63 @@
+"""
+报告可变字体在子集化前固定实例所减少的内嵌大小. 对每个字体的四种粗斜体组合分别比较：
+只子集化（保留全部变体数据）和先固定实例再子集化的字体大小.
+用法：python -m benchmark.VariableFonts 字体文件... [--text-file 字幕或文本文件]
+"""
+
+import argparse
+import string
+from font import Font
+
+STYLES = (('Regular', False, False), ('Bold', True, False), ('Italic', False, True), ('Bold Italic', True, True))
+
+
+def subsetSize(font: Font, text: str) -> int:
+    """子集化后的字体大小，font会变为内存字体"""
+    font.subset(text)
+    return len(font.read())
+
+
+def measure(path: str, text: str, index: int = 0) -> list[dict]:
+    """
+    比较一个字体各粗斜体组合的内嵌大小
+    :return: [{'style', 'axes', 'source', 'subset', 'instanced'}]，非可变字体返回空列表
+    """
+    font = Font(path, index)
+    if not font.isVariable:
+        return []
+    source_size = len(font.read())
+    subset_size = subsetSize(Font(path, index), text)  # 不固定实例时与粗斜体无关
+    results = []
+    for style_name, bold, italic in STYLES:
+        instance = font.instantiate(bold, italic)
+        results.append({'style': style_name, 'axes': font.instanceAxes(bold, italic), 'source': source_size,
+                        'subset': subset_size, 'instanced': subsetSize(instance, text)})
+    return results
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark.VariableFonts')
+    parser.add_argument('fonts', nargs='+', help='variable font files, static fonts are skipped')
+    parser.add_argument('--text-file', help='subset to the characters of this file instead of printable ASCII')
+    args = parser.parse_args(argv)
+
+    text = string.printable
+    if args.text_file:
+        with open(args.text_file, encoding='utf-8-sig', errors='ignore') as file:
+            text = ''.join(set(file.read()))
+
+    print(f"{'font / style':<36} {'source KB':>10} {'subset KB':>10} {'instanced KB':>13} {'saved':>7}")
+    for path in args.fonts:
+        results = measure(path, text)
+        if not results:
+            print(f'{path}: not a variable font, skipped')
+            continue
+        print(path)
+        for result in results:
+            saved = 1 - result['instanced'] / result['subset'] if result['subset'] else 0
+            print(f"  {result['style']:<34} {result['source'] / 1024:>10.1f} {result['subset'] / 1024:>10.1f} "
+                  f"{result['instanced'] / 1024:>13.1f} {saved:>7.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+"""性能测试工具，需在SubFontManager目录下以 python -m benchmark.<模块名> 的方式运行"""
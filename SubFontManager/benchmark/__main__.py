@@ -0,0 +1,95 @@
+"""
+基准测试入口：
+python -m benchmark run [选项] [-o 结果.json]     生成合成数据并分阶段计时
+python -m benchmark compare 基准.json 新结果.json   比较两次运行的结果
+运行时设置环境变量SFM_MEMPROFILE=输出.json，可同时得到各阶段的峰值内存和主要分配位置，作为内存基线.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from . import Stages, Synthetic
+
+
+def run(args) -> dict:
+    """生成合成数据并运行各阶段，返回可序列化的结果"""
+    params = {
+        'lines': args.lines, 'fonts': args.fonts, 'embedFonts': args.embed, 'glyphCount': args.glyphs,
+        'tagDensity': args.tag_density, 'repeatRatio': args.repeat_ratio, 'seed': args.seed,
+    }
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus = Synthetic.makeCorpus(temp_dir, **params)
+        stages = Stages.runStages(corpus, args.repeat)
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'params': params,
+            'repeat': args.repeat,
+        },
+        'stages': stages,
+    }
+
+
+def printStages(stages: dict[str, dict]):
+    """打印各阶段的计时表"""
+    print(f"{'stage':<14} {'min ms':>10} {'median ms':>10} {'mean ms':>10}")
+    for name, result in stages.items():
+        print(f"{name:<14} {result['min'] * 1000:>10.2f} {result['median'] * 1000:>10.2f} "
+              f"{result['mean'] * 1000:>10.2f}")
+
+
+def compare(basePath: str, newPath: str):
+    """比较两次运行结果的各阶段中位数耗时"""
+    with open(basePath, encoding='utf-8') as file:
+        base = json.load(file)
+    with open(newPath, encoding='utf-8') as file:
+        new = json.load(file)
+    if base['meta']['params'] != new['meta']['params']:
+        print('Warning: the two runs used different corpus parameters.')
+    print(f"{'stage':<14} {'base ms':>10} {'new ms':>10} {'change':>8}")
+    for name, new_result in new['stages'].items():
+        if name not in base['stages']:
+            continue
+        base_median = base['stages'][name]['median']
+        new_median = new_result['median']
+        change = (new_median - base_median) / base_median * 100 if base_median else 0
+        print(f"{name:<14} {base_median * 1000:>10.2f} {new_median * 1000:>10.2f} {change:>+7.1f}%")
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='generate a synthetic corpus and time each stage')
+    run_parser.add_argument('--lines', type=int, default=5000, help='number of dialogue lines')
+    run_parser.add_argument('--fonts', type=int, default=3, help='number of local fonts, the last one is a TTC')
+    run_parser.add_argument('--embed', type=int, default=1, help='number of embedded fonts')
+    run_parser.add_argument('--glyphs', type=int, default=3000, help='number of glyphs per font')
+    run_parser.add_argument('--tag-density', type=float, default=0.2, help='probability of an override tag per word')
+    run_parser.add_argument('--repeat-ratio', type=float, default=0.1, help='ratio of repeated dialogue lines')
+    run_parser.add_argument('--seed', type=int, default=0, help='random seed')
+    run_parser.add_argument('--repeat', type=int, default=5, help='runs per stage')
+    run_parser.add_argument('-o', '--output', help='write the result as JSON to this file')
+
+    compare_parser = commands.add_parser('compare', help='compare two JSON results')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        result = run(args)
+        printStages(result['stages'])
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as file:
+                json.dump(result, file, indent=2)
+    else:
+        compare(args.base, args.new)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+from array import array
+from bisect import bisect_right
+from typing import Iterable, Self
+
+
+class CharCoverage:
+    """
+    字体的字符覆盖范围，以排序的码位区间表保存，如[(0x20, 0x7E), (0x4E00, 0x9FFF)].
+    CJK字体的cmap通常由大段连续码位组成，区间表比码位集合小得多，查询时用二分查找.
+    """
+
+    def __init__(self, codepoints: Iterable[int] = ()):
+        """
+        :param codepoints: 覆盖的码位，可以无序、有重复
+        """
+        self._starts = array('I')   # 各区间的起始码位，升序排列
+        self._ends = array('I')     # 各区间的结束码位（包含）
+        self._count = 0     # 覆盖的码位总数
+        for cp in sorted(set(codepoints)):
+            if self._ends and cp == self._ends[-1] + 1:  # 与上一个区间相连，延长上一个区间
+                self._ends[-1] = cp
+            else:
+                self._starts.append(cp)
+                self._ends.append(cp)
+            self._count += 1
+
+    @classmethod
+    def fromCmap(cls, cmap: dict[int, str] | None) -> Self:
+        """从TTFont.getBestCmap()的结果创建"""
+        return cls(cmap.keys() if cmap else ())
+
+    def covers(self, codepoint: int) -> bool:
+        """是否覆盖给定的码位"""
+        i = bisect_right(self._starts, codepoint) - 1
+        return i >= 0 and codepoint <= self._ends[i]
+
+    def missing(self, chars: Iterable[str]) -> set[str]:
+        """
+        计算缺失的字符，即 需要的字符 - 覆盖的字符
+        :param chars: 需要的字符集合
+        :return: 缺失的字符集合，全部覆盖则为空集合
+        """
+        return set(c for c in chars if not self.covers(ord(c)))
+
+    @property
+    def ranges(self) -> list[tuple[int, int]]:
+        """码位区间表"""
+        return list(zip(self._starts, self._ends))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, char: str) -> bool:
+        return self.covers(ord(char))
@@ -1,10 +1,15 @@
 import os
 import io
-from typing import Self
-from fontTools.ttLib import TTFont
-from fontTools.ttLib.ttCollection import TTCollection
-from fontTools.subset import Subsetter, Options
-from utils import Lang
+import shutil
+from typing import Self, TYPE_CHECKING
+from utils import Lang, Trace
+from .TTCExtractor import TTCExtractor
+from .CharCoverage import CharCoverage
+from .FontArchive import FontArchive
+
+# fontTools导入较慢，在首次使用时才导入，以加快程序启动
+if TYPE_CHECKING:
+    from fontTools.ttLib import TTFont
 
 
 class Font:
@@ -20,10 +25,29 @@ class Font:
     STYLE_NORMAL = 0
     STYLE_OBLIQUE = 1
     STYLE_ITALIC = 2
+    # 子集化方案 -----
+    SUBSET_DEFAULT = 'default'  # fontTools的缺省参数
+    SUBSET_SIZE = 'size'        # 体积优先
+    # 体积优先方案保留的排版特性，即libass（HarfBuzz）缺省开启的特性，加上文本中出现的文字所需的特性 -----
+    BASE_FEATURES = ('ccmp', 'locl', 'rlig', 'rvrn', 'rclt', 'calt', 'clig', 'liga', 'kern', 'dist', 'curs',
+                     'mark', 'mkmk', 'abvm', 'blwm')
+    SCRIPT_FEATURES = (    # ((码位范围, ...), 特性)
+        (((0x0590, 0x08FF), (0x1800, 0x18AF), (0xFB1D, 0xFDFF), (0xFE70, 0xFEFF)),     # 希伯来、阿拉伯、叙利亚、蒙古文等
+         ('init', 'medi', 'fina', 'isol', 'med2', 'fin2', 'fin3', 'rtla', 'rtlm')),
+        (((0x0900, 0x0DFF), (0x0F00, 0x109F), (0x1780, 0x17FF), (0xA8E0, 0xA8FF)),     # 印度系、藏、缅、高棉文等
+         ('nukt', 'akhn', 'rphf', 'rkrf', 'pref', 'blwf', 'abvf', 'half', 'pstf', 'vatu', 'cjct', 'init', 'pres',
+          'abvs', 'blws', 'psts', 'haln', 'cfar')),
+        (((0x1100, 0x11FF), (0x3130, 0x318F), (0xA960, 0xA97F), (0xD7B0, 0xD7FF)),     # 韩文字母
+         ('ljmo', 'vjmo', 'tjmo')),
+    )
+    VERTICAL_FEATURES = ('vert', 'vrt2')    # 竖排（@字体名）时libass开启的特性
 
-    def __init__(self, path: str, index: int = 0, inMemory: bool = False, openNow: bool = True):
-        self.path: str = path   # 字体文件路径，内存字体则此值随意指定
+    def __init__(self, path: str, index: int = 0, inMemory: bool = False, openNow: bool = True,
+                 archive: str = '', member: str = ''):
+        self.path: str = path   # 字体文件路径，内存字体则此值随意指定，字体包内的字体为 包路径/成员路径
         self.index: int = index # 字体在路径内的编号
+        self.archive: str = archive # 字体所在的zip字体包路径，为空则不在字体包内
+        self.member: str = member   # 字体在字体包内的成员名
         self.inTTC: bool = os.path.splitext(path)[1].lower().endswith('.ttc')   # 字体是否在TTC文件内
         self.postscriptName: str = ''       # Postscript名，是字体的唯一标识
         self.familyNames: set[str] = set()  # 字体家族名，包括各种语言的版本
@@ -33,12 +57,15 @@ class Font:
         self.style: int = 0     # 风格，0: Normal，1: Oblique，2: Italic
         self.inMemory: bool = inMemory      # 是否内存字体，即字幕内嵌字体
         self._byteStream: io.BytesIO | None = None  # 字体的数据字节流
+        self._coverage: CharCoverage | None = None  # 字符覆盖范围，首次使用时从cmap表读取并缓存
+        self._axes: dict[str, tuple[float, float, float]] | None = None    # 可变字体的变体轴，首次使用时读取并缓存
+        self._instances: dict[tuple, bytes] = {}    # 可变字体已生成的静态实例数据 {坐标: 字体数据}
 
-        if openNow and os.path.isfile(self.path) and os.access(self.path, os.R_OK):  # 检查路径
+        if openNow and os.path.isfile(self.sourcePath) and os.access(self.sourcePath, os.R_OK):  # 检查路径
             with self.open() as ttf_font:   # 打开字体并读取信息
                 self._readInfo(ttf_font)
 
-    def _readInfo(self, ttFont: TTFont):
+    def _readInfo(self, ttFont: 'TTFont'):
         """读取字体信息，包括各种名表"""
         style_name: str = ''
         name_table = ttFont.get('name')
@@ -88,29 +115,68 @@ class Font:
         """是否斜体"""
         return self.style == self.STYLE_ITALIC or self.style == self.STYLE_OBLIQUE
 
+    @property
+    def size(self) -> int:
+        """字体数据的字节数，即内嵌或保存后的大小. TTC内的字体只读取表目录计算"""
+        if self._byteStream:
+            return len(self._byteStream.getvalue())
+        if self.inTTC:
+            with (FontArchive.open(self.archive, self.member) if self.archive else open(self.path, 'rb')) as file:
+                return TTCExtractor.faceSize(file, self.index)
+        if self.archive:
+            return FontArchive.memberSize(self.archive, self.member)
+        return os.path.getsize(self.path)
+
+    @property
+    def sourcePath(self) -> str:
+        """字体数据所在的实际文件路径，字体包内的字体为字体包路径"""
+        return self.archive or self.path
+
     @classmethod
     def createFontsFromFile(cls, path: str) -> list[Self]:
-        """从指定的字体文件内读取所有的字体并创建实例，读取错误的字体将被忽略"""
+        """
+        从指定的字体文件内读取所有的字体并创建实例，读取错误的字体将被忽略.
+        path也可以是zip字体包，此时读取包内所有字体文件中的字体，不解压字体包
+        """
+        if not os.path.isfile(path) or not os.access(path, os.R_OK):  # 检查路径
+            return []
+        if FontArchive.isArchive(path):
+            from .FontManager import FontManager
+            try:
+                members = FontArchive.listFonts(path, FontManager.FONT_EXTS)
+            except Exception:
+                return []
+            fonts = []
+            for member in members:
+                fonts.extend(cls._createFontsFromSource(FontArchive.memberPath(path, member), path, member))
+            return fonts
+        return cls._createFontsFromSource(path)
+
+    @classmethod
+    def _createFontsFromSource(cls, path: str, archive: str = '', member: str = '') -> list[Self]:
+        """读取字体文件或字体包成员内的所有字体，只读取名表和OS/2表，参数同__init__"""
+        from fontTools.ttLib import TTFont, TTCollection
         font_collection: TTCollection | None = None
         fonts: list[cls] = []
         try:
             # 打开文件 -------
-            if not os.path.isfile(path) or not os.access(path, os.R_OK):  # 检查路径
-                return []
+            # 字体包成员用lazy模式，只按区间读取名表和OS/2表；普通文件保持原样整个读入
+            source, lazy = (FontArchive.open(archive, member), True) if archive else (path, None)
             if os.path.splitext(path)[1].lower().endswith('.ttc'):
-                font_collection = TTCollection(path)
+                font_collection = TTCollection(source, lazy=lazy)
             else:
                 font_collection = TTCollection()
-                font_collection.fonts.append(TTFont(path))
+                font_collection.fonts.append(TTFont(source, lazy=lazy))
 
             for i, ttf_font in enumerate(font_collection):  # type: int, TTFont
-                font = cls(path, i, openNow=False)
+                font = cls(path, i, openNow=False, archive=archive, member=member)
                 font._readInfo(ttf_font)
                 fonts.append(font)
         except Exception:
             fonts = []
         finally:
-            font_collection.close()  # 关闭文件
+            if font_collection:
+                font_collection.close()  # 关闭文件
 
         return fonts
 
@@ -120,50 +186,179 @@ class Font:
         try:
             font = cls(path, index, inMemory=True, openNow=False)
             font._byteStream = file  # 保存字节流，用于未来打开字体
+            from fontTools.ttLib import TTFont
             with TTFont(file) as ttf_font:
                 font._readInfo(ttf_font)
             return font
         except Exception:
             return None
 
+    def copyAs(self, path: str, index: int = 0) -> Self:
+        """
+        创建数据相同的另一个内存字体，共享已读取的字体信息和字体数据，不再解析. 用于内容相同的重复内嵌字体
+        :param path: 新字体的路径，即内嵌名
+        :param index: 新字体在同名内嵌字体中的序号
+        """
+        font = self.__class__(path, index, inMemory=True, openNow=False)
+        font.postscriptName = self.postscriptName
+        font.familyNames, font.fullNames, font.styleNames = self.familyNames, self.fullNames, self.styleNames
+        font.weight, font.style = self.weight, self.style
+        font._byteStream = io.BytesIO(self._byteStream.getvalue())  # 各自的字节流，底层数据不拷贝
+        font._coverage = self._coverage
+        return font
+
     @staticmethod
     def decodeNameRecord(record) -> str:
         """解码二进制表名记录"""
         return record.string.decode(record.getEncoding(), errors='ignore')
 
-    def open(self) -> TTFont:
+    def open(self) -> 'TTFont':
         """打开字体，返回TTFont"""
-        if self.inMemory:
-            self._byteStream.seek(0)
-            return TTFont(self._byteStream, lazy=True)
-        if not os.access(self.path, os.R_OK):
-            raise Exception(Lang['Unable to read file {p}.'].format(p=self.path))
+        from fontTools.ttLib import TTFont, TTCollection
+        if self.inMemory:   # 用共享数据的新流打开，关闭TTFont时会关闭流，不能影响字体自己的流
+            return TTFont(io.BytesIO(self._byteStream.getvalue()), lazy=True)
+        if not os.access(self.sourcePath, os.R_OK):
+            raise Exception(Lang['Unable to read file {p}.'].format(p=self.sourcePath))
+        source = FontArchive.open(self.archive, self.member) if self.archive else self.path
         if self.inTTC:
-            return TTCollection(self.path, lazy=True)[self.index]   # lazy模式，只打开访问过的TTFont
+            return TTCollection(source, lazy=True)[self.index]   # lazy模式，只打开访问过的TTFont
         else:  # ttf、otf
-            return TTFont(self.path, lazy=True)
+            return TTFont(source, lazy=True)
 
     def read(self, size: int = None) -> bytes:
         """以二进制方式读取字体数据"""
         if self._byteStream:    # 内存字体，返回内存数据
+            if size is None:    # 读取全部数据时，getvalue可直接共享BytesIO内部的bytes，无需拷贝
+                return self._byteStream.getvalue()
             self._byteStream.seek(0)
             return self._byteStream.read(size)
-        elif self.inTTC:    # 来自TTC文件，从里面提取TTF
-            with self.open() as ttf_font:
-                buffer = io.BytesIO()
-                ttf_font.save(buffer)
-                return buffer.getvalue()
+        elif self.inTTC:    # 来自TTC文件，直接在字节层面从里面提取TTF
+            buffer = io.BytesIO()
+            with (FontArchive.open(self.archive, self.member) if self.archive else open(self.path, 'rb')) as file:
+                TTCExtractor.extract(file, self.index, buffer)
+            return buffer.getvalue()
+        elif self.archive:  # 来自字体包，读取成员的全部数据
+            return FontArchive.read(self.archive, self.member)
         else:   # 来自TTF文件，直接读源文件数据
             with open(self.path, 'rb') as file:
                 return file.read()
 
-    def subset(self, text: str, reserveNames: list[str] = None, **kwargs):
+    @property
+    def coverage(self) -> CharCoverage:
+        """字符覆盖范围，首次访问时只读取cmap表来创建，之后使用缓存"""
+        if self._coverage is None:
+            with self.open() as ttf_font:
+                self._coverage = CharCoverage.fromCmap(ttf_font.getBestCmap())
+        return self._coverage
+
+    def getMissingChars(self, chars: set[str] | str) -> set[str]:
+        """
+        检查字体是否覆盖给定的字符
+        :param chars: 需要覆盖的字符集合
+        :return: 字体中缺失的字符集合，全部覆盖则为空集合
+        """
+        return self.coverage.missing(chars)
+
+    @property
+    def variationAxes(self) -> dict[str, tuple[float, float, float]]:
+        """可变字体的变体轴 {轴标签: (最小值, 缺省值, 最大值)}，非可变字体为空. 首次访问时读取fvar表并缓存"""
+        if self._axes is None:
+            with self.open() as ttf_font:
+                self._axes = {axis.axisTag: (axis.minValue, axis.defaultValue, axis.maxValue)
+                              for axis in ttf_font['fvar'].axes} if 'fvar' in ttf_font else {}
+        return self._axes
+
+    @property
+    def isVariable(self) -> bool:
+        """是否可变字体"""
+        return bool(self.variationAxes)
+
+    def instanceAxes(self, bold: bool, italic: bool) -> dict[str, float]:
+        """
+        计算与粗体、斜体要求对应的实例坐标，所有轴都会被固定. libass只会渲染缺省实例，
+        因此非粗体、非斜体时保持缺省值，粗体时字重取700（不低于缺省值），斜体时优先使用ital轴，没有再使用slnt轴
+        :return: {轴标签: 坐标}，非可变字体为空
+        """
+        location = {tag: default for tag, (_, default, _) in self.variationAxes.items()}
+        if bold and 'wght' in location:
+            minimum, default, maximum = self.variationAxes['wght']
+            location['wght'] = max(default, min(max(self.WEIGHT_BOLD, minimum), maximum))
+        if italic and 'ital' in location:
+            location['ital'] = self.variationAxes['ital'][2]
+        elif italic and 'slnt' in location:
+            location['slnt'] = self.variationAxes['slnt'][0]  # slnt为负值时向右倾斜
+        return location
+
+    @Trace.traced('Font.instantiate', stage=True)
+    def instantiate(self, bold: bool, italic: bool) -> Self:
+        """
+        把可变字体固定为与粗体、斜体要求对应的静态实例，去掉所有变体数据. 同一坐标的实例数据会缓存在字体内
+        :return: 实例的内存字体，非可变字体返回自身
+        """
+        location = self.instanceAxes(bold, italic)
+        if not location:
+            return self
+        key = tuple(sorted(location.items()))
+        data = self._instances.get(key)
+        if data is None:
+            from fontTools.ttLib import TTFont
+            from fontTools.varLib.instancer import instantiateVariableFont   # 模块很大，只在需要时导入
+            with TTFont(io.BytesIO(self.read())) as ttf_font:
+                instance = instantiateVariableFont(ttf_font, location)  # 字重会写入OS/2，粗斜体标志需要自己设置
+                os2, head = instance['OS/2'], instance['head']
+                if location.get('wght', 0) >= self.WEIGHT_BOLD:
+                    os2.fsSelection = os2.fsSelection & ~0x40 | 0x20   # 去掉REGULAR，加BOLD
+                    head.macStyle |= 0x01
+                if location.get('ital', 0) > 0 or location.get('slnt', 0) < 0:
+                    os2.fsSelection = os2.fsSelection & ~0x40 | 0x01   # 去掉REGULAR，加ITALIC
+                    head.macStyle |= 0x02
+                out_stream = io.BytesIO()
+                instance.save(out_stream)
+            data = self._instances[key] = out_stream.getvalue()
+        return self.createFontFromBytes(io.BytesIO(data), self.path, 0)
+
+    def cachedInstanceData(self, bold: bool, italic: bool) -> bytes | None:
+        """已缓存的实例数据（见instantiate），还没有生成过或不是可变字体则返回None"""
+        location = self.instanceAxes(bold, italic)
+        return self._instances.get(tuple(sorted(location.items()))) if location else None
+
+    def cacheInstanceData(self, bold: bool, italic: bool, data: bytes):
+        """缓存在别处（子集化工作进程中）生成的实例数据，之后instantiate和cachedInstanceData直接使用"""
+        location = self.instanceAxes(bold, italic)
+        if location:
+            self._instances[tuple(sorted(location.items()))] = data
+
+    @classmethod
+    def sizeProfileOptions(cls, text: str, vertical: bool = False) -> dict:
+        """
+        体积优先子集化方案的Subsetter参数：去掉hinting，只保留文本所用文字需要的排版特性，
+        名表只保留家族名、子族名、全名和Postscript名（GDI/VSFilter等都依赖这几个名字），其他记录都去掉
+        :param text: 子集字符集合，用于判断需要哪些文字的排版特性
+        :param vertical: 是否竖排（字体名以@开头引用），需要保留竖排字形替换
+        """
+        features = list(cls.BASE_FEATURES)
+        code_points = {ord(c) for c in text}
+        for ranges, script_features in cls.SCRIPT_FEATURES:
+            if any(start <= code_point <= end for code_point in code_points for start, end in ranges):
+                features += script_features
+        if vertical:
+            features += cls.VERTICAL_FEATURES
+        name_ids = [cls.FamilyNameID, cls.SubfamilyNameID, cls.FullNameID, cls.PostscriptNameID]
+        return {'hinting': False, 'layout_features': features, 'name_IDs': name_ids}
+
+    @Trace.traced('Font.subset', stage=True)
+    def subset(self, text: str, reserveNames: list[str] = None, profile: str = SUBSET_DEFAULT,
+               vertical: bool = False, **kwargs):
         """
         字体子集化
         :param text: 子集字符集合
         :param reserveNames: 名表中需要保留的引用名字
-        :param kwargs: Subsetter子集化参数
+        :param profile: 子集化方案，SUBSET_DEFAULT使用fontTools的缺省参数，SUBSET_SIZE见sizeProfileOptions
+        :param vertical: 字体是否被竖排引用，仅对SUBSET_SIZE有意义
+        :param kwargs: Subsetter子集化参数，优先于方案的参数
         """
+        if profile == self.SUBSET_SIZE:
+            kwargs = self.sizeProfileOptions(text, vertical) | kwargs
         name_ids = [self.PostscriptNameID, self.FullNameID, self.FamilyNameID]  # 查找名字的类型范围和顺序
         with self.open() as ttf_font:
             if reserveNames:
@@ -172,14 +367,15 @@ class Font:
                 preserved_names = []    # 需要保留的名字记录表
                 for name in reserveNames:
                     for name_id in name_ids:
-                        name_record = next((record for record in name_list if record.nameID == name_id
-                                            and self.decodeNameRecord(record).lower() == name), None)
-                        if name_record: # 把相同的名字记录保存下来
-                            preserved_names.append(name_record)
+                        name_records = [record for record in name_list if record.nameID == name_id
+                                        and self.decodeNameRecord(record).lower() == name]
+                        if name_records:    # 把相同的名字记录保存下来，各平台的都要，libass只读取Windows平台的名字
+                            preserved_names += name_records if profile == self.SUBSET_SIZE else name_records[:1]
 
             # 子集化 ---------
             if 'ignore_missing_glyphs' not in kwargs:
                 kwargs['ignore_missing_glyphs'] = True  # 忽略缺失字形错误
+            from fontTools.subset import Subsetter, Options     # 子集化模块很大，只在需要时导入
             subsetter = Subsetter(options=Options(**kwargs))
             subsetter.populate(text=text)
             subsetter.subset(ttf_font)
@@ -198,10 +394,16 @@ class Font:
             out_stream = io.BytesIO()
             ttf_font.save(out_stream)  # 保存到内存字节流
 
+        self.setSubsetData(out_stream)
+
+    def setSubsetData(self, data: io.BytesIO | bytes):
+        """用子集化的结果替换字体数据，字体变为内存字体. 子集化在其他进程中完成时用它接收结果"""
         if self._byteStream:
             self._byteStream.close()
-        self._byteStream = out_stream
+        self._byteStream = data if isinstance(data, io.BytesIO) else io.BytesIO(data)
         self.inMemory = True  # 子集化后字体自动变内存字体
+        self._coverage = None   # 子集化后覆盖范围变了，需要重新读取
+        self._instances.clear() # 已生成的实例来自子集化前的数据
 
     def save(self, path: str):
         """保存字体到路径"""
@@ -211,9 +413,15 @@ class Font:
             self._byteStream.seek(0)
             with open(path, 'wb') as file:
                 file.write(self._byteStream.read())
-        else:
-            with self.open() as ttf_font:
-                ttf_font.save(path)
+        elif self.inTTC:    # 来自TTC文件，提取TTF后直接流式写入
+            with (FontArchive.open(self.archive, self.member) if self.archive else open(self.path, 'rb')) as src_file, \
+                    open(path, 'wb') as dst_file:
+                TTCExtractor.extract(src_file, self.index, dst_file)
+        elif self.archive:  # 来自字体包，写出成员数据
+            with open(path, 'wb') as file:
+                file.write(FontArchive.read(self.archive, self.member))
+        else:   # 来自TTF文件，直接拷贝源文件
+            shutil.copyfile(self.path, path)
 
     def __del__(self):
         """析构函数，关闭流"""
@@ -0,0 +1,119 @@
+import io
+import os
+import struct
+import zipfile
+from typing import BinaryIO
+
+
+class _MemberFile(io.RawIOBase):
+    """zip包内未压缩成员的只读文件对象，直接按偏移读取包文件中的对应区间，不读入整个成员"""
+
+    def __init__(self, archive: str, offset: int, size: int):
+        self._file = open(archive, 'rb')
+        self._offset = offset   # 成员数据在包文件中的起始偏移
+        self._size = size
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = max(offset, 0)
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        size = max(min(len(buffer), self._size - self._pos), 0)
+        if not size:
+            return 0
+        self._file.seek(self._offset + self._pos)
+        size = self._file.readinto(memoryview(buffer)[:size])
+        self._pos += size
+        return size
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+class FontArchive:
+    """
+    zip字体包的读取工具. 字体包不需要解压，成员按需读取：
+    未压缩（STORED）的成员直接按区间读取，解析名表时只读到需要的几个表；压缩的成员只能整个解压到内存.
+    """
+
+    EXTS = ['.zip']     # 支持的字体包后缀名
+    _localHeader = struct.Struct('<4sHHHHHIIIHH')   # zip本地文件头，最后两项是文件名长度和扩展字段长度
+
+    @classmethod
+    def isArchive(cls, path: str) -> bool:
+        """是否字体包"""
+        return os.path.splitext(path)[1].lower() in cls.EXTS
+
+    @staticmethod
+    def memberPath(archive: str, member: str) -> str:
+        """成员的显示路径，形如 包路径/成员路径，同时用作字体的唯一路径"""
+        return os.path.join(archive, *member.split('/'))
+
+    @classmethod
+    def splitMemberPath(cls, path: str) -> tuple[str, str] | None:
+        """
+        将memberPath生成的显示路径拆回 (包路径, 成员名)
+        :return: 路径不在字体包内则返回None
+        """
+        archive = os.path.dirname(path)
+        while archive and archive != os.path.dirname(archive):
+            if cls.isArchive(archive) and os.path.isfile(archive):
+                return archive, os.path.relpath(path, archive).replace(os.sep, '/')
+            archive = os.path.dirname(archive)
+        return None
+
+    @classmethod
+    def listFonts(cls, archive: str, fontExts: list[str]) -> list[str]:
+        """
+        列出包内的字体成员
+        :param fontExts: 字体文件后缀名
+        :return: 成员名列表，加密的成员会被忽略
+        """
+        with zipfile.ZipFile(archive) as zip_file:
+            return [info.filename for info in zip_file.infolist()
+                    if not info.is_dir() and not info.flag_bits & 0x1
+                    and os.path.splitext(info.filename)[1].lower() in fontExts]
+
+    @classmethod
+    def open(cls, archive: str, member: str) -> BinaryIO:
+        """
+        打开包内的成员，返回可seek的二进制文件对象. 未压缩的成员按区间读取，压缩的成员解压到内存
+        """
+        with zipfile.ZipFile(archive) as zip_file:
+            info = zip_file.getinfo(member)
+            if info.compress_type != zipfile.ZIP_STORED:
+                return io.BytesIO(zip_file.read(info))
+        with open(archive, 'rb') as file:   # 数据区在本地文件头之后，本地文件头的长度可能与中央目录中的不同
+            file.seek(info.header_offset)
+            header = cls._localHeader.unpack(file.read(cls._localHeader.size))
+        if header[0] != b'PK\x03\x04':
+            raise zipfile.BadZipFile(f'Bad local file header: {member}')
+        offset = info.header_offset + cls._localHeader.size + header[-2] + header[-1]
+        return io.BufferedReader(_MemberFile(archive, offset, info.file_size))
+
+    @staticmethod
+    def memberSize(archive: str, member: str) -> int:
+        """包内成员解压后的大小"""
+        with zipfile.ZipFile(archive) as zip_file:
+            return zip_file.getinfo(member).file_size
+
+    @classmethod
+    def read(cls, archive: str, member: str) -> bytes:
+        """读取包内成员的全部数据"""
+        with zipfile.ZipFile(archive) as zip_file:
+            return zip_file.read(member)
@@ -0,0 +1,82 @@
+import os
+import re
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+
+class FontExporter:
+    """
+    把字体导出为字幕旁的独立文件，并生成mkvmerge附件清单，用于把字体作为MKV容器附件而不是UU编码内嵌到字幕中.
+    内容相同的字体只写一份，哈希计算和文件写入都在线程池中并发进行（hashlib和文件写入都会释放GIL）.
+    """
+
+    WORKERS = 4     # 并发写入的线程数
+    MIME_TYPE = 'application/x-truetype-font'   # 附件的MIME类型，VSFilter和各播放器都能识别
+    FONT_EXTS = ('.ttf', '.otf')    # 导出文件的后缀名，其他后缀会补上.ttf
+    _invalidChars_ptn = re.compile(r'[\\/:*?"<>|\x00-\x1f]')   # 文件名中不允许的字符
+
+    @classmethod
+    def fileName(cls, name: str) -> str:
+        """把内嵌字体名转换为可用的文件名，内嵌名可能带有路径分隔符或没有字体后缀"""
+        name = cls._invalidChars_ptn.sub('_', name).strip(' .') or 'font'
+        return name if os.path.splitext(name)[1].lower() in cls.FONT_EXTS else name + '.ttf'
+
+    @staticmethod
+    def _writeFile(path: str, data: bytes) -> bool:
+        """写入文件，内容相同的现有文件不重写，返回是否实际写入"""
+        try:
+            if os.path.getsize(path) == len(data):
+                with open(path, 'rb') as file:
+                    if file.read() == data:
+                        return False
+        except OSError:
+            pass
+        temp_path = path + '.tmp'   # 先写临时文件再替换，避免留下写了一半的字体
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, path)
+        return True
+
+    @classmethod
+    def export(cls, fonts: dict[str, bytes], directory: str) -> dict[str, str]:
+        """
+        按内容去重后把字体并发写入目录
+        :param fonts: {内嵌字体名: 字体数据}
+        :param directory: 输出目录，不存在则创建
+        :return: {文件路径: 内嵌字体名}，每份内容只有一项，取第一个使用它的名字
+        """
+        os.makedirs(directory, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=cls.WORKERS) as pool:
+            digests = list(pool.map(lambda data: hashlib.sha256(data).digest(), fonts.values()))
+            unique: dict[bytes, tuple[str, bytes]] = {}  # {哈希: (内嵌字体名, 字体数据)}
+            for (name, data), digest in zip(fonts.items(), digests):
+                unique.setdefault(digest, (name, data))
+
+            files: dict[str, str] = {}
+            used_names: set[str] = set()    # 已用的小写文件名，Windows和Mac的文件系统不区分大小写
+            for name, data in unique.values():  # 文件名去重，不同内容的字体可能有相同的文件名
+                file_name = cls.fileName(name)
+                stem, ext = os.path.splitext(file_name)
+                i = 2
+                while file_name.lower() in used_names:
+                    file_name = f'{stem}_{i}{ext}'
+                    i += 1
+                used_names.add(file_name.lower())
+                files[os.path.join(directory, file_name)] = name
+            list(pool.map(cls._writeFile, files, (data for _, data in unique.values())))
+        return files
+
+    @classmethod
+    def writeManifest(cls, path: str, files: list[str]):
+        """
+        写出mkvmerge的选项文件，内容是JSON数组形式的--attach-file等参数，用法：mkvmerge -o 输出.mkv @清单.json 输入...
+        :param path: 清单文件路径
+        :param files: 字体文件路径，写入为绝对路径
+        """
+        args = []
+        for file_path in files:
+            args += ['--attachment-mime-type', cls.MIME_TYPE, '--attachment-name', os.path.basename(file_path),
+                     '--attach-file', os.path.abspath(file_path)]
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(args, file, ensure_ascii=False, indent=2)
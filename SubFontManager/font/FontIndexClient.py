@@ -0,0 +1,108 @@
+import os
+import json
+import time
+import socket
+import threading
+from typing import Self
+from utils.App import App
+
+
+class FontIndexClient:
+    """
+    字体索引服务（FontIndexServer）的客户端. 服务没有运行时get()返回None，调用方应退回进程内匹配.
+    服务是可选的，只有用环境变量SFM_FONT_INDEX_PORT或配置文件[General]中的font_index_port指定了端口时才使用，
+    未指定或为0则不连接，避免探测本机端口，也避免把字幕内容和路径发给恰好占用了该端口的其他程序.
+    """
+
+    DEFAULT_PORT = 47823    # 服务缺省监听的端口，客户端仍需指定端口才会使用服务
+    HOST = '127.0.0.1'  # 服务只监听本机
+    CONNECT_TIMEOUT = 0.2   # 连接超时，服务没运行时端口会立刻拒绝连接，这个超时只防止异常情况卡住
+    REQUEST_TIMEOUT = 30    # 单次请求超时，服务首次索引一个目录可能较慢
+    RETRY_INTERVAL = 30     # 连接失败后，这么多秒内不再尝试
+    PROTOCOL_VERSION = 2    # 协议版本，与服务不一致时不使用服务
+
+    _instance: Self | None = None   # 进程内共享的客户端
+    _retryTime: float = 0   # 下次可以尝试连接的时间
+    _lock = threading.Lock()
+
+    @classmethod
+    def port(cls) -> int:
+        """服务端口，没有指定或为0表示不使用服务"""
+        setting = os.environ.get('SFM_FONT_INDEX_PORT') or \
+            App.Config.get('General', 'font_index_port', '', saveDefault=False)
+        try:
+            return int(setting) if setting else 0
+        except ValueError:
+            return 0
+
+    @classmethod
+    def get(cls) -> Self | None:
+        """获取已连接的客户端，服务没有运行或被禁用时返回None"""
+        with cls._lock:
+            if cls._instance is None and time.monotonic() >= cls._retryTime:
+                port = cls.port()
+                try:
+                    if not port:
+                        raise ConnectionError('Font index service disabled.')
+                    cls._instance = cls(port)
+                except (OSError, ValueError):
+                    cls._retryTime = time.monotonic() + cls.RETRY_INTERVAL
+            return cls._instance
+
+    @classmethod
+    def discard(cls):
+        """通信出错时丢弃客户端，之后的查询退回进程内匹配"""
+        with cls._lock:
+            if cls._instance:
+                cls._instance.close()
+            cls._instance = None
+            cls._retryTime = time.monotonic() + cls.RETRY_INTERVAL
+
+    def __init__(self, port: int):
+        # 握手也用连接超时，端口被其他不应答的程序占用时不会卡住REQUEST_TIMEOUT秒
+        self._socket = socket.create_connection((self.HOST, port), timeout=self.CONNECT_TIMEOUT)
+        self._file = self._socket.makefile('rwb')
+        self._requestLock = threading.Lock()    # 同一连接上的请求和应答必须成对进行
+        try:
+            response = self.request({'op': 'ping'})
+            if not response.get('ok'):
+                raise ConnectionError('Font index service is not responding.')
+            if response.get('version') != self.PROTOCOL_VERSION:
+                raise ConnectionError('Font index service protocol version mismatch.')
+        except Exception:
+            self.close()
+            raise
+        self._socket.settimeout(self.REQUEST_TIMEOUT)
+
+    def request(self, message: dict) -> dict:
+        """发送一个请求并等待应答，请求和应答都是一行json"""
+        with self._requestLock:
+            self._file.write(json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n')
+            self._file.flush()
+            line = self._file.readline()
+        if not line:
+            raise ConnectionError('Font index service closed the connection.')
+        return json.loads(line)
+
+    def match(self, fontName: str, bold: bool, italic: bool, scope: int, directory: str | None,
+              text: set[str] = None) -> tuple[str, int, str, str] | None:
+        """
+        请求服务匹配字体，参数含义同FontManager.match
+        :param directory: 本地字体目录，为None则只在系统字体中查找
+        :return: (字体文件路径, 字体在文件内的序号, 字体包路径, 包内成员名)，找不到则返回None
+        """
+        response = self.request({
+            'op': 'match', 'name': fontName, 'bold': bold, 'italic': italic, 'scope': scope,
+            'dir': directory, 'text': ''.join(text) if text else '',
+        })
+        if not response.get('ok'):
+            raise ConnectionError(response.get('error', 'Font index service error.'))
+        font = response.get('font')
+        return (font[0], font[1], font[2], font[3]) if font else None
+
+    def close(self):
+        try:
+            self._file.close()
+            self._socket.close()
+        except OSError:
+            pass
@@ -0,0 +1,205 @@
+import os
+import mmap
+import struct
+from typing import Iterable
+from .Font import Font
+from .FontInfo import FontInfo
+from .FontArchive import FontArchive
+
+
+class FontIndexFile:
+    """
+    可内存映射的二进制字体索引文件. 一次解析字体库后导出，之后各处直接映射使用，不必再解析字体文件.
+    文件结构（小端序）：
+        文件头   HEADER：魔数、版本、标志、字体数、名字数、各表偏移
+        字体表   FONT_RECORD × 字体数：路径、字体包成员名、序号、字重、风格、该字体的名字在名字引用表中的范围
+        名字表   NAME_RECORD × 名字数：按 (名字, 类型, 字体号) 排序，可直接二分查找
+        名字引用表 u32 × 名字数：按字体分组的名字表序号，用于还原各字体的名字集合
+        字符串表 所有路径和名字的UTF-8字节，相同字符串只存一份
+    查找时只解包命中的记录，字体记录（FontInfo）在首次命中时才创建，因此载入耗时与字体数量无关.
+    """
+
+    MAGIC = b'SFMI'
+    VERSION = 2
+    FLAG_RELATIVE = 0x01    # 路径相对于索引文件所在目录
+
+    # 名字类型 -------
+    POSTSCRIPT = 0
+    FAMILY = 1
+    FULL = 2
+
+    # 各种记录的结构 -------
+    HEADER = struct.Struct('<4sHHIIIIIII')  # 魔数, 版本, 标志, 字体数, 名字数, 字体表/名字表/引用表/字符串表偏移, 字符串表长度
+    # 路径偏移, 路径长度, 成员名偏移, 成员名长度, 序号, 字重, 风格, 名字引用起点, 名字引用数. 字体包内的字体，路径为字体包路径
+    FONT_RECORD = struct.Struct('<IIIIHHBxxxII')
+    NAME_RECORD = struct.Struct('<IHBxI')   # 名字偏移, 名字长度, 类型, 字体号
+    NAME_REF = struct.Struct('<I')
+
+    def __init__(self, path: str):
+        """
+        映射索引文件，只读取文件头
+        :param path: 索引文件路径
+        """
+        self.path = path
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, flags, self.fontCount, self.nameCount, self._fontOffset, self._nameOffset,
+             self._refOffset, self._stringOffset, string_size) = self.HEADER.unpack_from(self._map, 0)
+        except struct.error:
+            magic, version = b'', 0
+        if magic != self.MAGIC or version != self.VERSION:
+            self._map.close()
+            raise ValueError(f'Unsupported font index file: {path}')
+        # 相对路径的基准目录 -----
+        self._baseDir = os.path.dirname(os.path.abspath(path)) if flags & self.FLAG_RELATIVE else ''
+        self._records: dict[int, FontInfo] = {}    # 已创建的字体记录 {字体号: 记录}
+
+    def __len__(self) -> int:
+        return self.fontCount
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._stringOffset + offset
+        return self._map[start:start + length].decode('utf-8')
+
+    def _nameKey(self, i: int) -> tuple[bytes, int, int]:
+        """名字表第i项的排序键 (名字字节, 类型, 字体号)"""
+        offset, length, kind, font_id = self.NAME_RECORD.unpack_from(self._map, self._nameOffset + i * self.NAME_RECORD.size)
+        start = self._stringOffset + offset
+        return self._map[start:start + length], kind, font_id
+
+    def record(self, fontId: int) -> FontInfo:
+        """获取字体记录，首次获取时解包创建，不打开字体文件"""
+        record = self._records.get(fontId)
+        if record is None:
+            path_offset, path_length, member_offset, member_length, index, weight, style, ref_start, ref_count = \
+                self.FONT_RECORD.unpack_from(self._map, self._fontOffset + fontId * self.FONT_RECORD.size)
+            path = self._string(path_offset, path_length)
+            if self._baseDir:
+                path = os.path.join(self._baseDir, path)
+            member = self._string(member_offset, member_length)
+            names: tuple[list[str], list[str], list[str]] = ([], [], [])   # 按名字类型分组
+            for ref in range(ref_start, ref_start + ref_count):
+                name_id, = self.NAME_REF.unpack_from(self._map, self._refOffset + ref * self.NAME_REF.size)
+                name, kind, _ = self._nameKey(name_id)
+                names[kind].append(name.decode('utf-8'))
+            record = FontInfo(FontArchive.memberPath(path, member) if member else path, index,
+                              names[self.POSTSCRIPT][0] if names[self.POSTSCRIPT] else '',
+                              names[self.FAMILY], names[self.FULL], weight, style,
+                              path if member else '', member)
+            self._records[fontId] = record
+        return record
+
+    def find(self, kind: int, name: str) -> list[FontInfo]:
+        """
+        二分查找名字表，获取指定类型的名字等于name的所有字体
+        :param kind: 名字类型，POSTSCRIPT、FAMILY或FULL
+        :param name: 小写的字体名
+        :return: 字体记录列表，按字体在索引中的顺序
+        """
+        key = (name.encode('utf-8'), kind)
+        low, high = 0, self.nameCount
+        while low < high:   # 找到第一个不小于key的位置
+            mid = (low + high) // 2
+            if self._nameKey(mid)[:2] < key:
+                low = mid + 1
+            else:
+                high = mid
+        fonts = []
+        while low < self.nameCount:
+            name_bytes, name_kind, font_id = self._nameKey(low)
+            if (name_bytes, name_kind) != key:
+                break
+            fonts.append(self.record(font_id))
+            low += 1
+        return fonts
+
+    def records(self) -> list[FontInfo]:
+        """获取所有字体记录"""
+        return [self.record(i) for i in range(self.fontCount)]
+
+    def close(self):
+        self._records.clear()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    @classmethod
+    def write(cls, path: str, fonts: Iterable[Font | FontInfo], relative: bool = False):
+        """
+        将字体信息导出为索引文件
+        :param path: 索引文件路径
+        :param fonts: 字体或字体记录列表，内存字体会被忽略
+        :param relative: 是否保存相对于索引文件所在目录的路径，适合字体库和索引一起分发的情况
+        """
+        base_dir = os.path.dirname(os.path.abspath(path))
+        strings: dict[str, int] = {}    # 字符串表 {字符串: 偏移}
+        string_bytes = bytearray()
+
+        def addString(s: str) -> tuple[int, int]:
+            data = s.encode('utf-8')
+            offset = strings.get(s)
+            if offset is None:
+                offset = strings[s] = len(string_bytes)
+                string_bytes.extend(data)
+            return offset, len(data)
+
+        font_records = bytearray()
+        names: list[tuple[bytes, int, int, int]] = []   # 名字表 [(名字字节, 类型, 字体号, 偏移)]
+        font_names: list[list[int]] = []    # 各字体的名字在names中的序号
+        for font in fonts:
+            if isinstance(font, Font) and font.inMemory:
+                continue
+            font_path = os.path.abspath(font.archive or font.path)
+            if relative:
+                try:
+                    font_path = os.path.relpath(font_path, base_dir)
+                except ValueError:  # Windows下不同盘符无法取相对路径
+                    pass
+            font_id = len(font_names)
+            own_names = []
+            for kind, values in ((cls.POSTSCRIPT, [font.postscriptName] if font.postscriptName else []),
+                                 (cls.FAMILY, sorted(font.familyNames)), (cls.FULL, sorted(font.fullNames))):
+                for value in values:
+                    own_names.append(len(names))
+                    names.append((value.encode('utf-8'), kind, font_id, addString(value)[0]))
+            font_names.append(own_names)
+            font_records += cls.FONT_RECORD.pack(*addString(font_path), *addString(font.member), font.index,
+                                                 font.weight, font.style, 0, 0)
+
+        # 名字表排序，并把各字体的名字序号换成排序后的序号 -----
+        order = sorted(range(len(names)), key=lambda i: names[i][:3])
+        new_position = [0] * len(names)
+        for position, i in enumerate(order):
+            new_position[i] = position
+        name_records = bytearray()
+        for i in order:
+            name_bytes, kind, font_id, offset = names[i]
+            name_records += cls.NAME_RECORD.pack(offset, len(name_bytes), kind, font_id)
+        ref_records = bytearray()
+        ref_start = 0
+        for font_id, own_names in enumerate(font_names):   # 回填字体记录中的名字引用范围
+            record_offset = font_id * cls.FONT_RECORD.size
+            fields = list(cls.FONT_RECORD.unpack_from(font_records, record_offset))
+            fields[-2:] = ref_start, len(own_names)
+            cls.FONT_RECORD.pack_into(font_records, record_offset, *fields)
+            for i in own_names:
+                ref_records += cls.NAME_REF.pack(new_position[i])
+            ref_start += len(own_names)
+
+        font_offset = cls.HEADER.size
+        name_offset = font_offset + len(font_records)
+        ref_offset = name_offset + len(name_records)
+        string_offset = ref_offset + len(ref_records)
+        header = cls.HEADER.pack(cls.MAGIC, cls.VERSION, cls.FLAG_RELATIVE if relative else 0, len(font_names),
+                                 len(names), font_offset, name_offset, ref_offset, string_offset, len(string_bytes))
+        temp_path = path + '.tmp'   # 先写临时文件再替换，正在映射旧文件的进程不受影响
+        with open(temp_path, 'wb') as file:
+            for part in (header, font_records, name_records, ref_records, string_bytes):
+                file.write(part)
+        os.replace(temp_path, path)
@@ -0,0 +1,64 @@
+import sys
+from typing import Iterable, Self
+from .Font import Font
+
+
+class FontInfo:
+    """
+    字体元数据的紧凑记录，只保存匹配字体所需的信息，用于本地字体和字体索引.
+    使用__slots__而没有实例字典，名字用元组代替集合并且驻留（同一家族各字体的家族名只存一份），
+    上万个字体时内存和GC开销比Font小得多. 匹配到后才用getFont创建可以打开、子集化和保存的完整Font对象.
+    """
+
+    __slots__ = ('path', 'index', 'postscriptName', 'familyNames', 'fullNames', 'weight', 'style',
+                 'archive', 'member', '_font')
+
+    def __init__(self, path: str, index: int, postscriptName: str, familyNames: Iterable[str],
+                 fullNames: Iterable[str], weight: int = Font.WEIGHT_NORMAL, style: int = Font.STYLE_NORMAL,
+                 archive: str = '', member: str = ''):
+        self.path: str = path   # 字体文件路径，同Font.path
+        self.index: int = index # 字体在路径内的编号
+        self.postscriptName: str = sys.intern(postscriptName)   # Postscript名，小写
+        self.familyNames: tuple[str, ...] = tuple(sys.intern(n) for n in familyNames)  # 家族名，小写
+        self.fullNames: tuple[str, ...] = tuple(sys.intern(n) for n in fullNames)  # 全名，小写
+        self.weight: int = weight
+        self.style: int = style
+        self.archive: str = archive # 字体所在的zip字体包路径，为空则不在字体包内
+        self.member: str = member   # 字体在字体包内的成员名
+        self._font: Font | None = None  # 已创建的完整字体对象
+
+    @classmethod
+    def fromFont(cls, font: Font) -> Self:
+        """从完整字体对象提取记录"""
+        return cls(font.path, font.index, font.postscriptName, sorted(font.familyNames), sorted(font.fullNames),
+                   font.weight, font.style, font.archive, font.member)
+
+    @classmethod
+    def createFromFile(cls, path: str) -> list[Self]:
+        """读取字体文件内所有字体的记录，读取错误的字体将被忽略"""
+        return [cls.fromFont(font) for font in Font.createFontsFromFile(path)]
+
+    @property
+    def isBold(self) -> bool:
+        """是否粗体"""
+        return self.weight == Font.WEIGHT_BOLD
+
+    @property
+    def isItalic(self) -> bool:
+        """是否斜体"""
+        return self.style == Font.STYLE_ITALIC or self.style == Font.STYLE_OBLIQUE
+
+    def getFont(self) -> Font:
+        """获取完整的字体对象，首次调用时创建，不重新解析字体文件"""
+        if self._font is None:
+            font = Font(self.path, self.index, openNow=False, archive=self.archive, member=self.member)
+            font.postscriptName = self.postscriptName
+            font.familyNames = set(self.familyNames)
+            font.fullNames = set(self.fullNames)
+            font.weight, font.style = self.weight, self.style
+            self._font = font
+        return self._font
+
+    def getMissingChars(self, chars: set[str] | str) -> set[str]:
+        """检查字体是否覆盖给定的字符，需要读取cmap，因此会创建完整的字体对象"""
+        return self.getFont().getMissingChars(chars)
@@ -1,7 +1,19 @@
 import os
+import time
+from typing import TYPE_CHECKING
+from fnmatch import fnmatch
+from concurrent.futures import ThreadPoolExecutor
 from utils.App import App
+from utils.Trace import Trace
 from .Font import Font
-from sub import FontDict
+from .FontInfo import FontInfo
+from .FontArchive import FontArchive
+from .FontIndexClient import FontIndexClient
+from .FontIndexFile import FontIndexFile
+
+# sub导入了font，这里只在类型检查时导入，避免循环导入
+if TYPE_CHECKING:
+    from sub import FontDict
 
 if App.isWindows:  # Windows 系统字体匹配库
     from .WinFontMatch import WinFontmatch as FontMatch
@@ -19,48 +31,173 @@ class FontManager:
     SYSTEM = 0b100
 
     FONT_EXTS = ['.otf', '.ttc', '.ttf', '.otc']  # 支持的字体文件后缀名
+    SOURCE_EXTS = FONT_EXTS + FontArchive.EXTS  # 本地字体源的后缀名，包括zip字体包
+    useIndexService = True  # 字体索引服务运行时是否交给服务匹配，服务自己的实例不能再用服务
+    LIST_WORKERS = 8    # 并发列目录的线程数，网络共享目录上列目录主要是等待IO
+    # 目录列表缓存 {目录: (修改时间ns, 子目录名, 字体文件名)}，目录修改时间没变则不必重新列出
+    _dirListings: dict[str, tuple[int, list[str], list[str]]] = {}
 
-    def __init__(self, embedFonts: FontDict = None, path: str = None):
+    @Trace.traced('FontManager.__init__', stage=True)
+    def __init__(self, embedFonts: 'FontDict' = None, path: str = None, index: str | FontIndexFile = None):
         """
         根据给定的字体位置初始化类，path和fontDict分别指定外部和内嵌字体源，
         在搜索时fontDict源会优先于path源.
         :param embedFonts: 内嵌字体字典，将读取其中的字体作为本地缓存
         :param path: 指定"当前目录"，该方法会创建当前目录内的字体索引
+        :param index: 预先导出的字体索引文件（见exportIndex），作为本地字体源，在path源之后搜索
         """
         self._embedFonts: list[Font] = []   # 内嵌字体列表
-        self._localFonts: list[Font] = []   # 本地路径字体列表
+        self._localFonts: list[FontInfo] | None = []   # 本地路径字体记录，为None时由索引服务管理，需要时才扫描
+        self._localDir: str | None = None   # 交给索引服务匹配的本地目录
+        self._serviceFonts: dict[tuple[str, int, str, str], Font] = {}    # 索引服务匹配到的字体，同一字体总是返回同一对象
+        self._localIndex: FontIndexFile | None = FontIndexFile(index) if isinstance(index, str) else index  # 字体索引文件
 
         if embedFonts:
-            for font_name in embedFonts:
-                for i in range(len(embedFonts[font_name])):  # 字幕文件内可能有重名内嵌字体，都要遍历一遍
-                    font_stream = embedFonts.getStream(font_name, i)
-                    if font_stream:
-                        font = Font.createFontFromBytes(font_stream, font_name, i)
-                        if font:  # 如果无法获取名称，则是无效字体
-                            self._embedFonts.append(font)    # 内嵌字体只能是TTF，必然只包含一个字体对象
-                            continue
-                    print(f"Warning: Unable to read embed font info: {font_name}, font ignored.")
+            # 字幕文件内可能有重名内嵌字体，都要遍历一遍
+            font_keys = [(font_name, i) for font_name in embedFonts for i in range(len(embedFonts[font_name]))]
+            # 合并自多个来源的字幕常内嵌多份相同的字体，重复的字体不再解码和解析，与第一份共享数据和字体信息
+            kept_keys = {key[:2]: key[2:] for key in embedFonts.findDuplicates()}  # {重复的字体: 保留的字体}
+            decode_keys = [key for key in font_keys if key not in kept_keys]
+            parsed: dict[tuple[str, int], Font] = {}    # 已解析的字体
+            # UU解码时不占用GIL，用线程池并发解码各个字体，同时在当前线程中按顺序解析已解码的字体
+            with Trace.span('decodeEmbedFonts', count=len(decode_keys)), ThreadPoolExecutor() as pool:
+                font_streams = dict(zip(decode_keys, pool.map(lambda key: embedFonts.getStream(*key), decode_keys)))
+                for font_name, i in font_keys:
+                    kept_font = parsed.get(kept_keys.get((font_name, i)))
+                    if kept_font:   # 重复的字体
+                        font = kept_font.copyAs(font_name, i)
+                    else:
+                        font_stream = font_streams.get((font_name, i))
+                        font = Font.createFontFromBytes(font_stream, font_name, i) if font_stream else None
+                    if font:  # 如果无法获取名称，则是无效字体
+                        parsed[(font_name, i)] = font
+                        self._embedFonts.append(font)    # 内嵌字体只能是TTF，必然只包含一个字体对象
+                    else:
+                        print(f"Warning: Unable to read embed font info: {font_name}, font ignored.")
+            Trace.counter('duplicateEmbedFonts', len(kept_keys))
 
         if path:
-            # 检索path（通常为字幕同目录）目录下所有字体的信息 ----------
-            if os.path.isdir(path):
-                with os.scandir(path) as entries:
-                    font_files = [entry.path for entry in entries if entry.is_file()]
-            elif os.path.isfile(path):
-                font_files = [path]
+            if os.path.isdir(path) and self.useIndexService and FontIndexClient.get():
+                # 字体索引服务正在运行，目录内的字体由服务索引，本进程不必再扫描
+                self._localDir = os.path.abspath(path)
+                self._localFonts = None
             else:
-                print(f"Path '{path}' is invalid.")
-                return
-            # 过滤后缀名
-            font_files = [path for path in font_files if os.path.splitext(path)[1].lower() in self.FONT_EXTS]
-            for font_path in sorted(font_files):
-                fonts = Font.createFontsFromFile(font_path)
+                self._scanLocalFonts(path)
+
+    def _scanLocalFonts(self, path: str):
+        """
+        检索path（通常为字幕同目录）目录下所有字体的信息，加入本地字体列表
+        :param path: 目录或单个字体文件的路径，也可以是字体包内字体的显示路径
+        """
+        member = None   # 只读取字体包内的这个成员
+        if os.path.isdir(path):
+            font_files = self.findFontFiles(path)
+        elif os.path.isfile(path):
+            font_files = [path] if os.path.splitext(path)[1].lower() in self.SOURCE_EXTS else []
+        elif archive_member := FontArchive.splitMemberPath(path):
+            font_files, member = [archive_member[0]], archive_member[1]
+        else:
+            print(f"Path '{path}' is invalid.")
+            return
+        with Trace.span('scanLocalFonts', count=len(font_files)):
+            for font_path in font_files:
+                fonts = FontInfo.createFromFile(font_path)    # 只保留紧凑的记录，匹配到时才创建Font对象
+                if member is not None:
+                    fonts = [f for f in fonts if f.member == member]
                 if fonts:
                     self._localFonts.extend(fonts)
                 else:
-                    print(f"Warning: Unable to read font info: {font_path}, font ignored.")
+                    print(f"Warning: Unable to read font info: {path if member else font_path}, font ignored.")
+        Trace.counter('localFonts', len(self._localFonts))
+
+    @staticmethod
+    def _searchSettings() -> tuple[int, list[str], list[str]]:
+        """从配置读取本地字体的查找设置：(子目录深度, 包含规则, 排除规则)，规则之间以分号分隔"""
+        try:
+            depth = int(App.Config.get('General', 'font_search_depth', 2))
+        except ValueError:
+            depth = 2
+        include = App.Config.get('General', 'font_search_include', '')
+        exclude = App.Config.get('General', 'font_search_exclude', '')
+        return (depth, [p.strip() for p in include.split(';') if p.strip()],
+                [p.strip() for p in exclude.split(';') if p.strip()])
+
+    @classmethod
+    def _listDir(cls, path: str) -> tuple[list[str], list[str]]:
+        """
+        列出目录下的子目录和字体文件，目录修改时间没变时直接使用上次的结果
+        :return: (子目录名列表, 字体文件名列表)，目录无法访问则都为空
+        """
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            listing = cls._dirListings.get(path)
+            if listing and listing[0] == mtime:
+                return listing[1], listing[2]
+            dirs, files = [], []
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        dirs.append(entry.name)
+                    elif os.path.splitext(entry.name)[1].lower() in cls.SOURCE_EXTS and entry.is_file():
+                        files.append(entry.name)
+        except OSError:
+            return [], []
+        dirs.sort()
+        files.sort()
+        # 修改时间精度有限，刚刚修改过的目录可能在同一时间戳内再次变化，这种情况不缓存
+        if time.time_ns() - mtime > 2_000_000_000:
+            cls._dirListings[path] = (mtime, dirs, files)
+        return dirs, files
 
     @classmethod
+    def findFontFiles(cls, path: str, depth: int = None, include: list[str] = None,
+                      exclude: list[str] = None) -> list[str]:
+        """
+        查找目录及其子目录下的字体文件和zip字体包，同一层的目录并发列出
+        :param path: 目录路径
+        :param depth: 查找的子目录层数，0只查找path本身. 缺省时与include、exclude一起从配置读取
+        :param include: 字体文件的包含规则（glob，匹配文件名或相对路径），为空则包含所有字体文件
+        :param exclude: 排除规则（glob，匹配名称或相对路径），匹配的子目录和字体文件都会跳过
+        :return: 字体文件和字体包路径列表，浅层目录在前，同一目录内按文件名排序
+        """
+        if depth is None:
+            depth, include, exclude = cls._searchSettings()
+
+        def matches(relPath: str, patterns: list[str]) -> bool:
+            rel_path = relPath.replace(os.sep, '/')
+            return any(fnmatch(rel_path, p) or fnmatch(os.path.basename(rel_path), p) for p in patterns)
+
+        font_files = []
+        level = ['']    # 当前层各目录相对于path的路径
+        with ThreadPoolExecutor(max_workers=cls.LIST_WORKERS) as pool:
+            for i in range(depth + 1):
+                dir_paths = [os.path.join(path, rel_dir) if rel_dir else path for rel_dir in level]
+                listings = pool.map(cls._listDir, dir_paths) if len(dir_paths) > 1 else [cls._listDir(dir_paths[0])]
+                next_level = []
+                for rel_dir, (dirs, files) in zip(level, listings):
+                    for name in files:
+                        rel_path = os.path.join(rel_dir, name)
+                        if (not include or matches(rel_path, include)) and not (exclude and matches(rel_path, exclude)):
+                            font_files.append(os.path.join(path, rel_path))
+                    if i < depth:
+                        for name in dirs:
+                            rel_path = os.path.join(rel_dir, name)
+                            if not (exclude and matches(rel_path, exclude)):
+                                next_level.append(rel_path)
+                level = next_level
+                if not level:
+                    break
+        return font_files
+
+    def _getLocalFonts(self) -> list[FontInfo]:
+        """获取本地字体记录，如果本地目录原本交给索引服务管理，则此时才扫描"""
+        if self._localFonts is None:
+            self._localFonts = []
+            self._scanLocalFonts(self._localDir)
+        return self._localFonts
+
+    @classmethod
+    @Trace.traced('matchSystemFont')
     def _matchSystemFont(cls, fontName: str, bold: bool = False, italic: bool = False) -> str | None:
         """
         在系统中根据字体描述查找系统中合适的字体，支持各种名字和语言匹配
@@ -73,42 +210,77 @@ class FontManager:
         return path if path and os.path.splitext(path)[1].lower() in cls.FONT_EXTS else None
 
     @staticmethod
-    def _matchInFonts(fonts: list[Font], fontName: str, bold: bool = False, italic: bool = False) -> Font | None:
+    def _pickBestCovering(fonts: list[Font | FontInfo], text: set[str] | None) -> Font | FontInfo | None:
+        """
+        从候选字体中选出覆盖给定字符最多的字体，缺失字符数相同时取靠前的
+        :param fonts: 候选字体列表
+        :param text: 需要覆盖的字符，为空则直接取第一个
+        :return: 候选中的一个，候选为空则返回None
+        """
+        if not fonts:
+            return None
+        if len(fonts) == 1 or not text:
+            return fonts[0]
+        return min(fonts, key=lambda f: len(f.getMissingChars(text)))
+
+    @staticmethod
+    def _findByName(fonts: list[Font | FontInfo] | FontIndexFile, kind: int, fontName: str) -> list[Font | FontInfo]:
+        """
+        找出指定类型的名字等于fontName的所有字体，索引文件直接查找其名字表
+        :param kind: 名字类型，FontIndexFile.POSTSCRIPT、FAMILY或FULL
+        :param fontName: 小写的字体名
+        """
+        if isinstance(fonts, FontIndexFile):
+            return fonts.find(kind, fontName)
+        if kind == FontIndexFile.POSTSCRIPT:
+            return [f for f in fonts if fontName == f.postscriptName]
+        if kind == FontIndexFile.FAMILY:
+            return [f for f in fonts if fontName in f.familyNames]
+        return [f for f in fonts if fontName in f.fullNames]
+
+    @classmethod
+    def _matchInFonts(cls, fonts: list[Font | FontInfo] | FontIndexFile, fontName: str, bold: bool = False,
+                      italic: bool = False, text: set[str] = None) -> Font | FontInfo | None:
         """
         从给定字体列表中找到最匹配给定描述的字体，模拟系统匹配字体的逻辑，但不一定完全一致
-        :param fonts: 字体列表
+        :param fonts: 字体或字体记录列表，或字体索引文件
         :param fontName: 字体名，可以是PostScript Name，Family Name或Full Name，按确切程度匹配
         :param bold: 是否粗体
         :param italic: 是否斜体，包括Italic和Oblique
-        :return: Font，找不到则返回None
+        :param text: 需要覆盖的字符，如果同一匹配条件下有多个候选字体，选择缺失字符最少的
+        :return: fonts中的一个，找不到则返回None
         """
         fontName = fontName.lower()  # 转换为小写匹配
         # 匹配Postscript名，如果匹配到了则可以忽略粗体斜体条件
-        font: Font | None = next((f for f in fonts if fontName == f.postscriptName), None)
+        font = cls._pickBestCovering(cls._findByName(fonts, FontIndexFile.POSTSCRIPT, fontName), text)
 
         # 先尝试严格匹配 -------
         family_fonts = []
         if font is None:    # 匹配家族名
-            family_fonts = [f for f in fonts if fontName in f.familyNames]  # 找出字体全家
+            family_fonts = cls._findByName(fonts, FontIndexFile.FAMILY, fontName)  # 找出字体全家
             if family_fonts:    # 匹配粗体斜体
-                font = next((f for f in family_fonts if f.isBold == bold and f.isItalic == italic), None)
+                font = cls._pickBestCovering(
+                    [f for f in family_fonts if f.isBold == bold and f.isItalic == italic], text)
 
         fullname_fonts = []
         if font is None:    # 匹配全名
-            fullname_fonts = [f for f in fonts if fontName in f.fullNames]  # 找出所有全名匹配的
-            font = next((f for f in fullname_fonts if f.isBold == bold and f.isItalic == italic), None)
+            fullname_fonts = cls._findByName(fonts, FontIndexFile.FULL, fontName)  # 找出所有全名匹配的
+            font = cls._pickBestCovering(
+                [f for f in fullname_fonts if f.isBold == bold and f.isItalic == italic], text)
 
         # 如果严格匹配失败，则试试家族内和全名字体表内的粗体斜体模糊匹配 -------
         font_sets = [family_fonts, fullname_fonts]
         for font_set in font_sets:  # 先后试试家族集合和全名匹配集合
             if font is None and font_set:
-                font = next((f for f in font_set if f.isBold == bold),  # 忽略斜体尝试匹配粗体符合的
-                            next((f for f in font_set if f.isItalic == italic), # 忽略粗体尝试匹配斜体符合的
-                                 font_set[0]))  # 都没有就用第一个吧
+                font = (cls._pickBestCovering([f for f in font_set if f.isBold == bold], text)  # 忽略斜体尝试匹配粗体符合的
+                        or cls._pickBestCovering([f for f in font_set if f.isItalic == italic], text) # 忽略粗体尝试匹配斜体符合的
+                        or cls._pickBestCovering(font_set, text))  # 都没有就用覆盖最好的吧
 
         return font
 
-    def match(self, fontName: str, bold: bool = False, italic: bool = False, scope: int = None) -> Font | None:
+    @Trace.traced('FontManager.match')
+    def match(self, fontName: str, bold: bool = False, italic: bool = False, scope: int = None,
+              text: set[str] = None) -> Font | None:
         """
         根据字体名称查找字体文件，先搜索系统安装字体再搜索当前目录字体
         :param fontName: 字体名
@@ -119,6 +291,8 @@ class FontManager:
                       FontManager.LOCAL：在当前目录搜索，
                       FontManager.SYSTEM：在系统字体中搜索.
                       缺省：先内嵌再当前目录再系统字体.
+        :param text: 需要覆盖的字符. 如果指定，同名的候选字体中会选择缺失字符最少的，
+                     本地字体缺失字符时也会与系统字体比较，选择覆盖更好的一个
         :return: Font，找不到则返回None
         """
         font: Font | None = None
@@ -126,20 +300,62 @@ class FontManager:
             scope = self.EMBED | self.LOCAL | self.SYSTEM
 
         if scope & self.EMBED:  # 在内嵌字体中查找
-            font = self._matchInFonts(self._embedFonts, fontName, bold, italic)
+            font = self._matchInFonts(self._embedFonts, fontName, bold, italic, text)
+
+        # 本地目录由索引服务管理，或者只需查找系统字体时，交给索引服务匹配 -------
+        if font is None and scope & (self.LOCAL | self.SYSTEM) and self.useIndexService \
+                and (not scope & self.LOCAL or self._localFonts is None and self._localIndex is None):
+            client = FontIndexClient.get()
+            if client:
+                try:
+                    return self._matchByService(client, fontName, bold, italic, scope, text)
+                except (OSError, ValueError):
+                    FontIndexClient.discard()   # 服务出错或已退出，退回进程内匹配
 
         if font is None and scope & self.LOCAL:     # 在本地字体中查找
-            font = self._matchInFonts(self._localFonts, fontName, bold, italic)
+            font = self._matchInFonts(self._getLocalFonts(), fontName, bold, italic, text)
+            if font is None and self._localIndex is not None:   # 在字体索引文件中查找
+                font = self._matchInFonts(self._localIndex, fontName, bold, italic, text)
+            if font:    # 本地字体是紧凑记录，匹配到时才创建完整的字体对象
+                font = font.getFont()
+            if font and text and scope & self.SYSTEM and font.getMissingChars(text):
+                # 本地字体有缺失字符，看看同名的系统字体是否覆盖得更好
+                system_font = self.match(fontName, bold, italic, self.SYSTEM)
+                if system_font and len(system_font.getMissingChars(text)) < len(font.getMissingChars(text)):
+                    font = system_font
 
         if font is None and scope & self.SYSTEM:    # 在系统字体中查找
             path = self._matchSystemFont(fontName, bold, italic)
             if path:    # 如果找到，创建Font对象
-                font = self.__class__(path=path).match(fontName, bold, italic, self.LOCAL)
+                font = self._systemFontManager(path).match(fontName, bold, italic, self.LOCAL, text)
                 if font is None:        # 如果系统匹配到字体的这里却匹配不上，说明本类的匹配逻辑不对
                     font = Font(path)   # 这种情况发生的概率不大，如果发生，则直接取文件内的第一个字体吧
 
         return font
 
+    def _systemFontManager(self, path: str) -> 'FontManager':
+        """
+        为系统匹配到的字体文件创建字体管理对象，索引服务会重写此方法以缓存解析过的系统字体
+        :param path: 系统字体文件路径
+        """
+        return self.__class__(path=path)
+
+    def _matchByService(self, client: FontIndexClient, fontName: str, bold: bool, italic: bool, scope: int,
+                        text: set[str] = None) -> Font | None:
+        """
+        通过字体索引服务匹配本地和系统字体，参数含义同match
+        :return: Font，找不到则返回None. 服务通信出错时抛出OSError或ValueError
+        """
+        result = client.match(fontName, bold, italic, scope & (self.LOCAL | self.SYSTEM),
+                              self._localDir if scope & self.LOCAL else None, text)
+        if result is None:
+            return None
+        font = self._serviceFonts.get(result)
+        if font is None:
+            path, index, archive, member = result
+            font = self._serviceFonts[result] = Font(path, index, archive=archive, member=member)
+        return font
+
     def getAll(self, scope: int = None) -> list[Font]:
         """
         获取所有本地字体对象
@@ -152,5 +368,16 @@ class FontManager:
         if scope & self.EMBED:  # 内嵌字体
             fonts.extend(self._embedFonts.copy())
         if not fonts and scope & self.LOCAL:  # 本地字体
-            fonts.extend(self._localFonts.copy())
+            fonts.extend(info.getFont() for info in self._getLocalFonts())
+            if self._localIndex is not None:
+                fonts.extend(info.getFont() for info in self._localIndex.records())
         return fonts
+
+    def exportIndex(self, path: str, relative: bool = False):
+        """
+        将本地字体（不含内嵌字体）的信息导出为字体索引文件，之后可用FontManager(index=path)直接载入
+        :param path: 索引文件路径
+        :param relative: 是否保存相对于索引文件所在目录的字体路径
+        """
+        records = self._getLocalFonts() + (self._localIndex.records() if self._localIndex is not None else [])
+        FontIndexFile.write(path, records, relative)
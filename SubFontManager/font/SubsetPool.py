@@ -0,0 +1,320 @@
+import io
+import os
+import atexit
+import queue
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ThreadPoolExecutor
+from typing import Self
+from utils import App, Lang, Trace
+from .Font import Font
+
+try:    # Windows下没有resource模块，无法限制工作进程的内存
+    import resource
+except ImportError:
+    resource = None
+
+
+class SubsetError(Exception):
+    """子集化任务失败，包括超时、工作进程崩溃和子集化本身的错误"""
+    pass
+
+
+def _runJob(source: tuple, text: str, reserveNames: list[str], profile: str, vertical: bool,
+            instance: tuple[bool, bool] | None, kwargs: dict, attach) -> tuple[bytes, bytes | None]:
+    """
+    在工作进程中执行一个子集化任务（可变字体先固定实例）
+    :return: (子集化后的字体数据, 固定的实例数据)，没有固定实例时后者为None. 实例数据交给主进程缓存在字体内
+    """
+    if source[0] == 'shared':   # ('shared', 共享内存块名, 数据长度, 路径, 序号)
+        with attach(source[1]).buf[:source[2]] as view:
+            font = Font.createFontFromBytes(io.BytesIO(view), source[3], source[4])
+        if font is None:
+            raise ValueError('Invalid font data.')
+    else:   # ('file', 路径, 序号, 字体包路径, 成员名)
+        font = Font(source[1], source[2], openNow=False, archive=source[3], member=source[4])
+    instance_data = None
+    if instance:
+        instance_font = font.instantiate(*instance)
+        if instance_font is not font:
+            font, instance_data = instance_font, instance_font.read()
+    font.subset(text, reserveNames, profile, vertical, **kwargs)
+    return font.read(), instance_data
+
+
+def _workerMain(conn, memoryLimit: int):
+    """
+    工作进程的主循环，逐个接收任务并返回 (是否成功, 结果, 实例数据). 结果能放进输出块时写入输出块并返回长度，
+    否则直接返回字体数据，失败时为错误信息. 固定了可变字体实例时附带实例数据，否则为None. 收到None或管道关闭时退出
+    :param memoryLimit: 进程地址空间上限（字节），0为不限制
+    """
+    if memoryLimit and resource:
+        try:
+            _, hard = resource.getrlimit(resource.RLIMIT_AS)
+            limit = memoryLimit if hard == resource.RLIM_INFINITY else min(memoryLimit, hard)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+        except (ValueError, OSError):   # 部分系统（如macOS）不支持限制RLIMIT_AS
+            pass
+    from fontTools import subset    # 预先导入，使进程保持“热”状态，第一个任务不必等待导入
+
+    attached: dict[str, shared_memory.SharedMemory] = {}    # 已附加的共享内存块，块由主进程创建和删除
+
+    def attach(name: str) -> shared_memory.SharedMemory:
+        if name not in attached:
+            attached[name] = shared_memory.SharedMemory(name=name)
+        return attached[name]
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+        source, out_name, out_size, *args = job
+        try:
+            data, instance_data = _runJob(source, *args, attach)
+            if len(data) <= out_size:   # 结果写入输出块，只回传长度
+                attach(out_name).buf[:len(data)] = data
+                conn.send((True, len(data), instance_data))
+            else:   # 输出块放不下，直接回传，主进程会为下次任务换更大的块
+                conn.send((True, data, instance_data))
+        except MemoryError:     # 内存耗尽后进程状态不可靠，报告后退出，由主进程换一个新进程
+            try:
+                conn.send((False, Lang['Out of memory while subsetting.'], None))
+            finally:
+                break
+        except Exception as e:
+            conn.send((False, f'{type(e).__name__}: {e}', None))
+        for name in set(attached) - {source[1], out_name}:  # 主进程换了更大的块，旧块不再使用
+            attached.pop(name).close()
+    for block in attached.values():
+        block.close()
+
+
+class _SharedBuffer:
+    """
+    主进程创建并持有的共享内存块，容量不足时换一个更大的. 块只由主进程删除，工作进程只附加，
+    因此工作进程崩溃或被强制结束都不会留下无人删除的块
+    """
+
+    MIN_SIZE = 1 << 20  # 块的最小容量，避免小字体频繁换块
+
+    def __init__(self):
+        self.block: shared_memory.SharedMemory | None = None
+
+    def reserve(self, size: int) -> shared_memory.SharedMemory:
+        """获取容量至少为size的块"""
+        if self.block is None or self.block.size < size:
+            self.release()
+            self.block = shared_memory.SharedMemory(create=True, size=max(size, self.MIN_SIZE))
+        return self.block
+
+    def release(self):
+        """关闭并删除块"""
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+
+
+class _Worker:
+    """一个子集化工作进程及其通信管道. 字体数据通过进程专用的输入和输出共享内存块传递，不经过管道序列化"""
+
+    def __init__(self, context, memoryLimit: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_workerMain, args=(child_conn, memoryLimit), daemon=True)
+        self.process.start()    # 只是启动进程，不等待它完成初始化
+        child_conn.close()
+        self.jobs = 0   # 已执行的任务数
+        self.broken = False # 是否超时或通信失败，此时进程可能卡住，只能强制结束
+        self.input = _SharedBuffer()    # 传入内存字体数据的块
+        self.output = _SharedBuffer()   # 接收子集化结果的块
+
+    def run(self, job: tuple, timeout: float) -> tuple[bytes, bytes | None]:
+        """
+        执行任务，超时或进程退出时抛出SubsetError，此后本进程不可再用
+        :return: (子集化后的字体数据, 固定的实例数据或None)
+        :param job: (来源, 子集字符, 保留名字, 子集化方案, 是否竖排, 固定的实例, 其他参数)，
+                    内存字体的来源为 ('memory', 字体数据, 路径, 序号)
+        """
+        self.jobs += 1
+        source, *args = job
+        out_size = 0
+        if source[0] == 'memory':   # 字体数据放进输入块，只传块名
+            data = source[1]
+            block = self.input.reserve(len(data))
+            block.buf[:len(data)] = data
+            source = ('shared', block.name, len(data), source[2], source[3])
+            out_size = len(data)    # 子集化的结果一般不会比原字体大
+        output = self.output.reserve(out_size)
+        try:
+            self.conn.send((source, output.name, output.size, *args))
+            if not self.conn.poll(timeout):
+                self.broken = True
+                raise SubsetError(Lang['Subsetting timed out after {t} seconds.'].format(t=f'{timeout:g}'))
+            ok, result, instance_data = self.conn.recv()
+        except (EOFError, OSError):
+            self.broken = True
+            raise SubsetError(Lang['Subsetting process exited unexpectedly, possibly out of memory.'])
+        if not ok:
+            raise SubsetError(result)
+        if isinstance(result, int): # 结果在输出块中
+            with output.buf[:result] as view:
+                return bytes(view), instance_data
+        self.output.reserve(len(result))    # 输出块放不下，换大块供下次使用
+        return result, instance_data
+
+    @property
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def close(self, kill: bool = False):
+        """结束进程，kill为True时强制结束（用于卡住的进程）"""
+        try:
+            if kill:
+                self.process.kill()
+            else:
+                self.conn.send(None)
+            self.process.join(1)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        except (OSError, ValueError):
+            pass
+        self.conn.close()
+        self.input.release()    # 进程已结束，删除共享内存块
+        self.output.release()
+
+
+class SubsetPool:
+    """
+    子集化工作进程池. 每个子集化任务在独立的进程中执行，有墙钟超时和地址空间上限（RLIMIT_AS，Windows下无效），
+    畸形字体导致的死循环或内存暴涨只会结束对应的工作进程，并作为该字体的错误报告，不影响界面和其他字体.
+    进程在首次使用前就可以启动，之后一直保留，出错的进程立即换成新进程，因此正常情况下几乎没有额外开销.
+    内存字体和子集化结果通过共享内存块传递，块由主进程持有和删除.
+    超时和内存上限通过配置项subset_timeout（秒）和subset_memory_limit（MB）设置，0为不限制.
+    """
+
+    WORKERS = min(4, os.cpu_count() or 1)   # 工作进程数
+    MAX_JOBS = 50   # 每个进程执行这么多任务后换新，避免fontTools的缓存越积越多
+    DEFAULT_TIMEOUT = 120   # 缺省的任务超时（秒）
+    DEFAULT_MEMORY_LIMIT = 4096 # 缺省的进程内存上限（MB）
+
+    _instance: Self | None = None   # 全局共享的进程池
+
+    def __init__(self, workers: int = WORKERS, timeout: float = None, memoryLimit: int = None):
+        """
+        :param workers: 工作进程数
+        :param timeout: 任务超时（秒），缺省从配置读取
+        :param memoryLimit: 进程内存上限（MB），缺省从配置读取
+        """
+        if timeout is None:
+            try:
+                timeout = float(App.Config.get('General', 'subset_timeout', self.DEFAULT_TIMEOUT))
+            except ValueError:
+                timeout = self.DEFAULT_TIMEOUT
+        if memoryLimit is None:
+            try:
+                memoryLimit = int(App.Config.get('General', 'subset_memory_limit', self.DEFAULT_MEMORY_LIMIT))
+            except ValueError:
+                memoryLimit = self.DEFAULT_MEMORY_LIMIT
+        self.workers = max(workers, 1)
+        self.timeout = timeout or None  # 0为不限制
+        self.memoryLimit = memoryLimit * 1024 * 1024
+        self._context = multiprocessing.get_context('spawn')    # 界面进程有多个线程，fork不安全
+        self._idle: queue.Queue[_Worker] = queue.Queue()    # 空闲的工作进程
+        self._count = 0 # 现有的工作进程数
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get(cls) -> Self:
+        """获取全局共享的进程池"""
+        if cls._instance is None:
+            cls._instance = cls()
+            atexit.register(cls._instance.close)    # 退出时结束进程并删除共享内存块
+        return cls._instance
+
+    def start(self):
+        """启动所有工作进程，不等待它们完成初始化. 在需要子集化之前调用，可以让第一个任务不用等待进程启动"""
+        with self._lock:
+            while self._count < self.workers:
+                self._idle.put(_Worker(self._context, self.memoryLimit))
+                self._count += 1
+
+    def _acquire(self) -> _Worker:
+        with self._lock:
+            if self._idle.empty() and self._count < self.workers:
+                self._count += 1
+                return _Worker(self._context, self.memoryLimit)
+        return self._idle.get()
+
+    def _release(self, worker: _Worker):
+        """归还工作进程，出错或用旧了的进程结束掉并换一个新的"""
+        if worker.broken or worker.jobs >= self.MAX_JOBS or not worker.alive:
+            worker.close(kill=worker.broken)
+            worker = _Worker(self._context, self.memoryLimit)
+        self._idle.put(worker)
+
+    @staticmethod
+    def _describe(font: Font) -> tuple:
+        """字体的来源描述，文件字体只传路径，由工作进程自己打开，内存字体的数据由_Worker放入共享内存"""
+        if font.inMemory:
+            return 'memory', font.read(), font.path, font.index
+        return 'file', font.path, font.index, font.archive, font.member
+
+    def subset(self, font: Font, text: str, reserveNames: list[str] = None, profile: str = Font.SUBSET_DEFAULT,
+               vertical: bool = False, instance: tuple[bool, bool] = None, **kwargs) -> Font:
+        """
+        在工作进程中子集化字体，其他参数同Font.subset
+        :param instance: 可变字体在子集化前要固定的实例 (粗体, 斜体)，同Font.instantiate，也在工作进程中执行.
+                         生成的实例数据缓存在font内，同一实例再次子集化时直接传实例数据，不再重新生成
+        :return: 子集化后的字体. 不固定实例时就是font本身，变为内存字体；否则为新的内存字体，font保持不变
+        :raise SubsetError: 超时、进程崩溃或子集化出错
+        """
+        source = self._describe(font)
+        job_instance = instance
+        if instance and (instance_data := font.cachedInstanceData(*instance)) is not None:
+            source, job_instance = ('memory', instance_data, font.path, 0), None    # 实例已生成过
+        job = (source, text, reserveNames, profile, vertical, job_instance, kwargs)
+        worker = self._acquire()
+        try:
+            data, instance_data = worker.run(job, self.timeout)
+        finally:
+            self._release(worker)
+        if instance_data is not None:
+            font.cacheInstanceData(*instance, instance_data)
+        if not instance:
+            font.setSubsetData(data)
+            return font
+        subset_font = Font.createFontFromBytes(io.BytesIO(data), font.path, 0)
+        if subset_font is None:
+            raise SubsetError('Invalid font data.')
+        return subset_font
+
+    @Trace.traced('SubsetPool.subsetAll', stage=True)
+    def subsetAll(self, jobs: list[tuple[Font, str, list[str], str, bool, tuple[bool, bool] | None]]
+                  ) -> list[Font | SubsetError]:
+        """
+        并发执行多个子集化任务，单个任务失败不影响其他任务
+        :param jobs: [(字体, 子集字符, 保留名字, 子集化方案, 是否竖排, 固定的实例)]，参数同subset
+        :return: 与jobs对应的结果列表，成功的任务为子集化后的字体，失败的为错误
+        """
+        def run(job) -> Font | SubsetError:
+            try:
+                return self.subset(*job)
+            except SubsetError as e:
+                return e
+
+        if len(jobs) <= 1:
+            return [run(job) for job in jobs]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(run, jobs))
+
+    def close(self):
+        """结束所有空闲的工作进程"""
+        with self._lock:
+            while not self._idle.empty():
+                self._idle.get().close()
+                self._count -= 1
@@ -0,0 +1,134 @@
+import struct
+import sys
+from array import array
+from typing import BinaryIO
+
+
+class TTCExtractor:
+    """
+    TTC字体提取类，直接在字节层面从TTC文件中拷贝出一个字体的所有表，组装成独立的TTF.
+    与TTFont.save相比，它不需要解析和重新编译任何表，只拷贝数据、重算偏移和校验和.
+    """
+    TTC_TAG = b'ttcf'   # TTC文件头标识
+    HEAD_TAG = b'head'  # head表的标签，其中的checkSumAdjustment需要重新计算
+    CHECKSUM_MAGIC = 0xB1B0AFBA # 用于计算checkSumAdjustment的魔数
+    CHUNK_SIZE = 1 << 20    # 流式拷贝时每次读取的字节数，必须是4的倍数
+
+    _sfntHeader = struct.Struct('>4sHHHH')      # sfnt文件头：sfntVersion, numTables, searchRange, entrySelector, rangeShift
+    _tableRecord = struct.Struct('>4sIII')      # 表记录：tag, checkSum, offset, length
+    _ttcHeader = struct.Struct('>4sHHI')        # TTC文件头：ttcTag, majorVersion, minorVersion, numFonts
+
+    @classmethod
+    def _readExact(cls, file: BinaryIO, offset: int, size: int) -> bytes:
+        """从指定偏移读取指定长度的数据，长度不足则视为文件损坏"""
+        file.seek(offset)
+        data = file.read(size)
+        if len(data) != size:
+            raise ValueError('Font file is truncated.')
+        return data
+
+    @classmethod
+    def _checksum(cls, data: bytes | bytearray | memoryview) -> int:
+        """计算一段数据的sfnt校验和，即按大端uint32累加，长度不足4的倍数时末尾补0"""
+        remainder = len(data) % 4
+        if remainder:
+            data = bytes(data) + b'\0' * (4 - remainder)
+        words = array('I', data)    # 'I'在所有支持的平台上都是4字节
+        if sys.byteorder == 'little':
+            words.byteswap()
+        return sum(words) & 0xFFFFFFFF
+
+    @classmethod
+    def getFaceOffset(cls, file: BinaryIO, index: int) -> int:
+        """
+        获取字体在文件中的表目录偏移
+        :param file: 二进制文件对象，必须可seek
+        :param index: 字体在TTC中的编号，对于非TTC文件只能为0
+        :return: 字体表目录（Offset Table）在文件中的偏移
+        """
+        tag, _, _, num_fonts = cls._ttcHeader.unpack(cls._readExact(file, 0, cls._ttcHeader.size))
+        if tag != cls.TTC_TAG:  # 普通的sfnt文件
+            if index != 0:
+                raise IndexError(f'Font index {index} out of range.')
+            return 0
+        if not 0 <= index < num_fonts:
+            raise IndexError(f'Font index {index} out of range.')
+        return struct.unpack('>I', cls._readExact(file, cls._ttcHeader.size + 4 * index, 4))[0]
+
+    @classmethod
+    def faceSize(cls, file: BinaryIO, index: int) -> int:
+        """
+        计算字体提取为独立sfnt文件后的大小，只读取表目录
+        :param file: 二进制文件对象，必须可seek
+        :param index: 字体在TTC中的编号
+        :return: 与extract的返回值相同
+        """
+        face_offset = cls.getFaceOffset(file, index)
+        num_tables = cls._sfntHeader.unpack(cls._readExact(file, face_offset, cls._sfntHeader.size))[1]
+        record_data = cls._readExact(file, face_offset + cls._sfntHeader.size, num_tables * cls._tableRecord.size)
+        return (cls._sfntHeader.size + num_tables * cls._tableRecord.size
+                + sum((length + 3) & ~3 for _, _, _, length in cls._tableRecord.iter_unpack(record_data)))
+
+    @classmethod
+    def extract(cls, src: BinaryIO, index: int, dst: BinaryIO) -> int:
+        """
+        从TTC中提取一个字体，写入为独立的sfnt文件
+        :param src: 源文件对象，二进制模式，必须可seek
+        :param index: 字体在TTC中的编号
+        :param dst: 输出文件对象，二进制模式，必须可seek，数据将从它的当前位置开始写入
+        :return: 写入的字节数
+        """
+        face_offset = cls.getFaceOffset(src, index)
+        sfnt_version, num_tables, _, _, _ = cls._sfntHeader.unpack(
+            cls._readExact(src, face_offset, cls._sfntHeader.size))
+        record_data = cls._readExact(src, face_offset + cls._sfntHeader.size, num_tables * cls._tableRecord.size)
+        records = sorted(cls._tableRecord.iter_unpack(record_data))   # 表记录要求按tag升序排列
+
+        # 计算新的文件布局，表数据紧跟在表目录之后，每张表按4字节对齐 -------
+        entry_selector = max(num_tables.bit_length() - 1, 0)
+        search_range = (1 << entry_selector) * 16
+        dir_size = cls._sfntHeader.size + num_tables * cls._tableRecord.size
+        new_offsets = []
+        offset = dir_size
+        for _, _, _, length in records:
+            new_offsets.append(offset)
+            offset += (length + 3) & ~3
+        total_size = offset
+
+        # 先占位写入表目录，拷贝表数据的同时计算各表的校验和，最后回填表目录 -------
+        start = dst.tell()
+        dst.write(b'\0' * dir_size)
+        checksums = []
+        head_offset = None  # head表在输出文件中的偏移
+        for (tag, _, src_offset, length), new_offset in zip(records, new_offsets):
+            src.seek(src_offset)
+            checksum = 0
+            remaining = length
+            while remaining > 0:
+                chunk = src.read(min(cls.CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise ValueError('Font file is truncated.')
+                if tag == cls.HEAD_TAG and remaining == length and len(chunk) >= 12:
+                    chunk = chunk[:8] + b'\0\0\0\0' + chunk[12:]    # 计算校验和时checkSumAdjustment必须为0
+                    head_offset = new_offset
+                checksum += cls._checksum(chunk)
+                dst.write(chunk)
+                remaining -= len(chunk)
+            padding = (4 - length % 4) % 4
+            if padding:
+                dst.write(b'\0' * padding)
+            checksums.append(checksum & 0xFFFFFFFF)
+
+        directory = bytearray(cls._sfntHeader.pack(
+            sfnt_version, num_tables, search_range, entry_selector, num_tables * 16 - search_range))
+        for (tag, _, _, length), new_offset, checksum in zip(records, new_offsets, checksums):
+            directory += cls._tableRecord.pack(tag, checksum, new_offset, length)
+        dst.seek(start)
+        dst.write(directory)
+
+        if head_offset is not None:  # 回填head表的checkSumAdjustment
+            file_checksum = (cls._checksum(directory) + sum(checksums)) & 0xFFFFFFFF
+            dst.seek(start + head_offset + 8)
+            dst.write(struct.pack('>I', (cls.CHECKSUM_MAGIC - file_checksum) & 0xFFFFFFFF))
+        dst.seek(start + total_size)
+        return total_size
@@ -1,6 +1,11 @@
 """提供字体相关的类"""
 
 from .Font import Font
+from .FontInfo import FontInfo
+from .FontArchive import FontArchive
 from .FontManager import FontManager
+from .FontIndexFile import FontIndexFile
+from .FontExporter import FontExporter
+from .SubsetPool import SubsetPool, SubsetError
 
-__all__ = ['Font', 'FontManager']
+__all__ = ['Font', 'FontInfo', 'FontArchive', 'FontManager', 'FontIndexFile', 'FontExporter', 'SubsetPool', 'SubsetError']
@@ -1,3 +1,4 @@
+import multiprocessing
 from tkinterdnd2 import TkinterDnD
 from utils import App
 from ui import placeWindow
@@ -18,6 +19,7 @@ def onDestroy(event):
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()    # 打包后子集化工作进程也从这个入口启动
     root = TkinterDnD.Tk()
     # 设置窗口大小和位置
     window_rect = (App.Config.get('General', 'window_x', None),
@@ -1,5 +1,7 @@
 import io
+import hashlib
 from typing import Self
+from utils import Trace
 from . import UU    # 导入Cython版本UUEncoding库
 
 
@@ -28,6 +30,19 @@ class SectionLines:
         else:   # 出现空行则可以进入下一Section
             return False
 
+    def appendBlock(self, text: str, start: int, end: int) -> bool:
+        """
+        添加一整块行，效果与对其中各行逐一append相同
+        :param text: 块所在的字串，为避免拷贝，块以起止位置指定
+        :param start: 块的起始位置
+        :param end: 块的结束位置（不含），块内不能有空行
+        :return: 同append
+        """
+        continuous = self.continuous
+        for line in text[start:end].split('\n'):
+            continuous = self.append(line)
+        return continuous
+
     def toString(self) -> str:
         """把整个Section段都输出为字幕文本"""
         if self.__lineList:
@@ -35,6 +50,10 @@ class SectionLines:
         else:
             return ''
 
+    def writeTo(self, file) -> None:
+        """把整个Section段都输出为字幕文本，并写入到文件"""
+        file.write(self.toString())
+
     @staticmethod
     def _splitLineString(lineStr: str, sep: str = ':') -> tuple[str, str]:
         """
@@ -163,10 +182,11 @@ class StyleDict(SectionLines):
         return iter(k for k in self._styles if not k.startswith(self.INVALID_KEY))
 
 
-class FontDict(dict[str, list[str]], SectionLines):
+class FontDict(dict[str, list[str | bytes | memoryview]], SectionLines):
     """
     用于维护所有内嵌字体的类，包括字体名和二进制字体内容. 注意ASS内嵌字体只支持TTF，不支持TTC.
-    其中键为内嵌字体名，值为所有同名字体的数据字串列表，字幕文件中保存的多行数据被合并为一行保存.
+    其中键为内嵌字体名，值为所有同名字体的数据列表，字幕文件中保存的多行数据被合并为一行保存.
+    数据可以是UU编码字串（从文件读入），也可以是尚未编码的字体二进制数据（新嵌入），后者在写入文件时才编码.
     """
     FONTNAME_PREFIX = 'fontname:'   # 字体编码数据前一行的名字前缀，规定全小写
     LINE_LENGTH = 80    # 内嵌字体数据自动折行长度
@@ -189,6 +209,26 @@ class FontDict(dict[str, list[str]], SectionLines):
         # else:   # 没有当前字体名，也不是字体名行，那是无效行
         return True    # 下一个必须还是本Section，直到出现空行为止
 
+    def appendBlock(self, text: str, start: int, end: int) -> bool:
+        """加入一整块行，字体数据行整段去掉换行后暂存，不再逐行处理. 参数同SectionLines.appendBlock"""
+        name_line_prefix = '\n' + self.FONTNAME_PREFIX
+        pos = start
+        while pos < end:
+            if text.startswith(self.FONTNAME_PREFIX, pos, end):  # 字体名行
+                line_end = text.find('\n', pos, end)
+                if line_end == -1:
+                    line_end = end
+                self._switchFont(text[pos + len(self.FONTNAME_PREFIX):line_end].strip())
+                pos = line_end + 1
+                continue
+            data_end = text.find(name_line_prefix, pos, end)    # 数据行直到下一个字体名行为止
+            if data_end == -1:
+                data_end = end
+            if self._currentFontname:
+                self._currentFontLines.append(text[pos:data_end].replace('\n', ''))
+            pos = data_end + 1
+        return True
+
     def _switchFont(self, fontName: str | None) -> None:
         """切换字体文件，将上一个文件的数据字串全部拼接成一行"""
         if self._currentFontname:
@@ -198,16 +238,18 @@ class FontDict(dict[str, list[str]], SectionLines):
         self._currentFontname = fontName
         self._currentFontLines = []
 
-    def add(self, fontBytes: bytes, fontName: str, index: int = 0, overwrite: bool = False) -> int:
+    @Trace.traced('FontDict.add', stage=True)
+    def add(self, fontBytes: bytes | bytearray | memoryview, fontName: str, index: int = 0,
+            overwrite: bool = False) -> int:
         """
-        添加（嵌入）字体文件
-        :param fontBytes: 嵌入字体的字节流
+        添加（嵌入）字体文件. 数据不会被拷贝或立即编码，而是在写入文件时才直接编码到文件中
+        :param fontBytes: 嵌入字体的字节流，可以是任何支持buffer协议的对象，嵌入后不可再修改它
         :param fontName: 嵌入字体的文件名，即fontname:行的内容
         :param index: 嵌入字体在同名字体中的序号，仅在overwrite为True时有意义
         :param overwrite: 覆盖现有的同名同序号字体
         :return: 字体实际嵌入的位置序号
         """
-        font_code = UU.Encode(fontBytes)
+        font_code = fontBytes if isinstance(fontBytes, bytes) else memoryview(fontBytes).toreadonly()
         if fontName in self:
             font_codes = self[fontName]
             if overwrite and index < len(font_codes):
@@ -231,12 +273,77 @@ class FontDict(dict[str, list[str]], SectionLines):
         if font_code is None:
             return None
         try:
-            ttf_bytes = io.BytesIO(UU.Decode(font_code[index]))
+            font_code = font_code[index]
+            # 新嵌入的字体还未编码，可直接使用原数据
+            ttf_bytes = io.BytesIO(UU.Decode(font_code) if isinstance(font_code, str) else font_code)
             ttf_bytes.seek(0)
             return ttf_bytes
         except Exception:
             return None
 
+    @staticmethod
+    def digest(stream: io.BytesIO) -> bytes:
+        """字体数据的SHA-256摘要，内容相同的字体摘要相同"""
+        with stream.getbuffer() as view:
+            return hashlib.sha256(view).digest()
+
+    def encodedSize(self, name: str, index: int = 0) -> int:
+        """字体写入字幕后占用的字符数，包括fontname行、折行和字体之间的空行"""
+        font_code = self[name][index]
+        code_length = len(font_code) if isinstance(font_code, str) else UU.EncodedLength(len(font_code))
+        lines = (code_length + self.LINE_LENGTH - 1) // self.LINE_LENGTH
+        return len(self.FONTNAME_PREFIX) + len(name) + 3 + code_length + lines
+
+    def decodedSize(self, name: str, index: int = 0) -> int:
+        """字体解码后的字节数，不需要解码"""
+        font_code = self[name][index]
+        return UU.DecodedLength(len(font_code)) if isinstance(font_code, str) else len(font_code)
+
+    @Trace.traced('FontDict.findDuplicates', stage=True)
+    def findDuplicates(self) -> list[tuple[str, int, str, int]]:
+        """
+        查找内容相同的重复字体，包括不同内嵌名下和同一内嵌名下的多份. 只有解码后大小相同的字体才需要比较，
+        同为编码字串或同为二进制数据的直接比较数据，不必解码；一个是编码字串一个是二进制数据的才解码后比较摘要
+        :return: [(重复的字体名, 序号, 保留的字体名, 序号)]，内容相同的字体保留第一个，按字体顺序排列
+        """
+        font_keys = [(font_name, i) for font_name in self for i in range(len(self[font_name]))]
+        size_groups: dict[int, list[tuple[str, int]]] = {}  # {解码后大小: 保留的字体}
+        digests: dict[tuple[str, int], bytes | None] = {}   # 已计算的摘要缓存
+
+        def digestOf(key: tuple[str, int]) -> bytes | None:
+            if key not in digests:
+                stream = self.getStream(*key)
+                digests[key] = self.digest(stream) if stream else None
+            return digests[key]
+
+        duplicates = []
+        for key in font_keys:
+            font_code = self[key[0]][key[1]]
+            kept_keys = size_groups.setdefault(self.decodedSize(*key), [])
+            for kept_key in kept_keys:
+                kept_code = self[kept_key[0]][kept_key[1]]
+                if isinstance(font_code, str) == isinstance(kept_code, str):
+                    identical = font_code == kept_code
+                else:
+                    identical = digestOf(key) is not None and digestOf(key) == digestOf(kept_key)
+                if identical:
+                    duplicates.append(key + kept_key)
+                    break
+            else:
+                kept_keys.append(key)
+        return duplicates
+
+    def removeFonts(self, keys: list[tuple[str, int]]) -> None:
+        """
+        删除多个字体，同名字体全部删除后去掉该名字
+        :param keys: [(字体名, 序号)]，序号为删除前的序号
+        """
+        for font_name, index in sorted(keys, key=lambda k: k[1], reverse=True):    # 从后往前删，序号不受影响
+            font_codes = self[font_name]
+            font_codes.pop(index)
+            if not font_codes:
+                self.pop(font_name)
+
     def toString(self) -> str:
         """把整个内嵌字体段都输出为字幕文本"""
         if self:
@@ -244,6 +351,8 @@ class FontDict(dict[str, list[str]], SectionLines):
             for font_name, font_codes in self.items():
                 for font_code in font_codes:
                     str_list.append(f"{self.FONTNAME_PREFIX} {font_name}")
+                    if not isinstance(font_code, str):  # 新嵌入的字体数据，先编码
+                        font_code = UU.Encode(font_code)
                     i = 0
                     while i < len(font_code):   # 拆分为多行写入
                         str_list.append(font_code[i:i + self.LINE_LENGTH])
@@ -254,6 +363,34 @@ class FontDict(dict[str, list[str]], SectionLines):
         else:
             return ''
 
+    @Trace.traced('FontDict.encode', stage=True)
+    def writeTo(self, file) -> None:
+        """
+        把整个内嵌字体段写入到文件，输出与toString相同，但字体数据按块编码和折行后直接写入，
+        不会生成整段字串，从而避免字体数据在内存中的多次拷贝
+        """
+        if not self:
+            return
+        file.write(self.sectionName)
+        separator = '\n'
+        for font_name, font_codes in self.items():
+            for font_code in font_codes:
+                file.write(f"{separator}{self.FONTNAME_PREFIX} {font_name}")
+                separator = '\n\n'  # 空行，代表上一个字体数据结束
+                if not len(font_code):
+                    continue
+                file.write('\n')
+                if isinstance(font_code, str):  # 从文件读入的编码字串，按块拆分为多行写入
+                    step = self.LINE_LENGTH * 1024
+                    for i in range(0, len(font_code), step):
+                        if i > 0:
+                            file.write('\n')
+                        chunk = font_code[i:i + step]
+                        file.write('\n'.join(chunk[j:j + self.LINE_LENGTH]
+                                             for j in range(0, len(chunk), self.LINE_LENGTH)))
+                else:   # 新嵌入的字体数据，边编码边写入
+                    UU.EncodeTo(file, font_code, self.LINE_LENGTH)
+
     def copy(self) -> Self:
         """拷贝实例"""
         new_self = self.__class__()
@@ -295,25 +432,39 @@ class DialogueList(SectionLines):
         if 'style' not in self._fieldNameIndexes or 'text' not in self._fieldNameIndexes:
             raise ValueError("Subtitle format error.")
 
+    def parseLine(self, lineStr: str) -> list[str] | str | None:
+        """
+        解析一行但不保存，Format行会更新格式
+        :return: Dialogue行返回字段值列表，其他行返回原字串，Format行和空行返回None
+        """
+        if not lineStr:
+            return None
+        # 切分行，如前段Style，后段Default,...
+        line_name, line_content = self._splitLineString(lineStr)
+        if line_name == self.FORMAT:    # Format行
+            field_values = [s.strip() for s in line_content.split(',')]
+            self._setFormat(field_values)
+            return None
+        elif line_name == self.DIALOGUE and self._fieldNameIndexes:    # Dialogue行
+            # 切分字段值，最多切分为字段名数量分组，最后一个字段值（即Text）内可包含','
+            return [s.strip() for s in line_content.split(',', len(self._fieldNameIndexes) - 1)]
+        else:   # 其他行任意名，如Comment，直接保存字串，与Dialogue行的list以类型区分
+            return lineStr
+
     def append(self, lineStr: str) -> bool:
         """加入行，必须先加入Format行后才能加入Dialogue行"""
-        if lineStr:
-            # 切分行，如前段Style，后段Default,...
-            line_name, line_content = self._splitLineString(lineStr)
-            if line_name == self.FORMAT:    # Format行
-                field_values = [s.strip() for s in line_content.split(',')]
-                self._setFormat(field_values)
-            elif line_name == self.DIALOGUE and self._fieldNameIndexes:    # Dialogue行
-                # 切分字段值，最多切分为字段名数量分组，最后一个字段值（即Text）内可包含','
-                field_values = [s.strip() for s in line_content.split(',', len(self._fieldNameIndexes) - 1)]
-                self._dialogueList.append(field_values)
-            else:   # 其他行任意名，如Comment，直接保存字串，与Dialogue行的list以类型区分
-                self._dialogueList.append(lineStr)
+        content = self.parseLine(lineStr)
+        if content is not None:
+            self._dialogueList.append(content)
         return False
 
+    def fieldValue(self, fieldValues: list[str], fieldName: str) -> str:
+        """从parseLine返回的字段值列表中取出指定字段的值"""
+        return fieldValues[self._fieldNameIndexes[fieldName.lower()]]
+
     def get(self, index: int, fieldName: str) -> str:
         """获取序号指定的Dialogue行的字段值，只能对Dialogue行执行，其他行名的不行"""
-        return self._dialogueList[index][self._fieldNameIndexes[fieldName.lower()]]
+        return self.fieldValue(self._dialogueList[index], fieldName)
 
     def isValid(self, index: int):
         """返回序号指定的行是否是有效的Dialogue行"""
@@ -1,8 +1,11 @@
 import os
 import re
-from dataclasses import dataclass
-from charset_normalizer import from_path
-from utils import Lang
+import codecs
+import shutil
+import tempfile
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
+from utils import App, Lang, Trace
 from font import Font, FontManager
 from .SectionLines import *
 
@@ -22,12 +25,15 @@ class SubFontDesc:
     isEmbed: bool = False   # 当前字体对象是否是内嵌字体
     font: Font | None = None    # 字体对象，可能为None
     valid: bool = True  # 字体是否有效，通常指内嵌字体
+    missing: set[str] = field(default_factory=set)  # 字体对象中缺失的字符
+    vertical: bool = False  # 是否有以@开头的竖排引用
 
 
 class SubFontDescDict(dict[tuple[str, bool, bool], SubFontDesc]):
     """用于收集字幕中出现过字体以及其覆盖的字符，结构为{(fontName, bold, italic): chars}"""
 
     digit_ptn = re.compile(r'[+-]?\d+') # 提取字串前部的数字
+    escape_ptn = re.compile(r'\\[Nnh]')  # SSA中允许的三种转义字符\N、\n、\h
 
     @classmethod
     def toBool(cls, s) -> bool:
@@ -40,9 +46,13 @@ class SubFontDescDict(dict[tuple[str, bool, bool], SubFontDesc]):
         else:
             return False
 
-    def __init__(self, fontMgr: FontManager):
+    def __init__(self, fontMgr: 'FontManager | None'):
+        """
+        :param fontMgr: 用于搜索文件源的字体管理器，为None时不搜索文件源，所有条目的font都为None
+        """
         super().__init__()
         self.fontMgr = fontMgr
+        self._unresolvedKeys: list[tuple[str, bool, bool]] = []   # 尚未搜索文件源的条目
 
     def addTextToFont(self, fontName: str, bold: str | bool, italic: str | bool, text: str = '',
                       font: Font = None, valid: bool = True):
@@ -50,23 +60,47 @@ class SubFontDescDict(dict[tuple[str, bool, bool], SubFontDesc]):
         if not fontName:
             return
         # 处理参数格式 ------
+        vertical = fontName.startswith('@')
         fontName = fontName.lstrip('@') # 字体名前面的@表示旋转90度，引用的字体文件还是同一个
         bold = self.toBool(bold)
         italic = self.toBool(italic)
-        # 将SSA中允许的三种转义字符替换掉
-        text = (text.replace('\\N', '') # 硬回车替换为空
-                .replace('\\n', '')     # 软回车替换为空
-                .replace('\\h', ' '))   # \h替换为空格
+        # 将SSA中允许的三种转义字符替换掉，硬回车、软回车替换为空，\h替换为空格. 一次从左到右扫描，与渲染器的解析一致
+        if '\\' in text:
+            text = self.escape_ptn.sub(lambda m: ' ' if m.group() == '\\h' else '', text)
         # 向字典中加入字体覆盖的文字 ------
         key = (fontName.lower(), bold, italic)  # 字典的访问键
         chars = set(c for c in text)    # 将每一个字符单独加入set，合并重复字符
         if key in self:
             self[key].text.update(chars)
-        else:   # 新字体，搜索文件源，注意搜索结果可能为None
-            if font is None:
-                font = self.fontMgr.match(fontName, bold, italic)
+            self[key].vertical |= vertical
+        else:   # 新字体，未指定字体对象的，等收集完所有文字后再统一搜索文件源
             is_embed = bool(font and font.inMemory)
-            self[key] = SubFontDesc(fontName, chars, bold, italic, is_embed, font, valid)
+            self[key] = SubFontDesc(fontName, chars, bold, italic, is_embed, font, valid, vertical=vertical)
+            if font is None:
+                self._unresolvedKeys.append(key)
+
+    @Trace.traced('resolveFonts')
+    def resolveFonts(self):
+        """
+        为未指定字体对象的条目搜索文件源，并检查每个字体缺失的字符.
+        应在收集完所有文字后调用，这样才能按字符覆盖情况在同名字体中选择最合适的.
+        """
+        if self.fontMgr is None:    # 没有字体管理器，只收集字体和文字
+            self._unresolvedKeys.clear()
+            return
+        for key in self._unresolvedKeys:
+            font_desc = self[key]
+            font_desc.font = self.fontMgr.match(font_desc.fontName, font_desc.bold, font_desc.italic,
+                                                text=font_desc.text)   # 注意搜索结果可能为None
+            font_desc.isEmbed = bool(font_desc.font and font_desc.font.inMemory)
+        self._unresolvedKeys.clear()
+
+        for font_desc in self.values():
+            if font_desc.font and font_desc.valid and font_desc.text:
+                try:
+                    font_desc.missing = font_desc.font.getMissingChars(font_desc.text)
+                except Exception:   # 读不出cmap的字体，无法判断缺失字符
+                    font_desc.missing = set()
 
 
 class SubStationAlpha:
@@ -78,18 +112,17 @@ class SubStationAlpha:
     _inlineFont_ptn = re.compile(r'\\\s*fn([^\\}]+)')   # 用于查找{}内的\fn内容并提取字体名
     _inlineBold_ptn = re.compile(r'\\\s*b\s*(\d+)')     # 用于查找{}内的\b并提取后面的数字，注意不要跟\bord\blur\be混淆
     _inlineItalic_ptn = re.compile(r'\\\s*i\s*(\d+)')   # 用于查找{}内的\i并提取后面的数字
+    _inlineDrawing_ptn = re.compile(r'\\\s*p\s*(\d+)')  # 用于查找{}内的\p并提取绘图模式级别，注意不要跟\pos\pbo混淆
     _section_ptn = re.compile(r'^\[.*]')    # 匹配中括号行[...]
+    _sectionBytes_ptn = re.compile(rb'^\[.*]')  # 同上，用于字节行
+    _controlChars = bytes(range(0x20)) + b'\x7f'   # 行首需要去掉的不可打印字符
+    LOAD_CHUNK_SIZE = 1 << 22   # 载入时每次读取的字符数
+    _specialLineStart_ptn = re.compile(r'\n[^\x20-\x7e]')  # 行首不是可打印ASCII字符的行，连贯段中出现时逐行处理
+    ENCODING_SAMPLE_SIZE = 1 << 16  # 分析模式下编码检测只读取文件开头的这么多字节
 
     def __init__(self, path: str, encoding: str = None):
         self.filePath = path    # 文件路径
-
-        self.infoList = SectionLines('[Script Info]') # Script Info段
-        self.styleDict = StyleDict()    # Style段
-        self.fontDict = FontDict()      # 内嵌字体段，结构为{fontname: [fontcode]}，fontname可能有重复，所以值是一个list
-        self.graphicList = SectionLines('[Graphics]', continuous=True)   # 内嵌图片段，这里只存行字串，不做任何处理
-        self.dialogueList = DialogueList()  # 对白段
-
-        self.sectionsInOrder: list[SectionLines] = []   # 保存各个SectonLines并记录它们的顺序，以便重建文件时不会搞混
+        self._initSections()
         self._load(path, encoding)  # 载入文件
         self.fontMgr = FontManager(embedFonts=self.fontDict, path=os.path.dirname(self.filePath))  # 管理内嵌字体
         self.invalidFonts: list[Font] = []   # 内嵌字体中的无效项
@@ -102,6 +135,15 @@ class SubStationAlpha:
                     if (font_name, i) not in valid_fonts:   # 创建一个空Font对象代表无效字体
                         self.invalidFonts.append(Font(font_name, i, True, False))
 
+    def _initSections(self):
+        """创建各个空的Section对象"""
+        self.infoList = SectionLines('[Script Info]') # Script Info段
+        self.styleDict = StyleDict()    # Style段
+        self.fontDict = FontDict()      # 内嵌字体段，结构为{fontname: [fontcode]}，fontname可能有重复，所以值是一个list
+        self.graphicList = SectionLines('[Graphics]', continuous=True)   # 内嵌图片段，这里只存行字串，不做任何处理
+        self.dialogueList = DialogueList()  # 对白段
+        self.sectionsInOrder: list[SectionLines] = []   # 保存各个SectonLines并记录它们的顺序，以便重建文件时不会搞混
+
     @classmethod
     def load(cls, path: str, encoding: str = None) -> Self:
         """
@@ -117,10 +159,13 @@ class SubStationAlpha:
         else:
             return cls(path, encoding)
 
+    @Trace.traced('SubStationAlpha._load', stage=True)
     def _load(self, path: str, encoding: str = None):
         """载入字幕文件"""
         if not encoding:    # 如果没有指定编码，则自动判断
-            match = from_path(path).best()
+            from charset_normalizer import from_path    # 编码检测库导入较慢，只在需要时导入
+            with Trace.span('detectEncoding'):
+                match = from_path(path).best()
             if match:
                 encoding = match.encoding
             else:
@@ -138,26 +183,60 @@ class SubStationAlpha:
         section: SectionLines | None = None # 当前行所在的Section对象
         continuous_section = False  # 是否正在读取连贯Section
 
-        with (open(path, 'r', encoding=encoding) as file):  # 打开文件
-            for i, line in enumerate(file):   # 读取每一行
-                first_printable_pos = next((j for j, c in enumerate(line) if c.isprintable()), len(line))
-                line = line[first_printable_pos:].rstrip('\r\n')    # 去掉开头的不可打印字符和尾部的回车
-                if not continuous_section:  # 非连贯段，即这一行可以开始一个新的Section
-                    match_obj = self._section_ptn.match(line)   # 检查是否以[*]开头的Section行
-                    if match_obj:    # 中括号行出现，切换行类型
-                        section_name = match_obj.group(0).lower()
-                        # 对于非标准的Section，如"[Aegisub Project Garbage]"，临时新建一个SectonLines保存
-                        section = sections.get(section_name, SectionLines(section_name.title()))
-                        if section is self.styleDict:   # 如果是Style段，需要给它确定一下具体名字版本
-                            self.styleDict.init(section_name)
-                        if section not in self.sectionsInOrder:     # 如果标准Section有重复的，以第一个的位置为准
-                            self.sectionsInOrder.append(section)    # 保存入顺序表
-                        continue
-                try:
-                    continuous_section = section.append(line)   # 向SectionLines插入新行
-                except:
-                    raise SubException(Lang["Line {d} format error."].format(d=i+1))
-
+        line_base = 0   # 当前块之前的行数，用于报告出错行号
+        with open(path, 'r', encoding=encoding) as file:
+            # 按块读入，每块补齐到行尾，块内再用find切分行和连贯段的数据块，不逐字符处理 -------
+            while text := file.read(self.LOAD_CHUNK_SIZE):
+                text += file.readline()
+                length = len(text)
+                pos = 1 if line_base == 0 and text.startswith('\ufeff') else 0    # BOM只会出现在第一行开头
+                slow_until = 0  # 这个位置之前的连贯段数据中有特殊行，需要逐行处理
+                while pos < length:
+                    # 连贯段（内嵌字体、图片）的数据块，到下一个空行为止整块交给Section -------
+                    if (section is not None and section.continuous and pos >= slow_until
+                            and ' ' <= text[pos] <= '~' and (continuous_section or text[pos] != '[')):
+                        block_end = text.find('\n\n', pos)
+                        if block_end == -1:     # 块内没有空行，数据块直到块结尾
+                            block_end = length - 1 if text.endswith('\n') else length
+                        # 各行行首都是可打印ASCII字符时，不需要去掉不可打印字符，也不会有去掉后变成空行的行
+                        if self._specialLineStart_ptn.search(text, pos, block_end) is None:
+                            try:
+                                continuous_section = section.appendBlock(text, pos, block_end)
+                            except:
+                                raise SubException(Lang["Line {d} format error."].format(
+                                    d=line_base + text.count('\n', 0, pos) + 1))
+                            pos = block_end + 1
+                            continue
+                        slow_until = block_end  # 数据块中有特殊行，仍按原逻辑逐行处理
+
+                    # 普通行 -------
+                    line_start = pos
+                    line_end = text.find('\n', pos)
+                    if line_end == -1:
+                        line_end = length
+                    line = text[pos:line_end]
+                    pos = line_end + 1
+                    if line and not ' ' <= line[0] <= '~':  # 行首不是可打印ASCII字符时，才去掉开头的不可打印字符
+                        line = line[next((j for j, c in enumerate(line) if c.isprintable()), len(line)):]
+                    if not continuous_section and line.startswith('['):  # 非连贯段，即这一行可以开始一个新的Section
+                        match_obj = self._section_ptn.match(line)   # 检查是否以[*]开头的Section行
+                        if match_obj:    # 中括号行出现，切换行类型
+                            section_name = match_obj.group(0).lower()
+                            # 对于非标准的Section，如"[Aegisub Project Garbage]"，临时新建一个SectonLines保存
+                            section = sections.get(section_name, SectionLines(section_name.title()))
+                            if section is self.styleDict:   # 如果是Style段，需要给它确定一下具体名字版本
+                                self.styleDict.init(section_name)
+                            if section not in self.sectionsInOrder:     # 如果标准Section有重复的，以第一个的位置为准
+                                self.sectionsInOrder.append(section)    # 保存入顺序表
+                            continue
+                    try:
+                        continuous_section = section.append(line)   # 向SectionLines插入新行
+                    except:
+                        raise SubException(Lang["Line {d} format error."].format(
+                            d=line_base + text.count('\n', 0, line_start) + 1))
+                line_base += text.count('\n')
+
+    @Trace.traced('SubStationAlpha.save', stage=True)
     def save(self, path: str = None, encoding: str = None):
         """
         保存文件到路径
@@ -183,9 +262,279 @@ class SubStationAlpha:
         # 写入文件 -----
         with open(path, 'w', encoding=encoding) as file:
             for section_lines in self.sectionsInOrder:
-                file.write(section_lines.toString())
+                section_lines.writeTo(file) # 各段直接写入文件，内嵌字体段不会生成整段字串
                 file.write('\n\n')
 
+    @classmethod
+    @Trace.traced('SubStationAlpha.strip', stage=True)
+    def strip(cls, path: str, outPath: str = None, fontNames: list[str] = None, encoding: str = None) -> int:
+        """
+        删除字幕中的内嵌字体. 以字节流方式逐行拷贝文件，跳过[Fonts]段，不做编码检测，不解码也不解析任何字体，
+        因此不需要构造实例，速度接近文件拷贝. 除被删除的行以外，其他行原样保留.
+        :param path: 字幕文件路径
+        :param outPath: 输出路径，缺省则覆盖源文件
+        :param fontNames: 只删除这些名字（即fontname:行的内容）的内嵌字体，缺省则删除整个[Fonts]段
+        :param encoding: 文件编码，只在fontNames中有非ASCII名字时需要指定，缺省按BOM判断，无BOM视为UTF-8
+        :return: 删除的内嵌字体数量
+        """
+        if not os.path.isfile(path):
+            raise SubException(Lang["File {p} doesn't exist."].format(p=path))
+        elif not os.access(path, os.R_OK):
+            raise SubException(Lang['Unable to read file {p}.'].format(p=path))
+        out_path = outPath or path
+        out_dir = os.path.dirname(os.path.abspath(out_path))
+        if not os.access(out_dir, os.W_OK):
+            raise SubException(Lang['Unable to write file {p}.'].format(p=out_path))
+
+        with open(path, 'rb') as file:
+            head = file.read(4)
+        if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):  # UTF-16不兼容ASCII，需要转码后按行处理
+            encoding = 'utf-16'
+        elif head.startswith(codecs.BOM_UTF8):
+            encoding = 'utf-8'
+        names = None if fontNames is None else \
+            set(name.encode('utf-8' if encoding == 'utf-16' else encoding or 'utf-8') for name in fontNames)
+
+        # 先写入同目录的临时文件，完成后再替换目标文件，这样原地处理时出错也不会损坏源文件 -----
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=out_dir)
+        try:
+            with os.fdopen(fd, 'wb') as out_file, open(path, 'rb') as file:
+                if encoding == 'utf-16':
+                    reader = codecs.getreader('utf-16')(file)
+                    writer = codecs.getwriter('utf-16')(out_file)
+                    lines = (line.encode('utf-8') for line in reader)
+                    stripped = cls._stripLines(lines, names, lambda line: writer.write(line.decode('utf-8')))
+                else:
+                    stripped = cls._stripLines(file, names, out_file.write)
+            shutil.copymode(path, temp_path)    # 临时文件的权限是私有的，改为与源文件相同
+            os.replace(temp_path, out_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return stripped
+
+    @classmethod
+    def _stripLines(cls, lines, names: set[bytes] | None, write) -> int:
+        """
+        逐行过滤[Fonts]段，段的划分规则与_load相同：[Fonts]为连贯段，空行之后才可能出现新的段
+        :param lines: 字节行迭代器，行尾带换行符
+        :param names: 需要删除的字体名，None表示删除整个段
+        :param write: 写出一行的函数
+        :return: 删除的内嵌字体数量
+        """
+        prefix = FontDict.FONTNAME_PREFIX.encode()
+        in_fonts = False        # 是否在[Fonts]段内
+        continuous = False      # 是否在连贯段内，即下一行不可能是段名
+        dropping = False        # 当前字体条目是否被删除
+        pending_header = None   # 部分删除时暂缓写出的[Fonts]段名行，有保留的字体时才写出
+        blank_written = False   # 段内最后写出的一行是否是空行，删除的字体后面的空行要靠它补上，且只补一个
+        stripped = 0
+        for i, line in enumerate(lines):
+            content = line.rstrip(b'\r\n').lstrip(cls._controlChars)
+            if i == 0 and content.startswith(codecs.BOM_UTF8):
+                content = content[len(codecs.BOM_UTF8):].lstrip(cls._controlChars)
+            if not continuous and cls._sectionBytes_ptn.match(content):  # 新的段开始
+                in_fonts = content.lower() == b'[fonts]'
+                dropping = False
+                blank_written = False
+                if in_fonts:
+                    if names is not None:   # 部分删除时，先记下段名行
+                        pending_header = line
+                    continue
+            if not in_fonts:    # 其他段原样写出
+                write(line)
+                continue
+
+            # [Fonts]段内 -----
+            if not content:     # 空行，结束当前字体条目，下一行可以是新的段
+                continuous = False
+                # 已写出过保留的字体时，空行不论当前条目是否删除都要保留一个，否则下一个段名会接在字体数据后面
+                if names is not None and pending_header is None and not blank_written:
+                    write(line)
+                    blank_written = True
+                continue
+            continuous = True
+            if content.startswith(prefix):  # 新字体条目
+                dropping = names is None or content[len(prefix):].strip() in names
+                if dropping:
+                    stripped += 1
+                elif pending_header is not None:    # 第一个保留的字体，补写段名行
+                    write(pending_header)
+                    pending_header = None
+            if names is not None and not dropping and pending_header is None:
+                write(line)
+                blank_written = False
+        return stripped
+
+    @staticmethod
+    def _excludedStyles() -> list[str]:
+        """
+        从配置读取不计入字体覆盖的样式规则，用于只做特效、不显示文字的样式（如遮罩、光效）.
+        配置项coverage_exclude_styles，规则之间以分号分隔，支持通配符，不区分大小写. 注释（Comment）行本来就不计入
+        """
+        setting = App.Config.get('General', 'coverage_exclude_styles', '')
+        return [p.strip().lower() for p in setting.split(';') if p.strip()]
+
+    @staticmethod
+    def _isStyleExcluded(styleName: str, patterns: list[str]) -> bool:
+        """样式是否匹配_excludedStyles中的规则"""
+        style_name = styleName.strip().lower()
+        return any(fnmatchcase(style_name, p) for p in patterns)
+
+    @classmethod
+    def _iterFontRuns(cls, styleDict: StyleDict, styleName: str, text: str):
+        """
+        按行内覆盖样式{}把一行对白切分为使用不同字体的片段
+        :param styleDict: 样式表
+        :param styleName: 该行的样式名，如：Default
+        :param text: 对白文本部分，里面可能还有{}内联样式
+        :return: 迭代器，每项为(字体名, 粗体, 斜体, 文字片段)，字体名可能为None，粗斜体为原始字串，绘图模式下的片段为空
+        """
+        fontname = styleDict.get(styleName, 'fontname')    # 该样式的字体名，可能找不到（Default也没有）
+        bold = styleDict.get(styleName, 'bold')        # 是否粗体，如"0"
+        italic = styleDict.get(styleName, 'italic')    # 是否斜体，如"1"
+        drawing = False # 是否处于\p绘图模式，绘图模式下的文字是矢量绘图指令，不使用字体
+        # 查找行内覆盖样式{} ---------
+        inlineContent_iter = cls._inlineContent_ptn.finditer(text) # {}内容正则匹配
+        text_pos = 0    # 对白字符位置指针
+
+        for inlineContent_match in inlineContent_iter:  # 遍历每一个{}中的内容
+            # 将{}之前的文字都划归给上一种样式，绘图指令不计入
+            yield fontname, bold, italic, '' if drawing else text[text_pos: inlineContent_match.start()]
+            text_pos = inlineContent_match.end()
+            inline_content_str = inlineContent_match.group(1)   # {}内部的文字，查找\*指令时大小写敏感
+
+            # 处理{}中的\p，\p0结束绘图模式 ---------
+            all_match = cls._inlineDrawing_ptn.findall(inline_content_str)
+            if all_match:
+                drawing = int(all_match[-1]) > 0
+
+            # 处理{}中的\r ---------
+            style_pos = 0   # \r*结尾位置的指针，如果出现\r，则后面粗斜体都应该从它之后开始查
+            style_iter = cls._inlineStyle_ptn.finditer(inline_content_str) # \r内容匹配
+            style_match = None
+            for style_match in style_iter:  # 跳过所有匹配，找到最后一个
+                pass
+            if style_match: # 如果找到\r，则更新字体和粗斜体配置
+                style_pos = style_match.end()   # 如果出现\r，则后面粗斜体都应该从它之后开始查
+                # 样式名查找顺序表，注意如果找不到，则回退到本行的样式，不是退到上一个\r
+                style_names = [style_match.group(1).strip(), styleName, 'Default']
+                fontname = styleDict.get(style_names, 'fontname')
+                bold = styleDict.get(style_names, 'bold')
+                italic = styleDict.get(style_names, 'italic')
+
+            # 处理{}中的\fn ---------
+            all_match = cls._inlineFont_ptn.findall(inline_content_str, style_pos)
+            if all_match:   # 提取最后一个\fn后面的字体名
+                fontname = all_match[-1].strip()
+            if not fontname:    # 如果到这里还找不到字体，连Default样式也没有
+                continue        # 那后面的粗体斜体都不用查了，没意义了
+
+            # 处理{}中的\b，注意区分\b和\bord ----------
+            all_match = cls._inlineBold_ptn.findall(inline_content_str, style_pos)
+            if all_match:   # 提取最后一个\b后面的数字
+                bold = all_match[-1]
+
+            # 处理{}中的\i，注意区分\i和\iclip ----------
+            all_match = cls._inlineItalic_ptn.findall(inline_content_str, style_pos)
+            if all_match:   # 提取最后一个\i后面的数字
+                italic = all_match[-1]
+
+        # 将最后一个{}（或没有）之后的文字都划归给最后一个样式
+        yield fontname, bold, italic, '' if drawing else text[text_pos:]
+
+    @classmethod
+    @Trace.traced('SubStationAlpha.analyze', stage=True)
+    def analyze(cls, path: str, encoding: str = None) -> list[SubFontDesc]:
+        """
+        只读分析模式，统计字幕引用的字体及各字体覆盖的文字，用于批量审计.
+        逐行流式读取，只保留样式表和当前行，不保存对白，不解码内嵌字体，也不搜索字体文件源，
+        因此内存占用与文件大小无关. 结果与gatherFonts中引用字体的部分相同，但所有条目的font都为None.
+        :param path: 字幕文件路径
+        :param encoding: 文件编码，缺省则根据BOM或文件开头的一段内容自动判断
+        :return: 字体描述列表
+        """
+        if not os.path.isfile(path):
+            raise SubException(Lang["File {p} doesn't exist."].format(p=path))
+        elif not os.access(path, os.R_OK):
+            raise SubException(Lang['Unable to read file {p}.'].format(p=path))
+        if not encoding:
+            encoding = cls._detectEncoding(path)
+
+        font_desc_dict = SubFontDescDict(None)
+        style_dict = StyleDict()
+        dialogue_list = DialogueList()  # 只用来解析Format和Dialogue行，不保存行
+        excluded_styles = cls._excludedStyles()
+        style_sections = tuple(s.lower() for s in StyleDict.SECTION_NAMES)
+        events_section = dialogue_list.sectionName.lower()
+        section_name = ''   # 当前段名，小写
+        continuous_section = False  # 是否正在读取连贯Section，即[Fonts]、[Graphics]
+        styles_added = False    # 样式字体是否已加入结果
+
+        def addStyleFonts():
+            """加入样式中的字体，即使覆盖字符数为0也应出现在结果中，与gatherFonts相同"""
+            for style_name in style_dict:
+                font_desc_dict.addTextToFont(style_dict.get(style_name, 'fontname'),
+                                             style_dict.get(style_name, 'bold'), style_dict.get(style_name, 'italic'))
+
+        with open(path, 'r', encoding=encoding, errors='replace') as file:
+            for i, line in enumerate(file):
+                first_printable_pos = next((j for j, c in enumerate(line) if c.isprintable()), len(line))
+                line = line[first_printable_pos:].rstrip('\r\n')
+                if continuous_section:  # 连贯段内，空行之前的都是数据，直接跳过
+                    continuous_section = bool(line)
+                    continue
+                if cls._section_ptn.match(line):    # 段名行
+                    section_name = line.lower()
+                    if section_name == events_section and not styles_added:
+                        addStyleFonts()     # 对白之前先加入样式字体，使结果顺序与gatherFonts一致
+                        styles_added = True
+                    elif section_name in style_sections:
+                        style_dict.init(section_name)
+                    continue
+                try:
+                    if section_name in ('[fonts]', '[graphics]'):
+                        continuous_section = bool(line)
+                    elif section_name in style_sections:
+                        style_dict.append(line)
+                    elif section_name == events_section:
+                        content = dialogue_list.parseLine(line)
+                        if isinstance(content, list):   # Dialogue行
+                            style_name = dialogue_list.fieldValue(content, 'style')
+                            if excluded_styles and cls._isStyleExcluded(style_name, excluded_styles):
+                                continue
+                            for fontname, bold, italic, text in cls._iterFontRuns(
+                                    style_dict, style_name, dialogue_list.fieldValue(content, 'text')):
+                                font_desc_dict.addTextToFont(fontname, bold, italic, text)
+                except Exception:
+                    raise SubException(Lang["Line {d} format error."].format(d=i+1))
+
+        if not styles_added:
+            addStyleFonts()
+        font_desc_dict.resolveFonts()
+        return list(font_desc_dict.values())
+
+    @classmethod
+    def _detectEncoding(cls, path: str) -> str:
+        """根据BOM或文件开头的一段内容判断编码，不读取整个文件"""
+        with open(path, 'rb') as file:
+            sample = file.read(cls.ENCODING_SAMPLE_SIZE)
+        if sample.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            return 'utf-16'
+        try:    # 截断处可能切开了多字节字符，去掉末尾几个字节再试
+            sample[:-3].decode('utf-8')
+            return 'utf-8'
+        except UnicodeDecodeError:
+            pass
+        from charset_normalizer import from_bytes   # 编码检测库导入较慢，只在需要时导入
+        match = from_bytes(sample).best()
+        if not match:
+            raise SubException(Lang["Encoding could not be recognized."])
+        return match.encoding
+
+    @Trace.traced('SubStationAlpha.gatherFonts', stage=True)
     def gatherFonts(self) -> list[SubFontDesc]:
         """搜集字幕中所有出现过的字体，包括样式字体、内联样式字体和内嵌字体，以及每种字体覆盖的文字数量"""
         fontDescDict = SubFontDescDict(self.fontMgr)
@@ -198,58 +547,18 @@ class SubStationAlpha:
             )
 
         # 收集Dialogue中出现的字体 ---------
+        excluded_styles = self._excludedStyles()    # 不计入覆盖的特效样式
         for i in range(len(self.dialogueList)):  # 遍历每一行对白
             if not self.dialogueList.isValid(i):
-                continue    # 跳过非Dialogue行
-            # 获取该行的样式名，去掉开头可能存在的*号
-            style_name = self.dialogueList.get(i, 'style')  # 样式名，如：Default
-            fontname = self.styleDict.get(style_name, 'fontname')   # 该样式的字体名，可能找不到（Default也没有）
-            bold = self.styleDict.get(style_name, 'bold')       # 是否粗体，如"0"
-            italic = self.styleDict.get(style_name, 'italic')   # 是否斜体，如"1"
-            # 查找行内覆盖样式{} ---------
-            text = self.dialogueList.get(i, 'text') # 对白文本部分，里面可能还有{}内联样式
-            inlineContent_iter = self._inlineContent_ptn.finditer(text) # {}内容正则匹配
-            text_pos = 0    # 对白字符位置指针
-
-            for inlineContent_match in inlineContent_iter:  # 遍历每一个{}中的内容
-                # 将{}之前的文字都划归给上一种样式
-                fontDescDict.addTextToFont(fontname, bold, italic, text[text_pos: inlineContent_match.start()])
-                text_pos = inlineContent_match.end()
-                inline_content_str = inlineContent_match.group(1)   # {}内部的文字，查找\*指令时大小写敏感
-
-                # 处理{}中的\r ---------
-                style_pos = 0   # \r*结尾位置的指针，如果出现\r，则后面粗斜体都应该从它之后开始查
-                style_iter = self._inlineStyle_ptn.finditer(inline_content_str) # \r内容匹配
-                style_match = None
-                for style_match in style_iter:  # 跳过所有匹配，找到最后一个
-                    pass
-                if style_match: # 如果找到\r，则更新字体和粗斜体配置
-                    style_pos = style_match.end()   # 如果出现\r，则后面粗斜体都应该从它之后开始查
-                    # 样式名查找顺序表，注意如果找不到，则回退到本行的样式，不是退到上一个\r
-                    style_names = [style_match.group(1).strip(), style_name, 'Default']
-                    fontname = self.styleDict.get(style_names, 'fontname')
-                    bold = self.styleDict.get(style_names, 'bold')
-                    italic = self.styleDict.get(style_names, 'italic')
-
-                # 处理{}中的\fn ---------
-                all_match = self._inlineFont_ptn.findall(inline_content_str, style_pos)
-                if all_match:   # 提取最后一个\fn后面的字体名
-                    fontname = all_match[-1].strip()
-                if not fontname:    # 如果到这里还找不到字体，连Default样式也没有
-                    continue        # 那后面的粗体斜体都不用查了，没意义了
-
-                # 处理{}中的\b，注意区分\b和\bord ----------
-                all_match = self._inlineBold_ptn.findall(inline_content_str, style_pos)
-                if all_match:   # 提取最后一个\b后面的数字
-                    bold = all_match[-1]
-
-                # 处理{}中的\i，注意区分\i和\iclip ----------
-                all_match = self._inlineItalic_ptn.findall(inline_content_str, style_pos)
-                if all_match:   # 提取最后一个\i后面的数字
-                    italic = all_match[-1]
-
-            # 将最后一个{}（或没有）之后的文字都划归给最后一个样式
-            fontDescDict.addTextToFont(fontname, bold, italic, text[text_pos:])
+                continue    # 跳过非Dialogue行，包括Comment行
+            style_name = self.dialogueList.get(i, 'style')
+            if excluded_styles and self._isStyleExcluded(style_name, excluded_styles):
+                continue
+            for fontname, bold, italic, text in self._iterFontRuns(
+                    self.styleDict, style_name, self.dialogueList.get(i, 'text')):
+                fontDescDict.addTextToFont(fontname, bold, italic, text)
+
+        fontDescDict.resolveFonts()  # 统一搜索文件源
 
         # 查找未被引用的内嵌字体 ---------
         all_fonts = set(font_desc.font for font_desc in fontDescDict.values() if font_desc.font)    # 所有找到的字体
@@ -3,7 +3,17 @@ UUEncoding编解码库，uu库只能硬盘操作，这里实现了纯内存操
 """
 
 
-def Encode(binArr: bytes) -> str:
+def EncodedLength(length: int) -> int:
+    """长度为length的二进制数据编码后的字符数"""
+    return length // 3 * 4 + (length % 3 + 1 if length % 3 else 0)
+
+
+def DecodedLength(length: int) -> int:
+    """长度为length的编码字串解码后的字节数"""
+    return length // 4 * 3 + (length % 4 - 1 if length % 4 else 0)
+
+
+def Encode(binArr: bytes, threads: int = None) -> str:
     code_chars = []
     i = 0
     while i < len(binArr):
@@ -25,7 +35,7 @@ def Encode(binArr: bytes) -> str:
     return ''.join(code_chars)
 
 
-def Decode(codeStr: str) -> bytes:
+def Decode(codeStr: str, threads: int = None) -> bytes:
     bin_arr = bytearray()
     code_num = [ord(c) - 33 for c in codeStr]
     i = 0
@@ -41,3 +51,36 @@ def Decode(codeStr: str) -> bytes:
             bin_arr.append((code_num[i + 2] & 0b00000011) << 6 | code_num[i + 3])
         i += 4
     return bin_arr
+
+
+def EncodeInto(src, dst, threads: int = None) -> int:
+    """UUEncoding编码，结果写入调用者提供的缓存，返回写入的字节数"""
+    code = Encode(memoryview(src).cast('B')).encode('ascii')
+    if len(dst) < len(code):
+        raise ValueError('Destination buffer is too small.')
+    memoryview(dst).cast('B')[:len(code)] = code
+    return len(code)
+
+
+def DecodeInto(src, dst, threads: int = None) -> int:
+    """UUEncoding解码，结果写入调用者提供的缓存，返回写入的字节数"""
+    bin_arr = Decode(bytes(src).decode('ascii'))
+    if len(dst) < len(bin_arr):
+        raise ValueError('Destination buffer is too small.')
+    memoryview(dst).cast('B')[:len(bin_arr)] = bin_arr
+    return len(bin_arr)
+
+
+def EncodeTo(writer, binArr, lineLength: int = 80) -> int:
+    """UUEncoding编码并按行长度折行，分块写入到writer，返回写入的字符数"""
+    data = memoryview(binArr).cast('B')
+    chunk_size = lineLength * 3 * 1024  # 每块编码为整数行
+    written = 0
+    for pos in range(0, len(data), chunk_size):
+        code = Encode(data[pos:pos + chunk_size])
+        text = '\n'.join(code[i:i + lineLength] for i in range(0, len(code), lineLength))
+        if pos > 0:
+            text = '\n' + text
+        writer.write(text)
+        written += len(text)
+    return written
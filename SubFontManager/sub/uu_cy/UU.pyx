@@ -1,73 +1,245 @@
+# cython: boundscheck=False, wraparound=False
 """
-Cython版的UUEncoding编解码库，uu库只能硬盘操作，这里实现了纯内存操作
+Cython版的UUEncoding编解码库，uu库只能硬盘操作，这里实现了纯内存操作.
+编解码核心均在释放GIL的状态下运行，大数据会按3字节/4字符对齐切块后由多个线程并行处理.
 """
 
+import os
+from concurrent.futures import ThreadPoolExecutor
 from libc.stdlib cimport malloc, free
 
+cdef extern from "Python.h":
+    object PyBytes_FromStringAndSize(const char* v, Py_ssize_t size)
+    char* PyBytes_AS_STRING(object o)
+    object PyUnicode_New(Py_ssize_t size, Py_UCS4 maxchar)
+    void* PyUnicode_DATA(object o)
+    bint PyUnicode_IS_ASCII(object o)
 
-cpdef Encode(binArr: bytes | bytearray):
-    """UUEncoding编码，输入bytes返回str"""
-    length = len(binArr)
-    cdef unsigned char* buffer = <unsigned char*>malloc(<int>(length * 4 / 3 + 2))
-    _encode(<const unsigned char*>binArr, length, buffer)
-    code: str = buffer.decode('ascii')   # 转换为Python str，因为合法的编码只包含英文和符号，所以可以用ascii编码
-    free(buffer)
+cdef enum:
+    ENCODE_CHUNK_LINES = 1024   # EncodeTo每次编码并写出的行数，决定了编码缓存的大小
+
+PARALLEL_THRESHOLD = 4 << 20    # 超过这个字节数的数据才会并行编解码，太小的数据开线程得不偿失
+MIN_CHUNK_SIZE = 1 << 20        # 并行时每块的最小字节数
+_pool: ThreadPoolExecutor | None = None  # 并行编解码使用的线程池，首次使用时创建
+
+
+def _getPool() -> ThreadPoolExecutor:
+    """获取编解码线程池"""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='UU')
+    return _pool
+
+
+def _defaultThreads(Py_ssize_t length) -> int:
+    """根据数据量决定使用的线程数"""
+    return (os.cpu_count() or 1) if length >= PARALLEL_THRESHOLD else 1
+
+
+cpdef Py_ssize_t EncodedLength(Py_ssize_t length):
+    """长度为length的二进制数据编码后的字符数"""
+    return length // 3 * 4 + (length % 3 + 1 if length % 3 else 0)
+
+
+cpdef Py_ssize_t DecodedLength(Py_ssize_t length):
+    """长度为length的编码字串解码后的字节数"""
+    return length // 4 * 3 + (length % 4 - 1 if length % 4 else 0)
+
+
+cpdef Encode(binArr, threads: int = None):
+    """
+    UUEncoding编码，输入bytes返回str. 结果直接写入新建的str内部，没有中间缓存
+    :param binArr: 需要编码的数据，可以是任何支持buffer协议的对象
+    :param threads: 编码线程数，缺省则根据数据量自动决定，小于1时按1处理
+    """
+    cdef const unsigned char[::1] src = binArr
+    code = PyUnicode_New(EncodedLength(src.shape[0]), 127)  # 纯ASCII字串，内部每个字符占1字节
+    _encodeParallel(src, <unsigned char*>PyUnicode_DATA(code), threads)
     return code
 
-cpdef Decode(codeStr: str):
-    """UUEncoding解码，输入str返回bytes"""
-    cdef unsigned char* buffer = <unsigned char*> malloc(<int>(len(codeStr) * 3 / 4 + 1))
-    _bytes = codeStr.encode('ascii')
-    bin_length = _decode(<const unsigned char*>_bytes, len(_bytes), buffer)
-    binArr: bytes = buffer[:bin_length]    # 转换为Python bytes
-    free(buffer)
+
+cpdef Decode(codeStr, threads: int = None):
+    """
+    UUEncoding解码，输入str返回bytes. 结果直接写入新建的bytes内部，没有中间缓存
+    :param codeStr: 编码字串，可以是str或任何支持buffer协议的ASCII数据
+    :param threads: 解码线程数，缺省则根据数据量自动决定，小于1时按1处理
+    """
+    cdef const unsigned char[::1] src
+    if not len(codeStr):
+        return b''
+    if isinstance(codeStr, str):
+        if not PyUnicode_IS_ASCII(codeStr):
+            raise ValueError('Invalid UUEncoding string.')
+        # ASCII字串内部就是单字节数组，直接借用，无需encode拷贝
+        src = <const unsigned char[:len(codeStr)]><const unsigned char*>PyUnicode_DATA(codeStr)
+    else:
+        src = codeStr
+    binArr = PyBytes_FromStringAndSize(NULL, DecodedLength(src.shape[0]))
+    _decodeParallel(src, <unsigned char*>PyBytes_AS_STRING(binArr), threads)
     return binArr
 
 
-cdef _encode(const unsigned char* binArr, Py_ssize_t length, unsigned char* buffer):
+cpdef Py_ssize_t EncodeInto(const unsigned char[::1] src, unsigned char[::1] dst, threads: int = None) except -1:
+    """
+    UUEncoding编码，结果写入调用者提供的缓存
+    :param src: 需要编码的数据，可以是任何支持buffer协议的对象
+    :param dst: 写入缓存，如bytearray或可写的memoryview，长度至少为EncodedLength(len(src))
+    :param threads: 编码线程数，缺省则根据数据量自动决定，小于1时按1处理
+    :return: 实际写入的字节数
+    """
+    cdef Py_ssize_t length = EncodedLength(src.shape[0])
+    if dst.shape[0] < length:
+        raise ValueError('Destination buffer is too small.')
+    if length:
+        _encodeParallel(src, &dst[0], threads)
+    return length
+
+
+cpdef Py_ssize_t DecodeInto(const unsigned char[::1] src, unsigned char[::1] dst, threads: int = None) except -1:
+    """
+    UUEncoding解码，结果写入调用者提供的缓存
+    :param src: 编码数据，可以是任何支持buffer协议的对象
+    :param dst: 写入缓存，如bytearray或可写的memoryview，长度至少为DecodedLength(len(src))
+    :param threads: 解码线程数，缺省则根据数据量自动决定，小于1时按1处理
+    :return: 实际写入的字节数
     """
-    对传入二进制串进行UUEncoding编码，结果（字符串）写入到buffer，结尾写入\0
+    cdef Py_ssize_t length = DecodedLength(src.shape[0])
+    if dst.shape[0] < length:
+        raise ValueError('Destination buffer is too small.')
+    if length:
+        _decodeParallel(src, &dst[0], threads)
+    return length
+
+
+cdef _encodeParallel(const unsigned char[::1] src, unsigned char* dst, threads):
+    """按3字节对齐切块并行编码，块数为1时直接在当前线程编码"""
+    cdef Py_ssize_t length = src.shape[0]
+    if length == 0:
+        return
+    threads = _defaultThreads(length) if threads is None else max(1, threads)   # 0和负数按单线程处理
+    cdef Py_ssize_t chunk_size = max(length // threads, MIN_CHUNK_SIZE if threads > 1 else 1)
+    chunk_size = (chunk_size + 2) // 3 * 3  # 对齐到3字节，保证每块的编码结果正好接在上一块之后
+    if chunk_size >= length:
+        with nogil:
+            _encode(&src[0], length, dst)
+        return
+    futures = [_getPool().submit(_encodeChunk, src, <size_t>dst, pos, min(pos + chunk_size, length))
+               for pos in range(0, length, chunk_size)]
+    for future in futures:
+        future.result()
+
+
+cdef _decodeParallel(const unsigned char[::1] src, unsigned char* dst, threads):
+    """按4字符对齐切块并行解码，块数为1时直接在当前线程解码"""
+    cdef Py_ssize_t length = src.shape[0]
+    if length == 0:
+        return
+    threads = _defaultThreads(length) if threads is None else max(1, threads)   # 0和负数按单线程处理
+    cdef Py_ssize_t chunk_size = max(length // threads, MIN_CHUNK_SIZE if threads > 1 else 1)
+    chunk_size = (chunk_size + 3) // 4 * 4  # 对齐到4字符，保证每块的解码结果正好接在上一块之后
+    if chunk_size >= length:
+        with nogil:
+            _decode(&src[0], length, dst)
+        return
+    futures = [_getPool().submit(_decodeChunk, src, <size_t>dst, pos, min(pos + chunk_size, length))
+               for pos in range(0, length, chunk_size)]
+    for future in futures:
+        future.result()
+
+
+def _encodeChunk(const unsigned char[::1] src, size_t dst, Py_ssize_t start, Py_ssize_t end):
+    """在线程池中编码一块数据，start必须是3的倍数"""
+    with nogil:
+        _encode(&src[start], end - start, <unsigned char*>dst + start // 3 * 4)
+
+
+def _decodeChunk(const unsigned char[::1] src, size_t dst, Py_ssize_t start, Py_ssize_t end):
+    """在线程池中解码一块数据，start必须是4的倍数"""
+    with nogil:
+        _decode(&src[start], end - start, <unsigned char*>dst + start // 4 * 3)
+
+
+cpdef EncodeTo(writer, const unsigned char[::1] binArr, Py_ssize_t lineLength = 80):
+    """
+    UUEncoding编码并按行长度折行，分块写入到writer，不生成完整的编码字串
+    :param writer: 任何具有write(str)方法的对象，如文本文件
+    :param binArr: 需要编码的数据，可以是任何支持buffer协议的对象，如bytes、bytearray、memoryview
+    :param lineLength: 每行的字符数，各行之间用'\n'分隔，最后一行末尾不加换行
+    :return: 写入的字符数
+    """
+    cdef Py_ssize_t length = binArr.shape[0]
+    cdef Py_ssize_t chunk_size = lineLength * 3 * ENCODE_CHUNK_LINES  # 每块编码为整4*ENCODE_CHUNK_LINES行
+    cdef Py_ssize_t pos = 0, size, code_length, i, j, written = 0
+    if length == 0:
+        return 0
+    if lineLength <= 0:
+        raise ValueError('lineLength must be positive.')
+
+    cdef unsigned char* code_buffer = <unsigned char*>malloc(chunk_size * 4 // 3 + 2)
+    cdef unsigned char* line_buffer = <unsigned char*>malloc(chunk_size * 4 // 3 * (lineLength + 1) // lineLength + 2)
+    try:
+        while pos < length:
+            size = min(chunk_size, length - pos)
+            with nogil:
+                code_length = _encode(&binArr[pos], size, code_buffer)
+                # 插入换行符，非第一块的开头需要补一个换行，接上上一块的最后一行
+                j = 0
+                if pos > 0:
+                    line_buffer[j] = b'\n'
+                    j += 1
+                for i in range(code_length):
+                    if i > 0 and i % lineLength == 0:
+                        line_buffer[j] = b'\n'
+                        j += 1
+                    line_buffer[j] = code_buffer[i]
+                    j += 1
+            writer.write(line_buffer[:j].decode('ascii'))
+            written += j
+            pos += size
+    finally:
+        free(code_buffer)
+        free(line_buffer)
+    return written
+
+
+cdef Py_ssize_t _encode(const unsigned char* binArr, Py_ssize_t length, unsigned char* buffer) noexcept nogil:
+    """
+    对传入二进制串进行UUEncoding编码，结果（字符串）写入到buffer
     :param binArr: 需要编码的二进制值数组
     :param length: binArr的长度
-    :param buffer: 编码结果（字符串）的写入缓存，长度需要至少是binArr长度的4/3+1
+    :param buffer: 编码结果（字符串）的写入缓存，长度需要至少是EncodedLength(length)
     :return: 实际写入buffer的长度
     """
-    cdef int i = 0, j = 0, k = 0
+    cdef Py_ssize_t i = 0, j = 0
     while i < length:
-        buffer[j] = binArr[i] >> 2
+        buffer[j] = (binArr[i] >> 2) + 33
         if length - i == 1:
-            buffer[j + 1] = (binArr[i] & 0b00000011) << 4
+            buffer[j + 1] = ((binArr[i] & 0b00000011) << 4) + 33
             j += 2
         elif length - i == 2:
-            buffer[j + 1] = ((binArr[i] & 0b00000011) << 4) | (binArr[i + 1] >> 4)
-            buffer[j + 2] = (binArr[i + 1] & 0b00001111) << 2
+            buffer[j + 1] = (((binArr[i] & 0b00000011) << 4) | (binArr[i + 1] >> 4)) + 33
+            buffer[j + 2] = ((binArr[i + 1] & 0b00001111) << 2) + 33
             j += 3
         else:
-            buffer[j + 1] = ((binArr[i] & 0b00000011) << 4) | binArr[i + 1] >> 4
-            buffer[j + 2] = ((binArr[i + 1] & 0b00001111) << 2) | (binArr[i + 2] >> 6)
-            buffer[j + 3] = binArr[i + 2] & 0b00111111
+            buffer[j + 1] = (((binArr[i] & 0b00000011) << 4) | binArr[i + 1] >> 4) + 33
+            buffer[j + 2] = (((binArr[i + 1] & 0b00001111) << 2) | (binArr[i + 2] >> 6)) + 33
+            buffer[j + 3] = (binArr[i + 2] & 0b00111111) + 33
             j += 4
         i += 3
-
-    while k < j:
-        buffer[k] += 33
-        k += 1
-
-    buffer[k] = '\0'
-    return k
+    return j
 
 
-cdef _decode(const unsigned char* chars, Py_ssize_t length, unsigned char* buffer):
+cdef Py_ssize_t _decode(const unsigned char* chars, Py_ssize_t length, unsigned char* buffer) noexcept nogil:
     """
     对传入字符串进行UUEncoding解码，结果（二进制串）写入到buffer
     :param chars: 需要解码的字符串
     :param length: chars的长度
-    :param buffer: 解码结果（二进制串）的写入缓存，长度需要至少是binArr长度的3/4
+    :param buffer: 解码结果（二进制串）的写入缓存，长度需要至少是DecodedLength(length)
     :return: 实际写入buffer的长度
     """
-    cdef int i = 0, k = 0
-    cdef unsigned char char_0, char_1, char_2, char_3
-    while i < length:   # 注意：合法的UUEncoding字串在最后一小节只可能有2、3、4字节，不可能只有1字节
+    cdef Py_ssize_t i = 0, k = 0
+    cdef unsigned char char_0, char_1, char_2 = 0, char_3
+    while i < length - 1:   # 注意：合法的UUEncoding字串在最后一小节只可能有2、3、4字节，不可能只有1字节
         char_0 = chars[i] - 33
         char_1 = chars[i + 1] - 33
         buffer[k] = (char_0 << 2) | char_1 >> 4
@@ -0,0 +1,59 @@
+"""
+为字体库生成二进制字体索引文件. 字体库只需解析一次，索引文件分发到各处后用FontManager(index=路径)直接载入.
+用法：python -m tools.BuildFontIndex 字体目录... -o 索引.sfmi [--relative] [--workers N]
+"""
+
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from font import FontInfo, FontManager, FontIndexFile
+
+
+def findFontFiles(roots: list[str]) -> list[str]:
+    """递归查找目录下所有字体文件，按路径排序，使相同的字体库总是生成相同的索引"""
+    paths = []
+    for root in roots:
+        if os.path.isfile(root):
+            paths.append(os.path.abspath(root))
+            continue
+        for dir_path, _, file_names in os.walk(root):
+            paths.extend(os.path.abspath(os.path.join(dir_path, name)) for name in file_names
+                         if os.path.splitext(name)[1].lower() in FontManager.SOURCE_EXTS)
+    return sorted(set(paths))
+
+
+def buildIndex(roots: list[str], outPath: str, relative: bool = False, workers: int = None) -> int:
+    """
+    多进程解析字体文件并写出索引
+    :return: 写入的字体数
+    """
+    paths = findFontFiles(roots)
+    fonts: list[FontInfo] = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunk_size = max(1, len(paths) // ((workers or os.cpu_count() or 1) * 8))
+        for path, file_fonts in zip(paths, pool.map(FontInfo.createFromFile, paths, chunksize=chunk_size)):
+            if file_fonts:
+                fonts.extend(file_fonts)
+            else:
+                print(f"Warning: Unable to read font info: {path}, font ignored.")
+    FontIndexFile.write(outPath, fonts, relative)
+    return len(fonts)
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m tools.BuildFontIndex')
+    parser.add_argument('roots', nargs='+', help='font directories or files, directories are scanned recursively')
+    parser.add_argument('-o', '--output', required=True, help='index file to write')
+    parser.add_argument('--relative', action='store_true',
+                        help='store font paths relative to the index file, for libraries shipped together with it')
+    parser.add_argument('--workers', type=int, help='number of parser processes, defaults to the CPU count')
+    args = parser.parse_args(argv)
+
+    count = buildIndex(args.roots, args.output, args.relative, args.workers)
+    print(f'{count} fonts written to {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
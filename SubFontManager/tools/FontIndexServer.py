@@ -0,0 +1,187 @@
+"""
+字体索引服务. 常驻后台，缓存各字幕目录的本地字体索引和解析过的系统字体，通过本机TCP端口为所有SubFontManager进程
+提供字体匹配. 用环境变量SFM_FONT_INDEX_PORT或配置项font_index_port指定端口后，FontManager检测到服务运行时使用它，
+否则照常在进程内匹配.
+服务定时检查已索引的目录和系统字体目录，字体文件有增删改时丢弃对应的缓存，下次查询时重新索引.
+协议：每个请求和应答都是一行json.
+    {"op": "ping"} -> {"ok": true, "version": 2}
+    {"op": "match", "name": 字体名, "bold": bool, "italic": bool, "scope": 搜索范围, "dir": 本地目录或null, "text": 字符}
+        -> {"ok": true, "font": [字体文件路径, 序号, 字体包路径, 包内成员名] 或 null}，不在字体包内的字体后两项为空
+    出错时 -> {"ok": false, "error": 错误信息}
+用法：python -m tools.FontIndexServer [--port 端口] [--interval 检查间隔秒数]
+"""
+
+import os
+import sys
+import json
+import argparse
+import threading
+import socketserver
+from font import FontManager
+from font.FontIndexClient import FontIndexClient
+from utils.App import App
+
+PROTOCOL_VERSION = FontIndexClient.PROTOCOL_VERSION    # 协议版本
+WATCH_INTERVAL = 5      # 缺省的目录检查间隔，秒
+
+
+def systemFontDirs() -> list[str]:
+    """当前系统的字体目录"""
+    if App.isWindows:
+        dirs = [os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts')]
+        if os.environ.get('LOCALAPPDATA'):
+            dirs.append(os.path.join(os.environ['LOCALAPPDATA'], 'Microsoft', 'Windows', 'Fonts'))
+    else:
+        dirs = ['/System/Library/Fonts', '/Library/Fonts', os.path.expanduser('~/Library/Fonts')]
+    return [d for d in dirs if os.path.isdir(d)]
+
+
+def dirSignature(path: str) -> tuple | None:
+    """
+    目录内（包括查找范围内的子目录）字体文件的签名，由各字体文件的路径、大小和修改时间组成，任一字体文件变化时签名随之变化
+    :return: 签名，目录不存在则返回None
+    """
+    if not os.path.isdir(path):
+        return None
+    signature = []
+    for font_path in FontManager.findFontFiles(path):   # 目录列表有缓存，只有变化的目录才会重新列出
+        try:
+            stat = os.stat(font_path)
+        except OSError:
+            continue
+        signature.append((font_path, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+class IndexedFontManager(FontManager):
+    """服务内部使用的字体管理类，不再转发给服务，并共享解析过的系统字体"""
+    useIndexService = False
+
+    def __init__(self, server: 'FontIndexServer', path: str = None):
+        self._server = server
+        super().__init__(path=path)
+
+    def _systemFontManager(self, path: str) -> FontManager:
+        return self._server.systemFontManager(path)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """处理一个客户端连接，连接保持到客户端关闭"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.dispatch(json.loads(line))
+            except Exception as e:  # 任何错误都返回给客户端，不能让服务退出
+                response = {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class FontIndexServer(socketserver.ThreadingTCPServer):
+    """字体索引服务，每个客户端连接一个线程，索引缓存在线程间共享"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port: int = FontIndexClient.DEFAULT_PORT, interval: float = WATCH_INTERVAL):
+        super().__init__((FontIndexClient.HOST, port), _RequestHandler)
+        self.interval = interval
+        self._managers: dict[str, FontManager] = {}     # 各本地目录的字体管理对象 {目录: 对象}
+        self._systemManagers: dict[str, FontManager] = {}   # 解析过的系统字体文件 {路径: 对象}
+        self._signatures: dict[str, tuple | None] = {}  # 已索引目录的签名 {目录: 签名}
+        self._systemSignatures = {d: dirSignature(d) for d in systemFontDirs()}   # 系统字体目录的签名
+        self._lock = threading.Lock()
+        self._stopEvent = threading.Event()
+        self._watcher = threading.Thread(target=self._watch, daemon=True)
+
+    def localFontManager(self, path: str | None) -> FontManager:
+        """获取目录的字体管理对象，没有索引过则现在索引. path为None时返回只用于系统字体的对象"""
+        key = os.path.normcase(os.path.abspath(path)) if path else ''
+        with self._lock:
+            manager = self._managers.get(key)
+        if manager is None:     # 在锁外索引，不阻塞其他目录的查询
+            signature = dirSignature(path) if path else None
+            manager = IndexedFontManager(self, path)
+            with self._lock:
+                manager = self._managers.setdefault(key, manager)
+                if path:
+                    self._signatures.setdefault(key, signature)
+        return manager
+
+    def systemFontManager(self, path: str) -> FontManager:
+        """获取系统字体文件的字体管理对象，解析结果缓存到系统字体目录变化为止"""
+        with self._lock:
+            manager = self._systemManagers.get(path)
+        if manager is None:
+            manager = IndexedFontManager(self, path)
+            with self._lock:
+                manager = self._systemManagers.setdefault(path, manager)
+        return manager
+
+    def dispatch(self, request: dict) -> dict:
+        """执行一个请求，返回应答"""
+        match request.get('op'):
+            case 'ping':
+                return {'ok': True, 'version': PROTOCOL_VERSION}
+            case 'match':
+                scope = request.get('scope') or FontManager.LOCAL | FontManager.SYSTEM
+                manager = self.localFontManager(request.get('dir') if scope & FontManager.LOCAL else None)
+                font = manager.match(request['name'], bool(request.get('bold')), bool(request.get('italic')),
+                                     scope & (FontManager.LOCAL | FontManager.SYSTEM), set(request.get('text') or ''))
+                return {'ok': True,
+                        'font': [font.path, font.index, font.archive, font.member] if font else None}
+            case op:
+                return {'ok': False, 'error': f'Unknown operation: {op}'}
+
+    def _watch(self):
+        """定时检查已索引的目录和系统字体目录，有变化则丢弃对应的缓存"""
+        while not self._stopEvent.wait(self.interval):
+            with self._lock:
+                signatures = dict(self._signatures)
+            for key, signature in signatures.items():
+                if dirSignature(key) != signature:
+                    with self._lock:
+                        self._managers.pop(key, None)
+                        self._signatures.pop(key, None)
+                    print('Font directory changed:', key)
+            system_signatures = {d: dirSignature(d) for d in systemFontDirs()}
+            if system_signatures != self._systemSignatures:
+                self._systemSignatures = system_signatures
+                with self._lock:
+                    self._systemManagers.clear()
+                print('System fonts changed.')
+
+    def serve_forever(self, poll_interval: float = 0.5):
+        self._watcher.start()
+        try:
+            super().serve_forever(poll_interval)
+        finally:
+            self._stopEvent.set()
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m tools.FontIndexServer')
+    parser.add_argument('--port', type=int, default=FontIndexClient.port() or FontIndexClient.DEFAULT_PORT,
+                        help='localhost port to listen on')
+    parser.add_argument('--interval', type=float, default=WATCH_INTERVAL, help='seconds between font directory checks')
+    args = parser.parse_args(argv)
+
+    try:
+        server = FontIndexServer(args.port, args.interval)
+    except OSError as e:
+        print(f'Unable to listen on port {args.port}: {e}', file=sys.stderr)
+        return 1
+    print(f'Font index service listening on {FontIndexClient.HOST}:{args.port}')
+    if FontIndexClient.port() != args.port:
+        print(f'Set SFM_FONT_INDEX_PORT={args.port} or font_index_port = {args.port} in the [General] section of '
+              f'the config file so that SubFontManager uses this service.')
+    with server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
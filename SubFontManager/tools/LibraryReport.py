@@ -0,0 +1,300 @@
+"""
+字幕库字体使用报告. 递归扫描目录下所有字幕，多进程分析每个字幕引用的字体和文字，
+结果按 (路径, 大小, 修改时间, 内容哈希) 缓存，再次运行时只重新分析有变化的文件.
+最后汇总整个库需要的字体，以及每个字体的来源（内嵌/本地/系统）和缺失情况. 各字幕目录的本地字体匹配结果
+按目录内字体文件的签名（路径、大小、修改时间）缓存，字体文件没有变化的目录不必再解析字体.
+用法：python -m tools.LibraryReport 字幕目录 [-o 报告.json] [--cache 缓存.json] [--workers N]
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from font import Font, FontManager
+from sub import SubStationAlpha, FontDict
+
+SUB_EXTS = ('.ass', '.ssa')     # 字幕文件后缀名
+CACHE_NAME = '.subfontmanager-cache.json'   # 缺省缓存文件名，保存在扫描目录下
+CACHE_VERSION = 1   # 缓存格式版本，格式变化时旧缓存作废
+HASH_BLOCK_SIZE = 1 << 20   # 计算内容哈希时每次读取的字节数
+
+# 字体来源 -----
+EMBED = 'embed'
+LOCAL = 'local'
+SYSTEM = 'system'
+MISSING = 'missing'
+
+_section_ptn = re.compile(rb'^\[.*]')   # 匹配中括号行[...]
+
+
+def fileHash(path: str) -> str:
+    """文件内容哈希"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as file:
+        while block := file.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def findSubtitles(root: str) -> list[str]:
+    """递归查找目录下所有字幕文件"""
+    paths = []
+    for dir_path, _, file_names in os.walk(root):
+        paths.extend(os.path.join(dir_path, name) for name in file_names if name.lower().endswith(SUB_EXTS))
+    return sorted(paths)
+
+
+def fontSignature(directory: str) -> list[list]:
+    """目录内字体文件的签名 [[路径, 大小, 修改时间]]，字体文件有增删改时签名随之变化"""
+    signature = []
+    for path in FontManager.findFontFiles(directory):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        signature.append([path, stat.st_size, stat.st_mtime_ns])
+    return signature
+
+
+def readEmbeddedFonts(path: str) -> list[Font]:
+    """只读取字幕[Fonts]段中的内嵌字体，其他段直接跳过"""
+    font_dict = FontDict()
+    in_fonts = False
+    continuous = False  # [Fonts]为连贯段，空行之后才可能出现新的段
+    with open(path, 'rb') as file:
+        for line in file:
+            content = line.rstrip(b'\r\n').lstrip(b'\xef\xbb\xbf')
+            if not continuous and _section_ptn.match(content):
+                in_fonts = content.lower() == b'[fonts]'
+                continue
+            if in_fonts:
+                continuous = font_dict.append(content.decode('ascii', errors='replace'))
+    font_dict.append('')    # 结束最后一个字体
+    if not font_dict:
+        return []
+    return FontManager(embedFonts=font_dict).getAll(FontManager.EMBED)
+
+
+def analyzeFile(path: str) -> dict:
+    """
+    分析单个字幕，在子进程中运行
+    :return: {'fonts': [{'name', 'bold', 'italic', 'chars', 'embedded'}]}，出错则为{'error': 错误信息}
+    """
+    try:
+        font_descs = SubStationAlpha.analyze(path)
+        embed_fonts = readEmbeddedFonts(path)
+    except Exception as e:
+        return {'error': str(e)}
+    return {'fonts': [{
+        'name': desc.fontName,
+        'bold': desc.bold,
+        'italic': desc.italic,
+        'chars': ''.join(sorted(desc.text)),
+        # 内嵌字体只在本字幕内有效，所以在分析时就确定，本地和系统字体则在汇总时再匹配
+        'embedded': bool(embed_fonts and FontManager._matchInFonts(embed_fonts, desc.fontName, desc.bold,
+                                                                   desc.italic, desc.text)),
+    } for desc in font_descs]}
+
+
+def _analyzeWithHash(path: str) -> tuple[str, dict]:
+    """子进程任务：计算文件内容哈希并分析文件，返回(哈希, 分析结果)"""
+    return fileHash(path), analyzeFile(path)
+
+
+class LibraryScanner:
+    """带缓存的字幕库扫描器"""
+
+    def __init__(self, root: str, cachePath: str = None, workers: int = None):
+        """
+        :param root: 字幕库根目录
+        :param cachePath: 缓存文件路径，缺省为根目录下的CACHE_NAME
+        :param workers: 分析进程数，缺省为CPU核数
+        """
+        self.root = os.path.abspath(root)
+        self.cachePath = cachePath or os.path.join(self.root, CACHE_NAME)
+        self.workers = workers
+        self.cache: dict[str, dict] = {}    # {路径: {'size', 'mtime', 'hash', 'result'}}
+        self.directories: dict[str, dict] = {}  # 本地字体匹配缓存，见resolveLibrary
+        self.stats = {'files': 0, 'cached': 0, 'analyzed': 0, 'errors': 0}
+        self._loadCache()
+
+    def _loadCache(self):
+        """读取缓存文件，版本不符或损坏则忽略"""
+        try:
+            with open(self.cachePath, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            if data.get('version') == CACHE_VERSION:
+                self.cache = data.get('files', {})
+                self.directories = data.get('directories', {})
+        except (OSError, ValueError):
+            self.cache = {}
+            self.directories = {}
+
+    def saveCache(self):
+        """写入缓存文件，先写临时文件再替换，避免中断时损坏缓存"""
+        temp_path = self.cachePath + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'version': CACHE_VERSION, 'files': self.cache, 'directories': self.directories}, file,
+                      ensure_ascii=False)
+        os.replace(temp_path, self.cachePath)
+
+    def scan(self) -> dict[str, dict]:
+        """
+        扫描字幕库，只分析新增和变化的文件
+        :return: {路径: 分析结果}
+        """
+        paths = findSubtitles(self.root)
+        results: dict[str, dict] = {}
+        to_analyze: list[tuple[str, os.stat_result]] = []
+        for path in paths:
+            stat = os.stat(path)
+            entry = self.cache.get(path)
+            if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+                results[path] = entry['result']     # 大小和修改时间都没变，直接使用缓存
+            elif entry and entry['size'] == stat.st_size and entry['hash'] == fileHash(path):
+                entry['mtime'] = stat.st_mtime_ns   # 只是修改时间变了，内容没变，更新时间后使用缓存
+                results[path] = entry['result']
+            else:
+                to_analyze.append((path, stat))
+        self.stats['files'] = len(paths)
+        self.stats['cached'] = len(results)
+        self.stats['analyzed'] = len(to_analyze)
+
+        if to_analyze:  # 多进程分析变化的文件
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                chunk_size = max(1, len(to_analyze) // ((self.workers or os.cpu_count() or 1) * 8))
+                analyzed = pool.map(_analyzeWithHash, [path for path, _ in to_analyze], chunksize=chunk_size)
+                for (path, stat), (file_hash, result) in zip(to_analyze, analyzed):
+                    results[path] = result
+                    self.cache[path] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+                                        'hash': file_hash, 'result': result}
+
+        # 删除已经不存在的文件的缓存
+        for path in set(self.cache) - set(paths):
+            self.cache.pop(path)
+        self.stats['errors'] = sum(1 for r in results.values() if 'error' in r)
+        return results
+
+
+def resolveLibrary(results: dict[str, dict], useSystem: bool = True, directories: dict[str, dict] = None,
+                   stats: dict = None) -> dict:
+    """
+    汇总所有字幕的分析结果，并为非内嵌字体匹配本地和系统来源
+    :param results: LibraryScanner.scan的结果
+    :param useSystem: 是否在系统字体中匹配
+    :param directories: 本地字体匹配缓存 {目录: {'signature': 字体文件签名, 'local': {"名字|粗体|斜体": 是否找到}}}，
+                        签名没变的目录直接使用缓存的匹配结果，不解析字体. 函数会更新它，缺省不跨次缓存
+    :param stats: 统计字典，写入解析了字体的目录数 'fontDirsParsed'
+    :return: 报告字典，{'fonts': [...], 'missing': [...], 'errors': {...}}
+    """
+    if directories is None:
+        directories = {}
+    local_managers: dict[str, FontManager | None] = {}  # 按字幕目录缓存的本地字体管理器
+    checked_dirs: set[str] = set()  # 本次已核对签名的目录
+    system_manager = FontManager()  # 只用于系统字体匹配
+    system_cache: dict[tuple[str, bool, bool], str | None] = {}  # 系统匹配结果缓存
+    fonts: dict[tuple[str, bool, bool], dict] = {}  # 汇总结果，按 (小写名字, 粗体, 斜体) 索引
+
+    def localManager(directory: str) -> FontManager | None:
+        """获取目录的本地字体管理器，目录中没有字体文件则为None"""
+        if directory not in local_managers:
+            has_fonts = bool(directories[directory]['signature'])
+            local_managers[directory] = FontManager(path=directory) if has_fonts else None
+        return local_managers[directory]
+
+    def matchLocal(directory: str, name: str, bold: bool, italic: bool) -> bool:
+        """字体是否在目录的本地字体中，字体文件没有变化时使用缓存的结果"""
+        if directory not in checked_dirs:
+            checked_dirs.add(directory)
+            signature = fontSignature(directory)
+            entry = directories.get(directory)
+            if not entry or entry['signature'] != signature:    # 新目录或字体文件有变化，匹配结果作废
+                directories[directory] = {'signature': signature, 'local': {}}
+        matches = directories[directory]['local']
+        match_key = f'{name.lower()}|{int(bold)}|{int(italic)}'
+        if match_key not in matches:
+            manager = localManager(directory)
+            matches[match_key] = bool(manager and manager.match(name, bold, italic, FontManager.LOCAL))
+        return matches[match_key]
+
+    for path, result in results.items():
+        for font_info in result.get('fonts', []):
+            key = (font_info['name'].lower(), font_info['bold'], font_info['italic'])
+            entry = fonts.setdefault(key, {
+                'name': font_info['name'], 'bold': font_info['bold'], 'italic': font_info['italic'],
+                'subtitles': 0, 'chars': set(), 'sources': {EMBED: 0, LOCAL: 0, SYSTEM: 0, MISSING: 0},
+                'systemPath': None, 'missingIn': [],
+            })
+            entry['subtitles'] += 1
+            entry['chars'].update(font_info['chars'])
+
+            # 按内嵌、本地、系统的顺序确定来源，与FontManager.match的顺序一致 -----
+            source = MISSING
+            if font_info['embedded']:
+                source = EMBED
+            else:
+                if matchLocal(os.path.dirname(path), font_info['name'], font_info['bold'], font_info['italic']):
+                    source = LOCAL
+                elif useSystem:
+                    if key not in system_cache:
+                        font = system_manager.match(font_info['name'], font_info['bold'], font_info['italic'],
+                                                    FontManager.SYSTEM)
+                        system_cache[key] = font.path if font else None
+                    if system_cache[key]:
+                        source = SYSTEM
+                        entry['systemPath'] = system_cache[key]
+            entry['sources'][source] += 1
+            if source == MISSING:
+                entry['missingIn'].append(path)
+
+    for directory in set(directories) - {os.path.dirname(path) for path in results}:   # 不再有字幕的目录
+        directories.pop(directory)
+    if stats is not None:
+        stats['fontDirsParsed'] = sum(1 for manager in local_managers.values() if manager)
+
+    font_list = sorted(fonts.values(), key=lambda f: (-f['subtitles'], f['name'].lower()))
+    for entry in font_list:
+        entry['chars'] = len(entry['chars'])
+    return {
+        'fonts': font_list,
+        'missing': [f['name'] + (' Bold' if f['bold'] else '') + (' Italic' if f['italic'] else '')
+                    for f in font_list if f['sources'][MISSING]],
+        'errors': {path: result['error'] for path, result in results.items() if 'error' in result},
+    }
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog='python -m tools.LibraryReport')
+    parser.add_argument('root', help='subtitle library directory, scanned recursively')
+    parser.add_argument('-o', '--output', help='write the report as JSON to this file')
+    parser.add_argument('--cache', help=f'cache file, defaults to {CACHE_NAME} in the library directory')
+    parser.add_argument('--workers', type=int, help='number of analyzer processes, defaults to the CPU count')
+    parser.add_argument('--no-system', action='store_true', help='do not match system fonts')
+    args = parser.parse_args(argv)
+
+    scanner = LibraryScanner(args.root, args.cache, args.workers)
+    results = scanner.scan()
+    report = resolveLibrary(results, not args.no_system, scanner.directories, scanner.stats)
+    scanner.saveCache()
+    report['stats'] = scanner.stats
+
+    print(f"{scanner.stats['files']} subtitles, {scanner.stats['cached']} cached, "
+          f"{scanner.stats['analyzed']} analyzed, {scanner.stats['errors']} errors, "
+          f"{scanner.stats['fontDirsParsed']} font directories parsed")
+    print(f"{'font':<40} {'subs':>6} {'chars':>6} {'embed':>6} {'local':>6} {'system':>6} {'missing':>7}")
+    for f in report['fonts']:
+        name = f['name'] + (' Bold' if f['bold'] else '') + (' Italic' if f['italic'] else '')
+        s = f['sources']
+        print(f"{name[:40]:<40} {f['subtitles']:>6} {f['chars']:>6} {s[EMBED]:>6} {s[LOCAL]:>6} "
+              f"{s[SYSTEM]:>6} {s[MISSING]:>7}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    return 1 if report['missing'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1 @@
+"""命令行工具，需在SubFontManager目录下以 python -m tools.<模块名> 的方式运行"""
@@ -1,38 +1,35 @@
 import os
+import re
+import json
 from .App import App
 
 
 class LanguageDict:
     """多语言字典"""
     ENGLISH = 'English'
+    _name_ptn = re.compile(r'"name"\s*:\s*("(?:[^"\\]|\\.)*")')   # 匹配语言文件开头的"name": "..."项
+    NAME_PEEK_SIZE = 4096   # 读取语言名时只读取文件开头的这么多字节
 
     def __init__(self, langDir: str = None):
         self.name: str = '' # 语言名，如English，简体中文
         self.dict: dict[str, str] = {}  # 语言翻译字典
-        self.allLangs: dict[str, str] = {self.ENGLISH: ''}  # 语言目录下所有的语言名和文件名映射
+        self._allLangs: dict[str, str] | None = None    # 语言目录下所有的语言名和文件名映射，首次访问时才扫描
 
-        lang_dir: str = langDir if langDir else os.path.join(App.getResourcesDirectory(), 'lang')   # 语言文件目录
+        self._langDir: str = langDir if langDir else os.path.join(App.getResourcesDirectory(), 'lang')   # 语言文件目录
         lang_file: str = App.Config.get('General', 'lang', App.lang).lower()    # 语言文件名，缺省使用系统界面语言
 
-        if os.path.exists(lang_dir):
-            for filename_ext in next(os.walk(lang_dir))[2]: # 遍历目录内所有文件
-                filename, ext = os.path.splitext(filename_ext)
-                if ext.lower() != '.json':  # 跳过非json文件
-                    continue
-                lang_path = os.path.join(lang_dir, filename_ext)
-                try:
-                    with open(lang_path, 'r', encoding='utf-8') as file:
-                        file_str = file.read()
-                    lang_dict = eval(file_str)  # 对简单的文本键值json，直接用eval执行
-                    lang_name = lang_dict.get('name')   # 语言名
-                    if lang_name is None:   # 不包含语言名，不是合法的语言文件
-                        continue
-                    self.allLangs[lang_name] = filename
-                    if filename.lower() == lang_file:   # 找到当前配置的语言文件
-                        self.name = lang_name
-                        self.dict = lang_dict.get('dict', {})
-                except Exception:
-                    print(f'Warning: 语言文件 {lang_path} 错误，已忽略.')
+        # 只完整载入当前配置的语言文件，其他语言文件要到设置窗口中列出语言时才读取 -----
+        lang_path = self._findLangFile(lang_file) if lang_file else None
+        if lang_path:
+            try:
+                with open(lang_path, 'r', encoding='utf-8') as file:
+                    lang_dict = json.load(file)
+                lang_name = lang_dict.get('name')   # 语言名
+                if lang_name is not None:   # 不包含语言名，不是合法的语言文件
+                    self.name = lang_name
+                    self.dict = lang_dict.get('dict', {})
+            except Exception:
+                print(f'Warning: 语言文件 {lang_path} 错误，已忽略.')
 
         if not self.name:   # 如果没找到当前配置的语言文件，则退回到英语
             self.name = self.ENGLISH
@@ -40,6 +37,43 @@ class LanguageDict:
 
         self.nameInConfig = self.name   # 配置文件中已经保存的语言，此值为语言名，但其实ini里存的是文件名
 
+    def _langFiles(self) -> list[tuple[str, str]]:
+        """语言目录下所有的json文件，返回[(无后缀文件名, 路径)]"""
+        if not os.path.exists(self._langDir):
+            return []
+        return [(os.path.splitext(filename_ext)[0], os.path.join(self._langDir, filename_ext))
+                for filename_ext in next(os.walk(self._langDir))[2]
+                if os.path.splitext(filename_ext)[1].lower() == '.json']   # 跳过非json文件
+
+    def _findLangFile(self, langFile: str) -> str | None:
+        """按文件名（不区分大小写）查找语言文件路径"""
+        return next((path for filename, path in self._langFiles() if filename.lower() == langFile), None)
+
+    @classmethod
+    def _readLangName(cls, path: str) -> str | None:
+        """只读取语言文件中的语言名，不解析整个翻译字典"""
+        with open(path, 'r', encoding='utf-8') as file:
+            head = file.read(cls.NAME_PEEK_SIZE)
+            match_obj = cls._name_ptn.search(head)
+            if match_obj:
+                return json.loads(match_obj.group(1))
+            lang_dict = json.loads(head + file.read())  # 语言名不在文件开头，只好完整解析
+        return lang_dict.get('name')
+
+    @property
+    def allLangs(self) -> dict[str, str]:
+        """语言目录下所有的语言名和文件名映射，如{'English': '', '简体中文': 'zh_cn'}"""
+        if self._allLangs is None:
+            self._allLangs = {self.ENGLISH: ''}
+            for filename, lang_path in self._langFiles():
+                try:
+                    lang_name = self._readLangName(lang_path)
+                    if lang_name is not None:   # 不包含语言名，不是合法的语言文件
+                        self._allLangs[lang_name] = filename
+                except Exception:
+                    print(f'Warning: 语言文件 {lang_path} 错误，已忽略.')
+        return self._allLangs
+
     def __getitem__(self, key) -> str:
         return self.dict.get(key, key)
 
@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import nullcontext
+from functools import wraps
+from .App import App
+
+
+class _Span:
+    """一个计时区间，用with语句包围被计时的代码"""
+
+    __slots__ = ('name', 'args', 'stage', 'start', 'memory')
+
+    def __init__(self, name: str, args: dict, stage: bool = False):
+        self.name = name
+        self.args = args
+        self.stage = stage  # 是否流程阶段，内存分析只在阶段边界上进行
+        self.start = 0
+        self.memory = None  # 内存分析状态，[起始快照, 起始内存, 区间内峰值]
+
+    def __enter__(self):
+        depth = getattr(Trace._local, 'depth', 0)
+        Trace._local.depth = depth + 1
+        if Trace.memoryEnabled and (self.stage or depth == 0) \
+                and threading.current_thread() is threading.main_thread():
+            self.memory = Trace._memoryEnter()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        Trace._local.depth -= 1
+        if self.memory:
+            Trace._memoryExit(self.name, self.memory, Trace._local.depth)
+        Trace._record(self.name, self.start, end, Trace._local.depth, self.args)
+        return False
+
+
+class Trace:
+    """
+    分阶段计时工具，输出Chrome Trace格式（chrome://tracing 和 Perfetto均可打开）的json文件.
+    通过环境变量SFM_TRACE或配置文件[General]中的trace项开启，值为输出文件路径，为1时输出到临时目录.
+    未开启时，traced装饰器直接返回原函数，span返回共享的空上下文，几乎没有开销.
+    主线程上最外层的区间视为一次操作，其内部各区间的耗时按名称汇总为分阶段统计，供状态栏显示.
+    内存分析模式通过环境变量SFM_MEMPROFILE或配置项memprofile开启，取值规则同上. 开启后用tracemalloc在
+    操作和各流程阶段（stage=True的区间）的边界上拍快照，按阶段输出峰值内存和主要分配位置的json.
+    """
+
+    @staticmethod
+    def _outputSetting(envName: str, configKey: str, defaultName: str) -> str:
+        """读取输出设置，返回输出文件路径，未开启则返回空字串"""
+        setting = os.environ.get(envName) or App.Config.get('General', configKey, '', saveDefault=False)
+        if setting.lower() in ('', '0', 'false'):
+            return ''
+        import tempfile
+        return os.path.join(tempfile.gettempdir(), defaultName) if setting.lower() in ('1', 'true') else setting
+
+    memoryPath: str = _outputSetting('SFM_MEMPROFILE', 'memprofile', 'SubFontManager-memory.json')  # 内存分析输出路径
+    memoryEnabled: bool = bool(memoryPath)  # 是否开启内存分析
+    outputPath: str = _outputSetting('SFM_TRACE', 'trace', 'SubFontManager-trace.json')  # 计时输出路径
+    enabled: bool = bool(outputPath) or memoryEnabled   # 是否开启计时，内存分析依赖计时区间，所以也会开启
+    TOP_SITES = 10      # 每个阶段报告的主要分配位置数
+    TRACE_FRAMES = 5    # tracemalloc记录的调用栈深度
+
+    _origin = time.perf_counter_ns()    # 时间起点，事件时间戳都相对于这个时间
+    _pid = os.getpid()
+    _events: list[dict] = []    # 所有已记录的事件
+    _lock = threading.Lock()    # 子线程中也会记录事件
+    _local = threading.local()  # 各线程的区间嵌套深度
+    _stages: dict[str, list[int]] = {}  # 当前操作中各阶段的 {名称: [总耗时ns, 次数]}
+    lastOperation: tuple[str, int, dict[str, list[int]]] | None = None  # 上一次操作的 (名称, 总耗时ns, 分阶段统计)
+    _nullSpan = nullcontext()   # 未开启时span返回的空上下文
+    _memoryStages: dict[str, list[dict]] = {}   # 各阶段的内存分析结果 {阶段名: [每次运行的结果]}
+
+    if memoryEnabled:
+        tracemalloc.start(TRACE_FRAMES)
+
+    @classmethod
+    def span(cls, name: str, stage: bool = False, **args):
+        """
+        创建计时区间，用法：with Trace.span('name'): ...
+        :param name: 区间名称
+        :param stage: 是否流程阶段，内存分析模式下会在阶段边界上拍快照
+        :param args: 附加信息，会写入事件的args中
+        """
+        return _Span(name, args, stage) if cls.enabled else cls._nullSpan
+
+    @classmethod
+    def traced(cls, name: str = None, stage: bool = False):
+        """
+        函数计时装饰器，未开启时直接返回原函数
+        :param name: 区间名称，缺省为函数的__qualname__
+        :param stage: 是否流程阶段，内存分析模式下会在阶段边界上拍快照
+        """
+        def decorator(func):
+            if not cls.enabled:
+                return func
+            span_name = name or func.__qualname__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with _Span(span_name, {}, stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @classmethod
+    def _memoryEnter(cls) -> list:
+        """进入阶段时拍快照，并开始统计本阶段的峰值"""
+        stack = cls._local.__dict__.setdefault('memory', [])
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:   # 外层阶段的峰值要先结算，因为下面要重置峰值
+            stack[-1][2] = max(stack[-1][2], peak)
+        snapshot = tracemalloc.take_snapshot()
+        current = tracemalloc.get_traced_memory()[0]    # 快照本身也会占用内存，重新取
+        tracemalloc.reset_peak()
+        state = [snapshot, current, current]
+        stack.append(state)
+        return state
+
+    @classmethod
+    def _memoryExit(cls, name: str, state: list, depth: int):
+        """离开阶段时拍快照，记录本阶段的峰值内存和分配最多的位置"""
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(state[2], peak)
+        stack = cls._local.memory
+        stack.pop()
+        if stack:   # 子阶段的峰值同样是外层阶段的峰值
+            stack[-1][2] = max(stack[-1][2], peak)
+        snapshot = tracemalloc.take_snapshot()
+        ignore = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+        stats = snapshot.filter_traces(ignore).compare_to(state[0].filter_traces(ignore), 'lineno')
+        stats.sort(key=lambda s: s.size_diff, reverse=True)
+        record = {
+            'startBytes': state[1],
+            'endBytes': current,
+            'peakBytes': peak,
+            'peakAboveStartBytes': peak - state[1],
+            'topSites': [{'site': f'{s.traceback[0].filename}:{s.traceback[0].lineno}',
+                          'sizeDiff': s.size_diff, 'countDiff': s.count_diff}
+                         for s in stats[:cls.TOP_SITES] if s.size_diff > 0],
+        }
+        cls._memoryStages.setdefault(name, []).append(record)
+        state[0] = None     # 尽早释放快照
+        tracemalloc.reset_peak()
+        if depth == 0:  # 一次操作结束，写出结果
+            cls.saveMemory()
+
+    @classmethod
+    def memoryReport(cls) -> dict[str, list[dict]]:
+        """内存分析结果，{阶段名: [每次运行的 startBytes, endBytes, peakBytes, peakAboveStartBytes, topSites]}"""
+        return cls._memoryStages
+
+    @classmethod
+    def saveMemory(cls, path: str = None) -> bool:
+        """将内存分析结果写入json文件，path缺省则写入memoryPath"""
+        path = path or cls.memoryPath
+        try:
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump(cls._memoryStages, file, indent=2)
+            return True
+        except OSError:
+            print(f"Warning: Unable to write memory profile: {path}")
+            return False
+
+    @classmethod
+    def counter(cls, name: str, value: int | float):
+        """记录一个计数值，在Trace查看器中显示为曲线"""
+        if not cls.enabled:
+            return
+        event = {'name': name, 'ph': 'C', 'ts': (time.perf_counter_ns() - cls._origin) / 1000,
+                 'pid': cls._pid, 'args': {name: value}}
+        with cls._lock:
+            cls._events.append(event)
+
+    @classmethod
+    def _record(cls, name: str, start: int, end: int, depth: int, args: dict):
+        """记录一个区间事件，并更新分阶段统计"""
+        event = {'name': name, 'ph': 'X', 'ts': (start - cls._origin) / 1000, 'dur': (end - start) / 1000,
+                 'pid': cls._pid, 'tid': threading.get_ident()}
+        if args:
+            event['args'] = args
+        is_main = threading.current_thread() is threading.main_thread()
+        with cls._lock:
+            cls._events.append(event)
+            if is_main and depth > 0:   # 操作内部的区间，计入分阶段统计
+                stage = cls._stages.setdefault(name, [0, 0])
+                stage[0] += end - start
+                stage[1] += 1
+            elif is_main and depth == 0:    # 最外层区间结束，即一次操作结束
+                cls.lastOperation = (name, end - start, cls._stages)
+                cls._stages = {}
+        if is_main and depth == 0 and cls.outputPath:
+            cls.save()
+
+    @classmethod
+    def summary(cls, maxStages: int = 6) -> str:
+        """
+        上一次操作的分阶段耗时文字，如 'Open 120ms: _load 80ms, gatherFonts 30ms'，未开启或没有操作时为空
+        :param maxStages: 最多列出的阶段数，按耗时从大到小取
+        """
+        if not cls.lastOperation:
+            return ''
+        name, duration, stages = cls.lastOperation
+        parts = [f'{stage} {total / 1e6:.0f}ms' + (f' ×{count}' if count > 1 else '')
+                 for stage, (total, count) in sorted(stages.items(), key=lambda item: -item[1][0])[:maxStages]]
+        return f'{name} {duration / 1e6:.0f}ms' + (': ' + ', '.join(parts) if parts else '')
+
+    @classmethod
+    def save(cls, path: str = None) -> bool:
+        """将所有事件写入json文件，path缺省则写入outputPath"""
+        path = path or cls.outputPath
+        with cls._lock:
+            events = list(cls._events)
+        try:
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+            return True
+        except OSError:
+            print(f"Warning: Unable to write trace file: {path}")
+            return False
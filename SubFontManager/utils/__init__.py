@@ -4,5 +4,6 @@ from . import version as Version
 from .App import App
 from .ConfigParserWraper import ConfigParserWraper
 from .Lang import Lang
+from .Trace import Trace
 
-__all__ = ['App', 'ConfigParserWraper', 'Lang', 'Version']
+__all__ = ['App', 'ConfigParserWraper', 'Lang', 'Trace', 'Version']
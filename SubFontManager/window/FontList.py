@@ -4,10 +4,10 @@ from enum import Flag, auto
 from functools import partial
 import tkinter as tk
 from tkinter import filedialog, messagebox, Event
-from utils import App, Lang
+from utils import App, Lang, Trace
 import ui
-from font import Font, FontManager
-from sub import SubStationAlpha
+from font import Font, FontArchive, FontManager, FontExporter, SubsetPool, SubsetError
+from sub import SubStationAlpha, UU
 
 
 class TaskType(Flag):
@@ -36,11 +36,13 @@ class RowItem:
     sourceWidget: ui.Combobox | None  # 文件源组合框控件
     bold: bool      # 是否粗体
     italic: bool    # 是否斜体
+    vertical: bool  # 是否有竖排引用
     matchedPath: str    # 匹配到的字体路径
     font: Font | None   # 字体对象
     valid: bool     # 字体是否有效，通常指内嵌字体
     modified: bool = False  # 字体内嵌状态是否被修改，用于决定该行显示为粗体
     taskType: TaskType = TaskType.NONE  # 任务类型，用于在检查行状态后填写
+    size: int = 0   # 当前字体源的数据字节数
 
 
 @dataclass
@@ -50,13 +52,16 @@ class EmbeddingInfo:
     refNames: list[str]  # 被引用的名字表，用于在子集化后的字体中保留这些名字
     text: set[str]  # 字体覆盖的字符
     subset: bool    # 是否进行子集化
-    font: Font      # 字体对象
+    font: Font | None   # 字体对象，子集化失败时为None
+    instance: tuple[bool, bool] | None = None   # 可变字体子集化前要固定的实例 (粗体, 斜体)，None为不固定
+    vertical: bool = False  # 是否有竖排引用，需要保留竖排字形
 
-    def merge(self, refName: str, text: set[str], subset: bool):
+    def merge(self, refName: str, text: set[str], subset: bool, vertical: bool):
         """合并新的内嵌字体"""
         self.refNames.append(refName.lower())  # 收集引用名字表
         self.text.update(text)  # 合并覆盖字符集
         self.subset &= subset  # 如果有一个不子集化则都不子集化
+        self.vertical |= vertical
 
 
 class FontList(ui.WidgetTable):
@@ -75,10 +80,18 @@ class FontList(ui.WidgetTable):
     EMBED_NAME_PREFIX = 'embed:/' if App.isMac else 'embed:\\'  # 嵌入字体名的前缀
     WARNING_MAX_CHAR_COUNT = 500    # 警告内嵌字数过多的门槛
     WARNING_MAX_FONT_SIZE = 1024000 # 警告内嵌字幕文件过大的门槛
+    MAX_MISSING_CHARS_SHOWN = 50    # 提示缺失字符时最多列出的字符数
+    SUBSET_SLACK_CHARS = 8  # 子集化工具可能额外保留的字符数（如空格），覆盖范围超出所需字符不多于此数的视为已子集化
+    MAX_DUPLICATES_SHOWN = 10   # 询问删除重复字体时最多列出的字体数
+    SUBSET_PROFILES = (Font.SUBSET_DEFAULT, Font.SUBSET_SIZE)   # 可在配置项subset_profile中选择的子集化方案
+    # 字体输出方式，配置项font_output -----
+    OUTPUT_EMBED = 'embed'      # UU编码内嵌到字幕的[Fonts]段
+    OUTPUT_ATTACH = 'attach'    # 导出为字幕旁的独立字体文件，并生成mkvmerge附件清单，字幕只删除要删除的内嵌字体
 
     def __init__(self, master):
         super().__init__(master=master)
         self.subtitleObj: SubStationAlpha | None = None
+        self._sizesBefore: dict[tuple[str, bool, bool], int] = {}  # 上次执行内嵌前各行字体的大小，重新载入后显示对比
 
         # 内嵌列
         self.addColumn(Lang['Emb'], width=40, sortKey=lambda r: r.data.embed.get(), toolTip=Lang['Embedding'])
@@ -92,6 +105,10 @@ class FontList(ui.WidgetTable):
         width = int(App.Config.get('General', 'count_column_width', 55))
         self.addColumn(Lang['Count'], width=width, sortKey=lambda r: len(r.data.text),
                        minWidth=50, adjuster=tk.RIGHT, toolTip=Lang['Non-repeating characters count'])
+        # 大小列
+        width = int(App.Config.get('General', 'size_column_width', 110))
+        self.addColumn(Lang['Size'], width=width, sortKey=lambda r: r.data.size, minWidth=60, adjuster=tk.RIGHT,
+                       toolTip=Lang['Size of the font data embedded in the subtitle'])
         # 子集化列
         self.addColumn(Lang['Sub'], width=40, sortKey=lambda r: r.data.subset.get(), toolTip=Lang['Subsetting'])
         # 文件源列
@@ -101,6 +118,7 @@ class FontList(ui.WidgetTable):
 
         self.bind("<Destroy>", self.onDestroy)  # 绑定关闭事件响应
 
+    @Trace.traced('FontList.loadSubtitle')
     def loadSubtitle(self, subObj: SubStationAlpha):
         """载入字体文件并将其中的字体和信息添加到列表"""
         # 清空列表 -------
@@ -110,8 +128,10 @@ class FontList(ui.WidgetTable):
 
         # 收集字幕中出现过的所有字体
         subFontDescs = self.subtitleObj.gatherFonts()
+        sizes_before, self._sizesBefore = self._sizesBefore, {}    # 上次执行内嵌前的大小只在紧接着的载入中显示
         if not subFontDescs:
             return
+        SubsetPool.get().start()    # 提前启动子集化工作进程，执行时不必再等待进程启动
         subFontDescs.sort(key=lambda f: f.isEmbed)  # 将内嵌字体排到列表后面，以便插入分隔行
         adding_embed_items = False  # 是否已经开始添加内嵌字体行
 
@@ -143,10 +163,16 @@ class FontList(ui.WidgetTable):
                 isEmbed=fontDesc.isEmbed,   # 当前找到的字体源是否是内嵌字体
                 bold=fontDesc.bold,         # 是否粗体
                 italic=fontDesc.italic,     # 是否斜体
+                vertical=fontDesc.vertical, # 是否有竖排引用
                 matchedPath='' if fontDesc.font is None else fontDesc.font.path,    # 按系统逻辑匹配到的字体路径
                 font=fontDesc.font,         # 行关联的字体对象，可根据用户选择重新匹配
                 valid=fontDesc.valid        # 字体是否有效
             )
+            if fontDesc.font and fontDesc.valid:
+                try:
+                    row_item.size = fontDesc.font.size
+                except Exception:   # 读不出的字体不显示大小
+                    pass
 
             if row_item.isEmbed:  # 如果是内嵌字体
                 row_item.embed.set(row_item.valid)  # 对有效字体勾上内嵌复选框
@@ -174,8 +200,19 @@ class FontList(ui.WidgetTable):
             # Label：样式名
             row_frame.addCell(ui.Label(row_frame, text=row_item.styleName, overstrike=not row_item.valid,
                                        anchor=tk.CENTER), pady=(0, 1))
-            # Label：字数统计
-            row_frame.addCell(ui.Label(row_frame, text=str(len(row_item.text)), anchor=tk.E), padx=(0, 2), pady=(0, 1))
+            # Label：字数统计，字体源有缺失字符时标红，并在气泡提示中列出缺失的字符
+            count_label = ui.Label(row_frame, text=str(len(row_item.text)), anchor=tk.E,
+                                   fg='red' if fontDesc.missing else None)
+            if fontDesc.missing:
+                ui.ToolTip(count_label, Lang['{c} characters missing in the font source: {s}'].format(
+                    c=len(fontDesc.missing), s=''.join(sorted(fontDesc.missing)[:self.MAX_MISSING_CHARS_SHOWN])))
+            row_frame.addCell(count_label, padx=(0, 2), pady=(0, 1))
+            # Label：内嵌后的大小，刚执行过内嵌的行同时显示内嵌前的大小
+            size_text = self.formatSize(row_item.size) if row_item.size else ''
+            size_before = sizes_before.get((row_item.fontName.lower(), row_item.bold, row_item.italic))
+            if size_text and size_before and row_item.isEmbed:
+                size_text = f'{self.formatSize(size_before)} → {size_text}'
+            row_frame.addCell(ui.Label(row_frame, text=size_text, anchor=tk.E), padx=(0, 2), pady=(0, 1))
             # Checkbox：子集化
             row_item.subsetWidget = ui.Checkbox(row_frame, variable=row_item.subset,
                                                 state=tk.NORMAL if row_item.valid else tk.DISABLED)
@@ -269,9 +306,12 @@ class FontList(ui.WidgetTable):
             # 检查文件源路径是否存在以及路径是否包含指定的字体，并找到相应的字体对象 -------------
             if row_item.font and file_path == row_item.font.path:   # 填写路径和现有路径相同
                 continue    # 路径已知，无需检查了
-            if not os.path.isfile(file_path): # 路径不是文件
+            # 字体包内的字体（自动匹配或同目录的）路径形如 包路径/成员路径，要检查的是字体包文件
+            archive_member = FontArchive.splitMemberPath(file_path)
+            source_path = archive_member[0] if archive_member else file_path
+            if not os.path.isfile(source_path): # 路径不是文件
                 warnings.append(Lang["File {p} does not exist."].format(p=file_path))
-            elif not os.access(file_path, os.R_OK): # 路径不可访问
+            elif not os.access(source_path, os.R_OK): # 路径不可访问
                 warnings.append(Lang["Unable to read file {p}."].format(p=file_path))
             else:   # 正常外部路径
                 font = FontManager(path=file_path).match(
@@ -282,6 +322,43 @@ class FontList(ui.WidgetTable):
                 else:   # 这里将字体匹配结果保存到row_item，如果本次执行失败，在下次执行时还会有效
                     row_item.font = font
 
+        # 检查内嵌字体的子集化是否必要，如果现有内嵌字体已是覆盖所有字符的子集，则无需重新子集化 -------------
+        subset_rows: dict[str, list[RowItem]] = {}  # 按内嵌名索引的内嵌字体子集化行，同一字体的多个行需要合并检查
+        for row_item in row_items:
+            if row_item.taskType == TaskType.SUBSETTING | TaskType.EMBEDDING:
+                subset_rows.setdefault(row_item.matchedPath, []).append(row_item)
+        missing_msgs: list[str] = []    # 字符缺失提示列表
+        for embed_name, items in subset_rows.items():
+            text = set().union(*(r.text for r in items))
+            try:
+                coverage = items[0].font.coverage
+                missing_chars = coverage.missing(text)
+            except Exception:   # 读不出cmap的字体，留给执行时报错
+                continue
+            if not missing_chars:
+                # 完整的字体也必然全部覆盖，只有覆盖范围不超出所需字符（允许少量余量）的才是已子集化的字体
+                if len(coverage) - len(text) <= self.SUBSET_SLACK_CHARS:    # 已是子集，跳过子集化任务
+                    for row_item in items:
+                        row_item.taskType = TaskType.NONE
+            else:   # 有字符缺失，子集化也无法补上，提示用户
+                missing_msgs.append(Lang['Embedded font "{f}" lacks {c} characters used in the subtitle: {s}']
+                                    .format(f=embed_name, c=len(missing_chars),
+                                            s=''.join(sorted(missing_chars)[:self.MAX_MISSING_CHARS_SHOWN])))
+        # 检查外部字体源是否覆盖了所有字符，缺失的字符在子集化时会被丢弃 -------------
+        for row_item in row_items:
+            if TaskType.EXTERNAL in row_item.taskType and row_item.font and row_item.text:
+                try:
+                    missing_chars = row_item.font.getMissingChars(row_item.text)
+                except Exception:   # 读不出cmap的字体，留给执行时报错
+                    continue
+                if missing_chars:
+                    missing_msgs.append(Lang['Font "{fs}" from {p} lacks {c} characters used in the subtitle: {s}']
+                                        .format(fs=f"{row_item.fontName} {Lang[row_item.styleName]}",
+                                                p=row_item.font.path, c=len(missing_chars),
+                                                s=''.join(sorted(missing_chars)[:self.MAX_MISSING_CHARS_SHOWN])))
+        if missing_msgs:
+            messagebox.showwarning(Lang['Reminding'], '\n'.join(missing_msgs))
+
         if warnings:  # 检查是否有警告消息
             messagebox.showerror(Lang['Error'], '\n'.join(warnings))
             return False  # 表示操作取消
@@ -293,7 +370,7 @@ class FontList(ui.WidgetTable):
         problematic_fonts = [] # 有问题的字体表
         for row_item in row_items:
             if (TaskType.EXTERNAL in row_item.taskType and TaskType.SUBSETTING not in row_item.taskType
-                    and os.path.getsize(row_item.sourceWidget.get()) > self.WARNING_MAX_FONT_SIZE):  # 文件过大且不子集化
+                    and row_item.font.size > self.WARNING_MAX_FONT_SIZE):  # 字体过大且不子集化
                 problematic_fonts.append(row_item)
 
         if problematic_fonts:
@@ -313,61 +390,158 @@ class FontList(ui.WidgetTable):
 
     def applyEmbedding(self, savePath: str = None):
         """
-        执行列表内配置的字体内嵌任务
+        执行列表内配置的字体内嵌任务. 输出方式为OUTPUT_ATTACH时，待内嵌的字体导出到字幕旁的 字幕名.fonts 目录，
+        附件清单写入 字幕名.mkvmerge.json，字幕的[Fonts]段只删除要删除（包括被替换）的内嵌字体，不加入新字体
         :param savePath: 新字幕保存路径，缺省则写入到源文件
+        :return: 子集化失败而未内嵌的字体列表，每项为 "内嵌名: 原因"，其他字体照常内嵌
         """
         # 去掉分割行，去掉无任务行，获取其他所有行的信息
         row_items: list[RowItem] = [r.data for r in self._rows if not r.isSep and r.data.taskType]
-        fontList_bak = self.subtitleObj.fontDict.copy()  # 万一写入错误时用来恢复的备份
-
-        # 合并重复的需要内嵌的字体，删除需要删除的内嵌字体 -------------
-        fonts_to_embed: dict[str, EmbeddingInfo] = {}  # 按文件路径索引的待内嵌字体，用于合并重复的字体源
+        with Trace.span('backupFontDict', stage=True):
+            fontList_bak = self.subtitleObj.fontDict.copy()  # 万一写入错误时用来恢复的备份
+
+        # 合并重复的需要内嵌的字体，记下需要删除的内嵌字体 -------------
+        # 按 (文件路径, 实例坐标) 索引的待内嵌字体，用于合并重复的字体源. 可变字体的不同实例分别内嵌
+        fonts_to_embed: dict[tuple[str, tuple], EmbeddingInfo] = {}
+        embed_names: set[str] = set()   # 已分配的内嵌名
+        sizes_before: dict[tuple[str, bool, bool], int] = {}   # 各内嵌行内嵌前的字体大小
+        # 待删除的内嵌字体 [(内嵌名, 序号, 替换它的待内嵌字体键)]，在子集化之后才删除，替换字体失败时保留原字体
+        unembeds: list[tuple[str, int, tuple | None]] = []
+        freed_names = {r.matchedPath for r in row_items if TaskType.UNEMBEDDING in r.taskType
+                       and len(self.subtitleObj.fontDict.get(r.matchedPath, [])) == 1}   # 将被整个删除的内嵌名，可以重用
         for row_item in row_items:
             font = row_item.font
+            # 子集化的可变字体先固定为所需的粗斜体实例，不同实例是不同的内嵌字体 -------
+            key = None
+            if TaskType.EMBEDDING in row_item.taskType:
+                axes = ()
+                if row_item.subset.get():
+                    try:
+                        axes = tuple(sorted(font.instanceAxes(row_item.bold, row_item.italic).items()))
+                    except Exception:   # 读取错误留到子集化时处理
+                        pass
+                key = (font.path, axes)
+
             # 如果任务包括删除内嵌操作 -------
             if TaskType.UNEMBEDDING in row_item.taskType:
-                # 内嵌字体可能是多个行的文件源，所以该字体可能已经被删除过了，因此需要检查一下
-                font_codes = self.subtitleObj.fontDict.get(row_item.matchedPath, [])
-                if len(font_codes) == 1:
-                    self.subtitleObj.fontDict.pop(row_item.matchedPath)
-                elif font_codes:
-                    font_codes.pop(font.index)
+                unembeds.append((row_item.matchedPath, font.index, key))
 
             # 如果任务包括内嵌操作 -------
             if TaskType.EMBEDDING in row_item.taskType:
+                try:
+                    sizes_before[(row_item.fontName.lower(), row_item.bold, row_item.italic)] = font.size
+                except Exception:   # 读取错误留到内嵌时处理
+                    pass
+                if key in fonts_to_embed:   # 如果字体已存在，合并多次引用
+                    fonts_to_embed[key].merge(row_item.fontName, row_item.text, row_item.subset.get(),
+                                              row_item.vertical)
+                    continue
+
                 # 生成一个不重复的内嵌字体名 -------
-                if TaskType.EXTERNAL in row_item.taskType:  # 外部文件字体源
+                if TaskType.EXTERNAL in row_item.taskType or font.path in embed_names:  # 外部文件字体源或同一字体的其他实例
                     file_name = os.path.splitext(os.path.split(font.path)[1])[0]    # 拆解出无后缀文件名
                     if row_item.subset.get() and not file_name.endswith('_subset'): # 如果不是_subset结尾，加一个_subset
                         file_name += '_subset'
                     i = 2
                     embed_name = file_name
-                    while embed_name + '.ttf' in self.subtitleObj.fontDict:
+                    while (embed_name + '.ttf' in self.subtitleObj.fontDict and embed_name + '.ttf' not in freed_names
+                           or embed_name + '.ttf' in embed_names):
                         embed_name = file_name + f'_{i}'    # 字体名后面加_编号
                         i += 1
                     embed_name += '.ttf'
                 else:   # 内嵌字体源（走到这里都是需要子集化）
                     embed_name = font.path  # 直接保留原内嵌名字不变
+                embed_names.add(embed_name)
 
-                # 合并到待嵌入字体表 -------
-                if font.path in fonts_to_embed: # 如果字体已存在，合并多次引用
-                    fonts_to_embed[font.path].merge(row_item.fontName, row_item.text, row_item.subset.get())
-                else:   # 如果不存在，新建内嵌字体信息
-                    fonts_to_embed[font.path] = EmbeddingInfo(
-                        embed_name, [row_item.fontName.lower()], row_item.text, row_item.subset.get(), font)
+                # 新建内嵌字体信息 -------
+                fonts_to_embed[key] = EmbeddingInfo(embed_name, [row_item.fontName.lower()], row_item.text,
+                                                    row_item.subset.get(), font,
+                                                    (row_item.bold, row_item.italic) if axes else None,
+                                                    row_item.vertical)
 
         # 执行内嵌 -------------
+        profile = App.Config.get('General', 'subset_profile', Font.SUBSET_DEFAULT)    # 子集化方案
+        if profile not in self.SUBSET_PROFILES:
+            profile = Font.SUBSET_DEFAULT
+        attach = App.Config.get('General', 'font_output', self.OUTPUT_EMBED) == self.OUTPUT_ATTACH   # 输出方式
+        failures: list[str] = []    # 无法子集化而未内嵌的字体及原因
         try:
+            # 子集化（包括可变字体固定实例）在独立的工作进程中并发进行，某个字体超时或出错只跳过该字体 -------
+            subset_infos = [info for info in fonts_to_embed.values() if info.subset]
+            results = SubsetPool.get().subsetAll([(info.font, ''.join(info.text), info.refNames, profile,
+                                                   info.vertical, info.instance) for info in subset_infos])
+            for embed_info, result in zip(subset_infos, results):
+                if isinstance(result, SubsetError):
+                    failures.append(f'{embed_info.fontName}: {result}')
+                    embed_info.font = None
+                else:
+                    embed_info.font = result
+                    embed_info.font.path = embed_info.fontName  # 子集化之后字体会变内存字体，原路径失去意义，换成内嵌名
+
+            # 删除内嵌字体，替换它的字体子集化失败时保留原字体，否则字幕中两者都没有 -------
+            failed_keys = {key for key, info in fonts_to_embed.items() if info.font is None}
+            kept = {(name, index) for name, index, key in unembeds if key in failed_keys}
+            removals: dict[str, set[int]] = {}  # {内嵌名: 序号}
+            for name, index, _ in unembeds:
+                if (name, index) not in kept:
+                    removals.setdefault(name, set()).add(index)
+            for name, indexes in removals.items():
+                # 内嵌字体可能是多个行的文件源，所以该字体可能已经被删除过了，因此需要检查一下
+                font_codes = self.subtitleObj.fontDict.get(name, [])
+                for index in sorted(indexes, reverse=True): # 从后往前删，序号不受影响
+                    if len(font_codes) == 1:
+                        self.subtitleObj.fontDict.pop(name)
+                        break
+                    elif index < len(font_codes):
+                        font_codes.pop(index)
+
+            font_files: dict[str, bytes] = {}   # 附件模式下待导出的字体 {内嵌名: 字体数据}
             for embed_info in fonts_to_embed.values():  # 遍历每一个待内嵌字体并执行内嵌
                 font = embed_info.font
-                if embed_info.subset:   # 子集化
-                    font.subset(''.join(embed_info.text), embed_info.refNames)
-                    font.path = embed_info.fontName # 子集化之后字体会变内存字体，原路径失去意义，换成内嵌名
-                self.subtitleObj.fontDict.add(font.read(), embed_info.fontName, font.index, True)   # 内嵌
-            self.subtitleObj.save(savePath)  # 保存字幕文件
+                if font is None:    # 子集化失败
+                    continue
+                if attach:
+                    font_files[embed_info.fontName] = font.read()
+                else:
+                    self.subtitleObj.fontDict.add(font.read(), embed_info.fontName, font.index, True)   # 内嵌
+            if attach:  # 附件模式，新字体只导出不内嵌，删除内嵌的操作照常执行，否则被替换的旧字体仍留在字幕里
+                sub_path = savePath or self.subtitleObj.filePath
+                sub_stem = os.path.splitext(sub_path)[0]
+                with Trace.span('exportFonts', stage=True):
+                    files = FontExporter.export(font_files, sub_stem + '.fonts')
+                    FontExporter.writeManifest(sub_stem + '.mkvmerge.json', list(files))
+                if savePath or removals:    # 没有删除内嵌字体时，源字幕不用重写
+                    self.subtitleObj.save(savePath)
+            else:
+                self.askCollapseDuplicates()    # 重复的内嵌字体询问是否只保留一份
+                self.subtitleObj.save(savePath)  # 保存字幕文件
+                self._sizesBefore = sizes_before
         except Exception as e:   # 内嵌或删除内嵌或保存文件出错
             self.subtitleObj.fontDict = fontList_bak
             raise e
+        return failures
+
+    def askCollapseDuplicates(self):
+        """内嵌字体中有内容相同的多份时（包括刚内嵌的字体），弹窗询问是否删除重复的，只保留第一份"""
+        font_dict = self.subtitleObj.fontDict
+        duplicates = font_dict.findDuplicates()
+        if not duplicates:
+            return
+        saved = sum(font_dict.encodedSize(name, i) for name, i, _, _ in duplicates)
+        pairs = [f'{name} = {kept_name}' for name, _, kept_name, _ in duplicates[:self.MAX_DUPLICATES_SHOWN]]
+        if len(duplicates) > self.MAX_DUPLICATES_SHOWN:
+            pairs.append('...')
+        if messagebox.askyesno(Lang['Reminding'],   # 弹窗询问
+                Lang["{n} embedded fonts are identical copies of other embedded fonts. "
+                     "Remove the copies to save {s}?"].format(n=len(duplicates), s=self.formatSize(saved))
+                + '\n\n' + '\n'.join(pairs)):
+            font_dict.removeFonts([(name, i) for name, i, _, _ in duplicates])
+
+    @staticmethod
+    def formatSize(size: int) -> str:
+        """字体数据内嵌到字幕后（UU编码）的大小文本"""
+        size = UU.EncodedLength(size)
+        return f'{size / 1048576:.1f} MB' if size >= 1048576 else f'{max(size / 1024, 0.1):.1f} KB'
 
     @classmethod
     def setRowStatus(cls, rowItem: RowItem):
@@ -447,7 +621,8 @@ class FontList(ui.WidgetTable):
             src_text_new = font.path if font else ''
         elif src_text == self.SrcCmbOptions.BROWSE:      # 手动选择路径
             src_text_new = filedialog.askopenfilename(
-                filetypes=[(Lang["Font File"], "*.ttf *.ttc *.otf"), (Lang["All files"], "*.*")])
+                filetypes=[(Lang["Font File"], "*.ttf *.ttc *.otf"), (Lang["Font Pack"], "*.zip"),
+                           (Lang["All files"], "*.*")])
             cmb_src.focus_force()
             if not src_text_new:
                 src_text_new = cmb_src.currentValue
@@ -476,8 +651,9 @@ class FontList(ui.WidgetTable):
         """关闭窗口响应，保存列宽配置"""
         if event.widget is not self:
             return None
-        # 保存三个可调宽度列的宽度
+        # 保存四个可调宽度列的宽度
         App.Config.set('General', 'font_column_weight', self._headers[1].weight)
         App.Config.set('General', 'count_column_width', self._headers[3].width)
-        App.Config.set('General', 'source_column_weight', self._headers[5].weight)
+        App.Config.set('General', 'size_column_width', self._headers[4].width)
+        App.Config.set('General', 'source_column_weight', self._headers[6].weight)
         return 'break'  # 阻止Destroy事件继续无意义的冒泡上浮
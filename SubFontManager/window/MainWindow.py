@@ -3,11 +3,10 @@ import traceback
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from tkinterdnd2 import TkinterDnD, DND_FILES
-from utils import App, Lang
+from utils import App, Lang, Trace
 import ui
 from sub import SubStationAlpha, SubException
 from .FontList import FontList
-from .SettingsWindow import SettingsWindow
 
 
 class MainWindow:
@@ -83,6 +82,10 @@ class MainWindow:
         self.applyBtn = ui.Button(bottom_frame, text=Lang['Apply'], width=(5 if App.isMac else 7)*App.dpiScale,
                                   state=tk.DISABLED, command=self.onApplyBtn)
         self.applyBtn.pack(side=tk.RIGHT, padx=padding)
+        # 删除内嵌按钮，不载入字幕，直接删除文件中的所有内嵌字体
+        self.stripBtn = ui.Button(bottom_frame, text=Lang['Strip fonts'], state=tk.DISABLED, command=self.onStripBtn)
+        self.stripBtn.pack(side=tk.RIGHT, padx=padding)
+        ui.ToolTip(self.stripBtn, Lang['Remove all embedded fonts without loading the subtitle.'])
         # 设置按钮
         config_btn = ui.FlatButton(bottom_frame, text='⚙', fg='#645D56', command=self.showSettings)
         config_btn.pack(side=tk.RIGHT, padx=padding)
@@ -140,6 +143,7 @@ class MainWindow:
     def onFileEntryInsert(self, *args):
         """输入文件框值改变响应"""
         self.loadBtn.configure(state=tk.NORMAL if self.srcEntry.get() else tk.DISABLED)
+        self.stripBtn.configure(state=tk.NORMAL if self.srcEntry.get() else tk.DISABLED)
 
     def onFileEntryEnter(self, *args):
         """输入文件框回车响应"""
@@ -154,10 +158,11 @@ class MainWindow:
         self.statusBar.set(Lang["Opening..."])
         self.statusBar.update()  # 立刻刷新界面，否则就卡住看不到了
         try:
-            file_path = self.srcEntry.get()
-            subtitleObj = SubStationAlpha.load(file_path)   # 读取字幕文件
-            is_reload = self.fontList.subtitleObj and file_path == self.fontList.subtitleObj.filePath
-            self.fontList.loadSubtitle(subtitleObj) # 载入字体列表
+            with Trace.span('Open'):    # 开启计时时，记录载入的各阶段耗时
+                file_path = self.srcEntry.get()
+                subtitleObj = SubStationAlpha.load(file_path)   # 读取字幕文件
+                is_reload = self.fontList.subtitleObj and file_path == self.fontList.subtitleObj.filePath
+                self.fontList.loadSubtitle(subtitleObj) # 载入字体列表
         except Exception as e:  # 载入出错，弹窗告知
             traceback.print_exc()   # 打印异常信息到控制台
             messagebox.showerror(Lang['Error'], f"{Lang['Subtitle file reading error']}:\n{str(e)}"
@@ -170,8 +175,9 @@ class MainWindow:
             self.applyBtn.configure(state=tk.NORMAL)    # 解开"应用"按钮禁用
             if self.loadBtn.cget('text') != Lang['Reload']: # 设置"载入"按钮为"重新载入"
                 self.loadBtn.configure(text=Lang['Reload'], state=tk.NORMAL)
-            if updateStatus:    # 设置状态栏文字
-                self.statusBar.set(Lang['File reloaded.'] if is_reload else Lang['File loaded.'], duration=3)
+            if updateStatus:    # 设置状态栏文字，开启计时时附加各阶段耗时，并且不自动清空
+                self.statusBar.set(self._withTrace(Lang['File reloaded.'] if is_reload else Lang['File loaded.']),
+                                   duration=-1 if Trace.enabled else 3)
 
     def onApplyBtn(self):
         """点击应用按钮"""
@@ -181,7 +187,9 @@ class MainWindow:
             if task_ok: # 任务已确认可执行
                 self.statusBar.set(Lang["Executing..."])
                 self.statusBar.update()  # 立刻刷新界面，否则就卡住看不到了
-                self.fontList.applyEmbedding(self.dstEntry.get())   # 执行嵌入
+                with Trace.span('Apply'):
+                    failures = self.fontList.applyEmbedding(self.dstEntry.get())   # 执行嵌入
+                trace_summary = Trace.summary() # 重新载入会覆盖计时结果，先保存下来
             else:   # 任务无法执行或者被取消
                 return
         except Exception as e:  # 嵌入出错
@@ -197,8 +205,49 @@ class MainWindow:
                 self.dstEntry.delete(0, tk.END) # 删除输出框中的内容
                 self.dstEntry.onFocusOut()      # 手动触发失焦事件，从而让输出框内显示占位符
             self.onLoadBtn(updateStatus=False)  # 重新载入文件，不更新状态栏
-            self.statusBar.set(Lang["Finished, file reloaded"], duration=3)
+            self.statusBar.set(self._withTrace(Lang["Finished, file reloaded"], trace_summary),
+                               duration=-1 if Trace.enabled else 3)
+            if failures:    # 个别字体子集化失败，其他字体已照常内嵌
+                messagebox.showwarning(Lang['Reminding'], '\n'.join(
+                    [Lang['The following fonts could not be subset and were not embedded:']] + failures))
+                self.applyBtn.focus_force()
+
+    def onStripBtn(self):
+        """点击删除内嵌按钮"""
+        src_path = self.srcEntry.get()
+        dst_path = None if self.dstEntry.isBlank else self.dstEntry.get()
+        if not messagebox.askyesno(Lang['Strip fonts'], Lang['Remove all embedded fonts from {p}?'].format(
+                p=os.path.basename(src_path))):
+            self.stripBtn.focus_force()  # 弹窗后，需手动取回焦点
+            return
+        try:
+            with Trace.span('Strip'):
+                count = SubStationAlpha.strip(src_path, dst_path)
+        except Exception as e:
+            traceback.print_exc()   # 打印异常信息到控制台
+            messagebox.showerror(Lang['Error'], f"{Lang['Execution error']}:\n{str(e)}"
+                                 if isinstance(e, SubException) or App.inDev else f"{Lang['Execution error']}.")
+            self.stripBtn.focus_force()  # 弹窗后，需手动取回焦点
+            self.statusBar.set(Lang["Execution failed."], duration=3)
+            return
+        if self.fontList.subtitleObj:   # 已经载入过字幕，重新载入以显示删除后的内容
+            if dst_path:
+                self.srcEntry.delete(0, tk.END)
+                self.srcEntry.insert(0, dst_path)
+                self.dstEntry.delete(0, tk.END)
+                self.dstEntry.onFocusOut()
+            self.onLoadBtn(updateStatus=False)
+        self.statusBar.set(Lang['{n} embedded fonts removed.'].format(n=count), duration=3)
+
+    @staticmethod
+    def _withTrace(text: str, summary: str = None) -> str:
+        """在状态栏文字后附加上一次操作的分阶段耗时，未开启计时则原样返回"""
+        if not Trace.enabled:
+            return text
+        summary = Trace.summary() if summary is None else summary
+        return f'{text}  [{summary}]' if summary else text
 
     def showSettings(self, event):
         """点击设置按钮"""
+        from .SettingsWindow import SettingsWindow  # 设置窗口不常用，打开时才导入
         SettingsWindow(self.root)   # 打开设置窗口